@@ -0,0 +1,57 @@
+"""
+Вычисление сумм расходов по дням, неделям и месяцам (get_rollups)
+для 1 млн расходов в SQLiteRepository и MemoryRepository.
+Число записей можно передать первым аргументом командной строки.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Iterator
+
+from bookkeeper.models.budget import get_rollups
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+N = 1_000_000
+START = datetime(2020, 1, 1)
+
+
+def expenses(n: int) -> Iterator[Expense]:
+    """ Случайные расходы за 3 года """
+    rnd = random.Random(0)
+    for _ in range(n):
+        yield Expense(rnd.randint(1, 10_000), rnd.randint(1, 100),
+                      START + timedelta(minutes=rnd.randint(0, 3 * 365 * 24 * 60)),
+                      START)
+
+
+def measure(title: str, repo: AbstractRepository[Any]) -> None:
+    """ Вывести время вычисления всех трех сводок """
+    start = time.perf_counter()
+    rollups = get_rollups(repo)
+    elapsed = time.perf_counter() - start
+    sizes = ', '.join(f'{len(totals)} {period}s' for period, totals in rollups.items())
+    print(f'{title}: {elapsed:.3f} s ({sizes})')
+
+
+def main() -> None:
+    """ Заполнить оба репозитория и замерить время вычисления сводок """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    memory_repo = MemoryRepository[Expense]()
+    memory_repo.add_many(expenses(n))
+    measure(f'MemoryRepository, {n} rows', memory_repo)
+    del memory_repo
+    with tempfile.TemporaryDirectory() as tmp:
+        with SQLiteRepository[Expense](os.path.join(tmp, 'budget.db'), Expense) as repo:
+            repo.add_many(expenses(n))
+            measure(f'SQLiteRepository, {n} rows', repo)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Журнал изменений (ChangeFeed): стоимость poll без изменений (проверка
+PRAGMA data_version) и после записи другим процессом, а также замедление
+массовой записи из-за триггеров журнала.
+Число расходов можно передать первым аргументом командной строки.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import RepositoryHook
+from bookkeeper.repository.change_feed import ChangeFeed
+from bookkeeper.repository.sqlite_repository import ConnectionPool, SQLiteRepository
+
+N = 100_000
+POLLS = 10_000
+
+
+class Counter(RepositoryHook[Expense]):
+    """ Считает переданные изменения """
+
+    count = 0
+
+    def added(self, obj: Expense) -> None:
+        self.count += 1
+
+
+def add_many(db_file: str, n: int, watched: bool) -> float:
+    """ Добавить n расходов одним add_many и вернуть время в секундах """
+    with ConnectionPool(db_file) as pool:
+        repo = SQLiteRepository[Expense](db_file, Expense, pool=pool)
+        if watched:
+            ChangeFeed(pool).watch(repo)
+        now = datetime(2023, 1, 1)
+        start = time.perf_counter()
+        repo.add_many(Expense(i, 1, now, now) for i in range(n))
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    """ Измерить на временных файлах """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = add_many(os.path.join(tmp, 'plain.db'), n, False)
+        logged = add_many(os.path.join(tmp, 'logged.db'), n, True)
+        print(f'add_many {n} expenses: {plain:.3f} s without log, '
+              f'{logged:.3f} s with log triggers')
+
+        db_file = os.path.join(tmp, 'feed.db')
+        pool = ConnectionPool(db_file)
+        repo = SQLiteRepository[Expense](db_file, Expense, pool=pool)
+        feed = ChangeFeed(pool)
+        counter = Counter()
+        feed.watch(repo, counter)
+        start = time.perf_counter()
+        for _ in range(POLLS):
+            feed.poll()
+        idle = (time.perf_counter() - start) / POLLS
+        print(f'poll without changes: {idle * 1e6:.1f} us')
+
+        other = SQLiteRepository[Expense](db_file, Expense,
+                                          pool=ConnectionPool(db_file))
+        now = datetime(2023, 1, 1)
+        changes = min(n, 10_000)
+        other.add_many(Expense(i, 1, now, now) for i in range(changes))
+        start = time.perf_counter()
+        feed.poll()
+        busy = time.perf_counter() - start
+        print(f'poll after {changes} external adds: {busy * 1e3:.1f} ms, '
+              f'{counter.count} delivered')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Память и скорость ColumnarExpenseRepository по сравнению с MemoryRepository
+на 1 млн расходов: добавление, фильтрация, суммы по категориям и по месяцам.
+Число записей можно передать первым аргументом командной строки.
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterator
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.columnar_repository import ColumnarExpenseRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+N = 1_000_000
+START = datetime(2020, 1, 1)
+COMMENTS = ['', 'обед', 'такси', 'продукты', 'кофе']
+
+
+def expenses(n: int) -> Iterator[Expense]:
+    """ Случайные расходы за 3 года """
+    rnd = random.Random(0)
+    for _ in range(n):
+        yield Expense(rnd.randint(1, 10_000), rnd.randint(1, 100),
+                      START + timedelta(minutes=rnd.randint(0, 3 * 365 * 24 * 60)),
+                      START, rnd.choice(COMMENTS))
+
+
+def timed(title: str, func: Callable[[], Any]) -> None:
+    """ Вывести время вызова func """
+    start = time.perf_counter()
+    func()
+    print(f'  {title}: {time.perf_counter() - start:.3f} s')
+
+
+def run(title: str, repo: AbstractRepository[Expense], n: int) -> None:
+    """ Заполнить репозиторий и замерить память и время операций """
+    print(title)
+    tracemalloc.start()
+    timed(f'add_many {n} rows', lambda: repo.add_many(expenses(n)))
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'  memory: {memory / 2 ** 20:.1f} MiB ({memory / n:.0f} bytes/row)')
+    where = {'category': 7, 'amount__gt': 5000}
+    timed('get_all(category=7, amount>5000)', lambda: repo.get_all(where))
+    timed('get_sums(amount by category)', lambda: repo.get_sums('amount', 'category'))
+    timed('get_totals(amount by month)',
+          lambda: repo.get_totals('amount', 'expense_date', 'month'))
+
+
+def main() -> None:
+    """ Сравнить два репозитория """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    run('MemoryRepository', MemoryRepository[Expense](), n)
+    run('ColumnarExpenseRepository', ColumnarExpenseRepository(), n)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Сравнение 10 тыс. однострочных операций в SQLiteRepository
+с пулом соединений и в режиме "соединение на каждый вызов"
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+from dataclasses import dataclass
+
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+N = 10_000
+
+
+@dataclass
+class Row:
+    """ Простая запись для бенчмарка """
+    text: str = 'abc'
+    pk: int = 0
+
+
+def run_without_pool(db_file: str) -> float:
+    """ Старое поведение: открыть, выполнить прагму и закрыть соединение """
+    with sqlite3.connect(db_file) as con:
+        con.execute('CREATE TABLE row (pk INTEGER PRIMARY KEY, text TEXT)')
+    con.close()
+    start = time.perf_counter()
+    for i in range(N):
+        con = sqlite3.connect(db_file)
+        with con:
+            con.execute('PRAGMA foreign_keys = ON')
+            pk = con.execute('INSERT INTO row (text) VALUES (?)', (str(i),)).lastrowid
+            con.execute('SELECT * FROM row WHERE pk = ?', (pk,)).fetchone()
+        con.close()
+    return time.perf_counter() - start
+
+
+def run_with_pool(db_file: str) -> float:
+    """ Тот же сценарий через SQLiteRepository с общим пулом соединений """
+    with SQLiteRepository[Row](db_file, Row) as repo:
+        start = time.perf_counter()
+        for i in range(N):
+            pk = repo.add(Row(str(i)))
+            repo.get(pk)
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    """ Запустить оба варианта на временных файлах и вывести результат """
+    with tempfile.TemporaryDirectory() as tmp:
+        without_pool = run_without_pool(os.path.join(tmp, 'no_pool.db'))
+        with_pool = run_with_pool(os.path.join(tmp, 'pool.db'))
+    print(f'{N} add+get without pool: {without_pool:.3f} s')
+    print(f'{N} add+get with pool:    {with_pool:.3f} s')
+    print(f'speedup: {without_pool / with_pool:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
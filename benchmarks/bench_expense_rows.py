@@ -0,0 +1,80 @@
+"""
+Обновление таблицы расходов: составление строк с названиями категорий
+прежним способом (поиск категории перебором списка), через ExpenseRows
+(словарь {pk: Category}) и запросом с JOIN в SQLiteRepository.get_rows.
+Число расходов можно передать первым аргументом командной строки,
+число категорий - вторым.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from inspect import get_annotations
+from typing import Any, Callable
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.presenter.expense_presenter import make_tuple_from_attr
+from bookkeeper.presenter.view_model import ExpenseRows
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+N = 100_000
+CATEGORIES = 1_000
+
+
+def linear_rows(cat_repo: SQLiteRepository[Category],
+                exp_repo: SQLiteRepository[Expense]) -> list[list[Any]]:
+    """ Строки таблицы, как их составлял презентер до ExpenseRows """
+    cat_data = [make_tuple_from_attr(cat, get_annotations(Category))
+                for cat in cat_repo.get_all()]
+    data = []
+    for exp in exp_repo.iter_all():
+        row = list(make_tuple_from_attr(exp, get_annotations(Expense)))
+        for cat in cat_data:
+            if cat[-1] == row[1]:
+                row[1] = cat[0]
+                break
+        data.append(row)
+    return data
+
+
+def measure(title: str, func: Callable[[], list[list[Any]]]) -> list[list[Any]]:
+    """ Вывести время вызова func """
+    start = time.perf_counter()
+    rows = func()
+    print(f'  {title}: {time.perf_counter() - start:.3f} s')
+    return rows
+
+
+def main() -> None:
+    """ Сравнить способы на одной БД и проверить, что строки совпадают """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    categories = int(sys.argv[2]) if len(sys.argv) > 2 else CATEGORIES
+    rnd = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'rows.db')
+        cat_repo = SQLiteRepository[Category](db_file, Category)
+        exp_repo = SQLiteRepository[Expense](db_file, Expense)
+        cat_repo.add_many(Category(f'категория {i}') for i in range(categories))
+        now = datetime(2023, 1, 1)
+        exp_repo.add_many(Expense(i, rnd.randint(1, categories), now, now)
+                          for i in range(n))
+        print(f'{n} expenses, {categories} categories')
+        expected = measure('linear category scan',
+                           lambda: linear_rows(cat_repo, exp_repo))
+        view_model = ExpenseRows(cat_repo)
+        results = [
+            measure('ExpenseRows.make_rows',
+                    lambda: view_model.make_rows(exp_repo.iter_all())),
+            measure('SQLiteRepository.get_rows (JOIN)',
+                    lambda: view_model.load(exp_repo)),
+        ]
+        assert all(rows == expected for rows in results)
+        exp_repo.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Экспорт расходов из SQLite: выгрузка через get_all (все объекты
+в памяти) против потоковых export_csv, export_jsonl и export_columns -
+время и пиковая память (tracemalloc), а также время открытия
+колоночной выгрузки и суммирования по ней.
+Число расходов можно передать первым аргументом командной строки.
+"""
+
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from inspect import get_annotations
+from typing import Callable
+
+from bookkeeper.columnar_export import export_columns, load_columns
+from bookkeeper.exporter import export_csv, export_jsonl, write_csv
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import ConnectionPool, SQLiteRepository
+
+N = 1_000_000
+
+
+def fill(repo: SQLiteRepository[Expense], n: int) -> None:
+    """ Добавить n расходов со случайными суммами, датами и категориями """
+    rnd = random.Random(0)
+    start = datetime(2023, 1, 1)
+    repo.add_many(Expense(rnd.randint(1, 100_000) / 100, rnd.randrange(1, 1001),
+                          start + timedelta(minutes=rnd.randrange(525_600)),
+                          start, f'покупка {i}')
+                  for i in range(n))
+
+
+def get_all_csv(repo: SQLiteRepository[Expense], path: str) -> int:
+    """ Выгрузка, как ее пришлось бы писать без модуля экспорта """
+    names = list(get_annotations(Expense))
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        return write_csv(file, names, ([getattr(exp, name) for name in names]
+                                       for exp in repo.get_all()))
+
+
+def measure(title: str, run: Callable[[], int]) -> None:
+    """
+    Вывести время и пиковую память: tracemalloc замедляет
+    создание объектов, поэтому память измеряется повторным запуском
+    """
+    start = time.perf_counter()
+    count = run()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f'  {title}: {count} rows, {elapsed:.2f} s, peak {peak / 2 ** 20:.1f} MiB')
+
+
+def main() -> None:
+    """ Сравнить способы выгрузки одной БД """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'export.db')
+        with ConnectionPool(db_file, profile='bulk-import') as pool:
+            repo = SQLiteRepository[Expense](db_file, Expense, pool=pool)
+            fill(repo, n)
+            print(f'{n} expenses')
+            measure('get_all + csv', lambda: get_all_csv(
+                repo, os.path.join(tmp, 'all.csv')))
+            measure('export_csv', lambda: export_csv(
+                repo, os.path.join(tmp, 'stream.csv')))
+            measure('export_jsonl', lambda: export_jsonl(
+                repo, os.path.join(tmp, 'stream.jsonl')))
+            columns_dir = os.path.join(tmp, 'columns')
+            measure('export_columns', lambda: export_columns(repo, columns_dir))
+        for name in os.listdir(tmp):
+            if name != 'columns':
+                size = os.path.getsize(os.path.join(tmp, name))
+                print(f'  {name}: {size / 2 ** 20:.1f} MiB')
+        size = sum(os.path.getsize(os.path.join(columns_dir, name))
+                   for name in os.listdir(columns_dir))
+        print(f'  columns: {size / 2 ** 20:.1f} MiB')
+        start = time.perf_counter()
+        columns = load_columns(columns_dir)
+        opened = time.perf_counter() - start
+        total = columns['amount'].sum()
+        elapsed = time.perf_counter() - start
+        print(f'  load_columns: {opened * 1e3:.2f} ms, '
+              f'with amount sum {elapsed * 1e3:.1f} ms (total {total:.2f})')
+        # отображения файлов должны быть закрыты до удаления каталога
+        del columns
+        with open(os.path.join(tmp, 'stream.csv'), encoding='utf-8', newline='') as file:
+            assert sum(1 for _ in csv.reader(file)) == n + 1
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Импорт расходов из CSV-файла (ExpenseImporter): время на строку
+для профилей надежности SQLite 'safe' и 'bulk-import'.
+Число строк можно передать первым аргументом командной строки.
+"""
+
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bookkeeper.importer import ExpenseImporter, ImportProgress, import_file
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import ConnectionPool, SQLiteRepository
+
+N = 1_000_000
+CATEGORIES = 1_000
+
+
+def write_csv(path: str, n: int) -> None:
+    """ Записать n строк со случайными суммами, датами и категориями """
+    rnd = random.Random(0)
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['amount', 'category', 'date', 'comment'])
+        for i in range(n):
+            writer.writerow([f'{rnd.randint(1, 100_000) / 100:.2f}',
+                             f'категория {rnd.randrange(CATEGORIES)}',
+                             f'2023-{rnd.randint(1, 12):02}-{rnd.randint(1, 28):02}',
+                             f'покупка {i}'])
+
+
+def run(db_file: str, csv_file: str, profile: str, n: int) -> None:
+    """ Импортировать файл в новую БД и вывести время """
+    with ConnectionPool(db_file, profile=profile) as pool:
+        cat_repo = SQLiteRepository[Category](db_file, Category, pool=pool)
+        cat_repo.add_many(Category(f'категория {i}') for i in range(CATEGORIES))
+        exp_repo = SQLiteRepository[Expense](db_file, Expense, pool=pool)
+        progress_repo = SQLiteRepository[ImportProgress](db_file, ImportProgress,
+                                                         pool=pool)
+        importer = ExpenseImporter(exp_repo, cat_repo, progress_repo,
+                                   defer_indexes=True)
+        start = time.perf_counter()
+        state = import_file(csv_file, importer)
+        elapsed = time.perf_counter() - start
+    print(f'{profile}: {state.added} rows in {elapsed:.2f} s, '
+          f'{elapsed / n * 1e6:.1f} us/row')
+
+
+def main() -> None:
+    """ Сравнить профили на одном файле """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'expenses.csv')
+        write_csv(csv_file, n)
+        for profile in ('safe', 'bulk-import'):
+            run(os.path.join(tmp, f'{profile}.db'), csv_file, profile, n)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Поиск расходов по диапазону дат и по категории в таблице из 1 млн записей
+с индексами, объявленными в модели Expense, и без них.
+Число записей можно передать первым аргументом командной строки.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+N = 1_000_000
+CATEGORIES = 100
+REPEAT = 20
+START = datetime(2020, 1, 1)
+
+
+def fill(repo: SQLiteRepository[Expense], n: int) -> None:
+    """ Заполнить таблицу случайными расходами за 3 года """
+    rnd = random.Random(0)
+    repo.add_many(
+        Expense(rnd.randint(1, 10_000), rnd.randint(1, CATEGORIES),
+                START + timedelta(minutes=rnd.randint(0, 3 * 365 * 24 * 60)),
+                START)
+        for _ in range(n))
+
+
+def measure(repo: SQLiteRepository[Expense]) -> dict[str, float]:
+    """ Среднее время выполнения запросов в миллисекундах """
+    queries = {
+        'date range (1 week)': {'expense_date__between': (
+            datetime(2021, 6, 1), datetime(2021, 6, 8))},
+        'category': {'category': 7},
+        'category + date range (1 month)': {
+            'category': 7,
+            'expense_date__between': (datetime(2021, 6, 1), datetime(2021, 7, 1))},
+    }
+    result = {}
+    for title, where in queries.items():
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            repo.get_all(where)
+        result[title] = (time.perf_counter() - start) / REPEAT * 1000
+        print(f'  {title}: {result[title]:.2f} ms, plan: {repo.explain(where)}')
+    return result
+
+
+def main() -> None:
+    """ Сравнить время запросов без индексов и с индексами """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    with tempfile.TemporaryDirectory() as tmp:
+        timings = {}
+        for title, indexes in (('without indexes', []), ('with indexes', None)):
+            path = os.path.join(tmp, f"{title.replace(' ', '_')}.db")
+            with SQLiteRepository[Expense](path, Expense, indexes=indexes) as repo:
+                start = time.perf_counter()
+                fill(repo, n)
+                print(f'{title}: filled {n} rows in '
+                      f'{time.perf_counter() - start:.1f} s')
+                timings[title] = measure(repo)
+    for query, plain in timings['without indexes'].items():
+        indexed = timings['with indexes'][query]
+        print(f'{query}: {plain:.2f} ms -> {indexed:.2f} ms '
+              f'({plain / indexed:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Открытие таблицы расходов: загрузка всех строк в TableModel
+и первой страницы в PagedTableModel, время и память (tracemalloc)
+для разного числа расходов в SQLite.
+Наибольшее число расходов можно передать первым аргументом командной строки.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.presenter.expense_presenter import ExpensePresenter
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.view.expense_view import PagedTableModel, TableModel
+
+N = 200_000
+
+
+class NoView:
+    """ Представление-заглушка для создания презентера """
+
+    def on_expense_add_button_clicked(self, slot: Any) -> None:
+        """ Не подключать обработчики """
+
+    on_expense_delete_button_clicked = on_expense_add_button_clicked
+
+
+def measure(title: str, func: Callable[[], Any]) -> None:
+    """ Вывести время и пиковую память вызова func """
+    tracemalloc.start()
+    start = time.perf_counter()
+    model = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'  {title}: {elapsed:.3f} s, peak {peak / 2 ** 20:.1f} MiB, '
+          f'{model.rowCount()} rows shown')
+
+
+def paged(presenter: ExpensePresenter) -> PagedTableModel:
+    """ Открыть таблицу с постраничной загрузкой """
+    model = PagedTableModel(presenter.fetch_expense_page, 6)
+    model.fetchMore()
+    return model
+
+
+def main() -> None:
+    """ Сравнить оба способа для 10%, 50% и 100% от наибольшего числа расходов """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'table.db')
+        cat_repo = SQLiteRepository[Category](db_file, Category)
+        exp_repo = SQLiteRepository[Expense](db_file, Expense)
+        cat_repo.add(Category('продукты'))
+        presenter = ExpensePresenter(None, NoView(), cat_repo, exp_repo)
+        loaded = 0
+        now = datetime(2023, 1, 1)
+        for size in (n // 10, n // 2, n):
+            exp_repo.add_many(Expense(i, 1, now, now) for i in range(size - loaded))
+            loaded = size
+            print(f'{size} expenses')
+            measure('TableModel, all rows', lambda: TableModel(
+                presenter.make_expense_rows(exp_repo.iter_all())))
+            measure('PagedTableModel, first page', lambda: paged(presenter))
+        exp_repo.close()
+
+
+if __name__ == '__main__':
+    main()
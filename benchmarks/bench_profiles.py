@@ -0,0 +1,76 @@
+"""
+Профили надежности SQLiteRepository (см. sqlite_repository.PROFILES):
+скорость записи по одной строке и пакетами (add_many), а также запись
+при читателе, постоянно выполняющем запросы из другого процесса.
+Число однострочных записей можно передать первым аргументом
+командной строки.
+"""
+
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from multiprocessing.sharedctypes import Synchronized
+from multiprocessing.synchronize import Event
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import (
+    PROFILES, ConnectionPool, SQLiteRepository)
+
+N = 1_000
+BULK = 100_000
+
+
+def reader(db_file: str, stop: Event, reads: 'Synchronized[int]') -> None:
+    """ Выполнять запросы к таблице расходов до сигнала stop """
+    con = sqlite3.connect(db_file, timeout=30)
+    while not stop.is_set():
+        con.execute('SELECT count(*), sum(amount) FROM expense').fetchone()
+        with reads.get_lock():
+            reads.value += 1
+    con.close()
+
+
+def writes(repo: SQLiteRepository[Expense], n: int) -> float:
+    """ Добавить n расходов по одному, вернуть число записей в секунду """
+    start = time.perf_counter()
+    for i in range(n):
+        repo.add(Expense(i, 1))
+    return n / (time.perf_counter() - start)
+
+
+def run(db_file: str, profile: str, n: int) -> None:
+    """ Замерить запись в профиле profile """
+    with ConnectionPool(db_file, profile=profile) as pool:
+        repo = SQLiteRepository[Expense](db_file, Expense, pool=pool)
+        alone = writes(repo, n)
+        start = time.perf_counter()
+        repo.add_many(Expense(i, 1) for i in range(BULK))
+        bulk = BULK / (time.perf_counter() - start)
+
+        stop = multiprocessing.Event()
+        reads = multiprocessing.Value('i', 0)
+        process = multiprocessing.Process(target=reader, args=(db_file, stop, reads))
+        process.start()
+        time.sleep(0.2)
+        start = time.perf_counter()
+        shared = writes(repo, n)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        process.join()
+    print(f'{profile:12} add: {alone:8.0f}/s  add_many: {bulk:8.0f}/s  '
+          f'add with reader: {shared:8.0f}/s  reads: {reads.value / elapsed:8.0f}/s')
+
+
+def main() -> None:
+    """ Запустить замеры для всех профилей на временных файлах """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in PROFILES:
+            run(os.path.join(tmp, f'{profile}.db'), profile, n)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Время get_all на 1 млн расходов при разных способах создания объектов
+из строк результата: прежний (перестановка pk через список и вызов
+конструктора), фабрика строк с __init__ и фабрика строк без __init__.
+Накладные расходы на строку считаются как разность со временем
+чтения строк без создания объектов. Сборщик мусора на время замеров
+отключается, чтобы его проходы по миллиону новых объектов
+не искажали сравнение.
+Число записей можно передать первым аргументом командной строки.
+"""
+
+import gc
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+N = 1_000_000
+
+
+def legacy_make_obj(row: tuple[Any, ...]) -> Expense:
+    """ Прежний SQLiteRepository._make_obj для строки SELECT * """
+    tuple_pk = int(row[0])
+    new_row = list(row)[1:]
+    new_row.append(tuple_pk)
+    return Expense(*new_row)
+
+
+def timed(title: str, n: int, func: Callable[[], Any], base: float = 0.) -> float:
+    """ Вывести время вызова func и накладные расходы на строку """
+    gc.collect()
+    gc.disable()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    gc.enable()
+    print(f'{title}: {elapsed:.3f} s, {(elapsed - base) / n * 1e6:.2f} us/row'
+          f'{" over fetch" if base else ""}')
+    return elapsed
+
+
+def main() -> None:
+    """ Заполнить временную БД и сравнить способы чтения """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'rows.db')
+        repo = SQLiteRepository[Expense](db_file, Expense, indexes=[])
+        fast = SQLiteRepository[Expense](db_file, Expense, indexes=[],
+                                         bypass_init=True)
+        now = datetime(2023, 1, 1)
+        repo.add_many(Expense(i, i % 100, now, now, 'c') for i in range(n))
+        con = repo.pool.connection()
+        fetch = timed('fetch rows only', n, lambda: con.execute(
+            'SELECT * FROM expense').fetchall())
+        timed('legacy _make_obj', n, lambda: [
+            legacy_make_obj(row)
+            for row in con.execute('SELECT * FROM expense').fetchall()], fetch)
+        timed('row factory, __init__', n, repo.get_all, fetch)
+        timed('row factory, bypass __init__', n, fast.get_all, fetch)
+        repo.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Задержка add / update / get в SQLiteRepository: запросы, составляемые
+при каждом вызове с подставленными в текст значениями (прежняя реализация),
+и запросы, подготовленные один раз, с параметрами.
+БД хранится в памяти, чтобы время фиксации транзакции на диске
+не заслоняло время разбора запросов.
+Число операций можно передать первым аргументом командной строки.
+"""
+
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from typing import Callable
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import ConnectionPool, SQLiteRepository
+
+N = 20_000
+NAMES = ['amount', 'category', 'expense_date', 'added_date', 'comment']
+
+
+def timed(title: str, n: int, func: Callable[[int], None]) -> None:
+    """ Вывести среднее время одного вызова func(i) """
+    start = time.perf_counter()
+    for i in range(n):
+        func(i)
+    print(f'  {title}: {(time.perf_counter() - start) / n * 1e6:.1f} us')
+
+
+def run_inline(n: int) -> None:
+    """ Прежнее поведение: текст запроса составляется заново при каждом вызове """
+    con = sqlite3.connect(':memory:')
+    con.execute('CREATE TABLE expense (pk INTEGER PRIMARY KEY, amount TEXT, '
+                'category INTEGER, expense_date TEXT, added_date TEXT, comment TEXT)')
+    now = datetime.now()
+
+    def add(i: int) -> None:
+        exp = Expense(i, 1, now, now)
+        names = ', '.join(NAMES)
+        place_holders = ', '.join('?' * len(NAMES))
+        with con:
+            con.execute(f'INSERT INTO expense ({names}) VALUES ({place_holders})',
+                        [getattr(exp, x) for x in NAMES])
+
+    def update(i: int) -> None:
+        exp = Expense(i + 1, 2, now, now, 'x', i + 1)
+        sets = ', '.join(f"{name} = '{getattr(exp, name)}'" for name in NAMES)
+        with con:
+            con.execute(f'UPDATE expense SET {sets} WHERE pk = {exp.pk}')
+
+    def get(i: int) -> None:
+        with con:
+            con.execute(f'SELECT * FROM expense WHERE pk = {i + 1}').fetchone()
+
+    print('inline SQL')
+    timed('add', n, add)
+    timed('update', n, update)
+    timed('get', n, get)
+    con.close()
+
+
+def run_prepared(n: int) -> None:
+    """ Тот же сценарий через SQLiteRepository """
+    pool = ConnectionPool(':memory:')
+    repo = SQLiteRepository[Expense](':memory:', Expense, pool=pool, indexes=[])
+    now = datetime.now()
+    print('prepared SQL')
+    timed('add', n, lambda i: repo.add(Expense(i, 1, now, now)) and None)
+    timed('update', n, lambda i: repo.update(Expense(i + 1, 2, now, now, 'x', i + 1)))
+    timed('get', n, lambda i: repo.get(i + 1) and None)
+    pool.close()
+
+
+def main() -> None:
+    """ Сравнить оба варианта """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    run_inline(n)
+    run_prepared(n)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Расходы и сумма по поддереву категорий за диапазон дат для дерева
+глубиной 5 уровней из 1 тыс. категорий: запрос WITH RECURSIVE
+в SQLiteRepository, реализация по умолчанию в MemoryRepository и
+прежний способ (get_subcategories и get_all для каждой подкатегории).
+Число расходов можно передать первым аргументом командной строки.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+N = 200_000
+LEVELS = (4, 4, 4, 4, 3)  # 4 + 16 + 64 + 256 + 768 = 1108 категорий
+REPEAT = 10
+START = datetime(2020, 1, 1)
+WHERE = {'expense_date__between': (datetime(2021, 1, 1), datetime(2021, 7, 1))}
+
+
+def fill(cat_repo: AbstractRepository[Category],
+         exp_repo: AbstractRepository[Expense], n: int) -> int:
+    """ Создать дерево категорий и расходы, вернуть id корня для запросов """
+    level = [None]
+    for width in LEVELS:
+        cats = [Category(f'{parent}.{i}', parent) for parent in level
+                for i in range(width)]
+        cat_repo.add_many(cats)
+        level = [cat.pk for cat in cats]
+    total = cat_repo.get_page('-pk', limit=1)[0].pk
+    rnd = random.Random(0)
+    exp_repo.add_many(
+        Expense(rnd.randint(1, 10_000), rnd.randint(1, total),
+                START + timedelta(minutes=rnd.randint(0, 3 * 365 * 24 * 60)))
+        for _ in range(n))
+    return 1
+
+
+def naive_total(cat_repo: AbstractRepository[Category],
+                exp_repo: AbstractRepository[Expense], root: int) -> float:
+    """ Прежний способ: отдельный запрос для каждой подкатегории """
+    cats = [cat_repo.get(root), *cat_repo.get(root).get_subcategories(cat_repo)]
+    return sum(float(e.amount) for cat in cats
+               for e in exp_repo.get_all({'category': cat.pk, **WHERE}))
+
+
+def measure(title: str, func: Callable[[], Any]) -> None:
+    """ Вывести среднее время вызова func """
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        result = func()
+    elapsed = (time.perf_counter() - start) / REPEAT * 1000
+    print(f'{title}: {elapsed:.1f} ms (total {float(result):.0f})')
+
+
+def main() -> None:
+    """ Сравнить способы вычисления суммы по поддереву """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    mem_cats, mem_exps = MemoryRepository[Category](), MemoryRepository[Expense]()
+    root = fill(mem_cats, mem_exps, n)
+    measure('MemoryRepository get_total_under',
+            lambda: mem_exps.get_total_under('amount', 'category', root, mem_cats, WHERE))
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'subtree.db')
+        cat_repo = SQLiteRepository[Category](db_file, Category)
+        exp_repo = SQLiteRepository[Expense](db_file, Expense)
+        root = fill(cat_repo, exp_repo, n)
+        measure('SQLiteRepository get_total_under (WITH RECURSIVE)',
+                lambda: exp_repo.get_total_under('amount', 'category', root,
+                                                 cat_repo, WHERE))
+        measure('SQLiteRepository get_all_under (WITH RECURSIVE)',
+                lambda: sum(float(e.amount) for e in exp_repo.get_all_under(
+                    'category', root, cat_repo, WHERE)))
+        measure('SQLiteRepository get_subcategories + get_all per category',
+                lambda: naive_total(cat_repo, exp_repo, root))
+        exp_repo.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Импорт дерева категорий из текстового файла: read_tree
+и create_from_tree (дерево целиком в памяти) против потокового
+iter_paths и create_from_paths - время и пиковая память (tracemalloc).
+Число категорий можно передать первым аргументом командной строки.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+from bookkeeper.models.category import Category
+from bookkeeper.repository.sqlite_repository import ConnectionPool, SQLiteRepository
+from bookkeeper.utils import iter_paths, read_tree
+
+N = 200_000
+# число подкатегорий у каждой категории трех верхних уровней
+FANOUT = 20
+
+
+def write_tree(path: str, n: int) -> None:
+    """
+    Записать дерево из n категорий с уникальными названиями
+    (иначе create_from_tree построит его неверно)
+    """
+    written = 0
+    with open(path, 'w', encoding='utf-8') as file:
+        def node(name: str, depth: int) -> None:
+            nonlocal written
+            if written == n:
+                return
+            file.write(f'{"    " * depth}{name}\n')
+            written += 1
+            if depth < 3:
+                for i in range(FANOUT):
+                    node(f'{name}.{i}', depth + 1)
+
+        root = 0
+        while written < n:
+            node(f'c{root}', 0)
+            root += 1
+
+
+def measure(title: str, db_file: str, run: Callable[[SQLiteRepository[Category]], int]
+            ) -> None:
+    """
+    Вывести время импорта и пиковую память: tracemalloc замедляет
+    создание объектов, поэтому память измеряется повторным импортом
+    """
+    results = []
+    for traced in (False, True):
+        with ConnectionPool(f'{db_file}.{traced}') as pool:
+            repo = SQLiteRepository[Category](pool.db_file, Category,
+                                              pool=pool, indexes=())
+            if traced:
+                tracemalloc.start()
+            start = time.perf_counter()
+            count = run(repo)
+            results.append(time.perf_counter() - start)
+            if traced:
+                results.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+    print(f'  {title}: {count} categories, {results[0]:.2f} s, '
+          f'peak {results[2] / 2 ** 20:.1f} MiB')
+
+
+def main() -> None:
+    """ Сравнить оба способа на одном файле """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    with tempfile.TemporaryDirectory() as tmp:
+        tree_file = os.path.join(tmp, 'tree.txt')
+        write_tree(tree_file, n)
+
+        def whole(repo: SQLiteRepository[Category]) -> int:
+            with open(tree_file, encoding='utf-8') as file:
+                return len(Category.create_from_tree(read_tree(file), repo))
+
+        def streaming(repo: SQLiteRepository[Category]) -> int:
+            with open(tree_file, encoding='utf-8') as file:
+                return Category.create_from_paths(iter_paths(file), repo)
+
+        print(f'{n} categories')
+        measure('read_tree + create_from_tree', os.path.join(tmp, 'whole.db'), whole)
+        measure('iter_paths + create_from_paths',
+                os.path.join(tmp, 'stream.db'), streaming)
+
+
+if __name__ == '__main__':
+    main()
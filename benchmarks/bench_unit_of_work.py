@@ -0,0 +1,51 @@
+"""
+Создание дерева категорий и добавление расходов по одному:
+каждая операция в своей транзакции и все операции в UnitOfWork.
+Число расходов можно передать первым аргументом командной строки.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from contextlib import nullcontext
+from typing import ContextManager
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import ConnectionPool, SQLiteRepository
+from bookkeeper.repository.unit_of_work import UnitOfWork
+
+N = 2_000
+TREE = [('продукты', None), ('мясо', 'продукты'), ('сырое мясо', 'мясо'),
+        ('книги', None), ('одежда', None)]
+
+
+def run(db_file: str, n: int, grouped: bool) -> float:
+    """ Выполнить сценарий и вернуть время в секундах """
+    with ConnectionPool(db_file) as pool:
+        cat_repo = SQLiteRepository[Category](db_file, Category, pool=pool)
+        exp_repo = SQLiteRepository[Expense](db_file, Expense, pool=pool)
+        unit: ContextManager[object] = (UnitOfWork(cat_repo, exp_repo)
+                                        if grouped else nullcontext())
+        start = time.perf_counter()
+        with unit:
+            cats = Category.create_from_tree(TREE, cat_repo)
+            for i in range(n):
+                exp_repo.add(Expense(i, cats[i % len(cats)].pk))
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    """ Сравнить оба варианта на временных файлах """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    with tempfile.TemporaryDirectory() as tmp:
+        separate = run(os.path.join(tmp, 'separate.db'), n, False)
+        grouped = run(os.path.join(tmp, 'grouped.db'), n, True)
+    print(f'{n} adds, transaction per call: {separate:.3f} s')
+    print(f'{n} adds, one UnitOfWork:       {grouped:.3f} s')
+    print(f'speedup: {separate / grouped:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+Экспорт записей в колоночный двоичный формат, который читается
+через отображение файлов в память без копирования (NumPy memmap)
+"""
+
+import json
+import os
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass
+from itertools import islice
+from types import NoneType
+from typing import Any, BinaryIO, Iterator, get_args
+
+import numpy as np
+import numpy.typing as npt
+
+from bookkeeper.exporter import BATCH_SIZE, sqlite_repository
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, init_order
+
+MANIFEST = 'manifest.json'
+# типы массивов для типов столбцов; столбцы остальных типов
+# хранятся строками UTF-8
+DTYPES = {
+    'INTEGER': '<i8',
+    'REAL': '<f8',
+    'BOOLEAN': '|b1',
+    'TIMESTAMP': '<M8[us]',
+    'DATE': '<M8[D]',
+}
+STRING = 'utf-8'
+
+
+class StringColumn:
+    """
+    Столбец строк: байты всех строк UTF-8 подряд (data) и смещения
+    начала каждой строки (offsets, на одно больше числа строк).
+    Строка декодируется только при обращении к ней. Если задана
+    маска mask, строки, отмеченные в ней, читаются как None.
+    """
+
+    def __init__(self, offsets: npt.NDArray[np.int64], data: npt.NDArray[np.uint8],
+                 mask: npt.NDArray[np.bool_] | None = None) -> None:
+        self.offsets = offsets
+        self.data = data
+        self.mask = mask
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str | None:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('string column index out of range')
+        if self.mask is not None and self.mask[index]:
+            return None
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return bytes(self.data[start:end]).decode()
+
+    def __iter__(self) -> Iterator[str | None]:
+        return (self[i] for i in range(len(self)))
+
+
+@dataclass
+class Column:
+    """
+    Описание выгруженного столбца (записывается в manifest.json).
+    name - название поля
+    type - тип столбца SQLite
+    dtype - тип массива (см. DTYPES) или STRING
+    nullable - поле необязательное, записывается маска NULL
+    """
+    name: str
+    type: str
+    dtype: str
+    nullable: bool
+
+
+class _ColumnWriter:  # pylint: disable=too-few-public-methods
+    """ Запись значений столбца-массива и маски NULL порциями """
+
+    def __init__(self, files: ExitStack, path: str, column: Column) -> None:
+        self.column = column
+        self.file = self._open(files, path, column.name)
+        self.null = (self._open(files, path, f'{column.name}.null')
+                     if column.nullable else None)
+
+    @staticmethod
+    def _open(files: ExitStack, path: str, name: str) -> BinaryIO:
+        return files.enter_context(open(os.path.join(path, f'{name}.bin'), 'wb'))
+
+    def write(self, values: tuple[Any, ...]) -> None:
+        """ Дописать порцию значений столбца """
+        if self.null is not None:
+            mask: npt.NDArray[np.bool_] = np.fromiter(
+                (value is None for value in values), np.bool_, len(values))
+            mask.tofile(self.null)
+        self._write_values(values)
+
+    def _write_values(self, values: tuple[Any, ...]) -> None:
+        if self.null is not None and self.column.type in ('INTEGER', 'BOOLEAN'):
+            values = tuple(0 if value is None else value for value in values)
+        array: npt.NDArray[Any] = np.array(values, self.column.dtype)
+        array.tofile(self.file)
+
+
+class _StringWriter(_ColumnWriter):  # pylint: disable=too-few-public-methods
+    """ Запись строк UTF-8 подряд и смещений их концов """
+
+    def __init__(self, files: ExitStack, path: str, column: Column) -> None:
+        super().__init__(files, path, column)
+        self.offsets = self._open(files, path, f'{column.name}.offsets')
+        np.zeros(1, np.int64).tofile(self.offsets)
+        self.written = 0
+
+    def _write_values(self, values: tuple[Any, ...]) -> None:
+        encoded = [b'' if value is None else str(value).encode() for value in values]
+        lengths: npt.NDArray[np.int64] = np.fromiter(map(len, encoded), np.int64,
+                                                     len(encoded))
+        offsets = self.written + np.cumsum(lengths)
+        offsets.tofile(self.offsets)
+        self.file.write(b''.join(encoded))
+        self.written = int(offsets[-1])
+
+
+def _columns(inner: SQLiteRepository[Any]) -> list[Column]:
+    columns = []
+    for name in init_order(inner.cls):
+        sql_type = inner.columns.get(name, 'INTEGER').upper()
+        columns.append(Column(name, sql_type, DTYPES.get(sql_type, STRING),
+                              NoneType in get_args(inner.fields.get(name))))
+    return columns
+
+
+def export_columns(repo: AbstractRepository[Any], path: str,
+                   where: dict[str, Any] | None = None,
+                   batch_size: int = BATCH_SIZE) -> int:
+    """
+    Выгрузить записи SQLite-репозитория (по условию where) в каталог
+    path: каждый столбец - отдельный файл с массивом значений
+    (см. DTYPES; даты - datetime64), строки - файл байтов UTF-8 и файл
+    смещений {столбец}.offsets.bin. Для необязательных полей модели
+    записывается маска {столбец}.null.bin (True - значение NULL).
+    Описание столбцов и число строк записываются в manifest.json
+    после всех данных. Строки читаются из курсора порциями
+    по batch_size и дописываются в файлы, поэтому объем памяти
+    не зависит от числа записей.
+
+    Returns
+    -------
+    Число выгруженных записей
+    """
+    inner = sqlite_repository(repo)
+    columns = _columns(inner)
+    os.makedirs(path, exist_ok=True)
+    # каталог без manifest.json считается незавершенной выгрузкой
+    if os.path.exists(os.path.join(path, MANIFEST)):
+        os.remove(os.path.join(path, MANIFEST))
+    count = 0
+    with ExitStack() as files:
+        writers = [(_StringWriter if column.dtype == STRING else _ColumnWriter)(
+            files, path, column) for column in columns]
+        rows = inner.iter_rows(where, batch_size)
+        while batch := list(islice(rows, batch_size)):
+            count += len(batch)
+            for writer, values in zip(writers, zip(*batch)):
+                writer.write(values)
+    with open(os.path.join(path, MANIFEST), 'w', encoding='utf-8') as manifest:
+        json.dump({'table': inner.table_name, 'rows': count,
+                   'columns': [asdict(column) for column in columns]}, manifest)
+    return count
+
+
+def load_columns(path: str) -> dict[str, Any]:
+    """
+    Открыть столбцы, выгруженные export_columns, без чтения файлов
+    в память: массивы - np.memmap (только чтение), строки -
+    StringColumn над такими массивами, необязательные поля -
+    маскированные массивы (np.ma.MaskedArray) над ними же.
+
+    Returns
+    -------
+    Словарь {столбец: массив} в порядке столбцов файла
+    """
+    with open(os.path.join(path, MANIFEST), encoding='utf-8') as file:
+        manifest = json.load(file)
+    rows = manifest['rows']
+    result: dict[str, Any] = {}
+    for column in manifest['columns']:
+        name = column['name']
+        mask = None
+        if column['nullable']:
+            mask = _map(os.path.join(path, f'{name}.null.bin'), '|b1', rows)
+        if column['dtype'] == STRING:
+            offsets = _map(os.path.join(path, f'{name}.offsets.bin'), '<i8', rows + 1)
+            data = _map(os.path.join(path, f'{name}.bin'), '|u1', int(offsets[-1]))
+            result[name] = StringColumn(offsets, data, mask)
+            continue
+        values = _map(os.path.join(path, f'{name}.bin'), column['dtype'], rows)
+        result[name] = values if mask is None else np.ma.masked_array(values, mask)
+    return result
+
+
+def _map(path: str, dtype: str, size: int) -> npt.NDArray[Any]:
+    # пустой файл нельзя отобразить в память
+    if size == 0:
+        return np.empty(0, dtype)
+    return np.memmap(path, dtype, mode='r', shape=(size,))
@@ -0,0 +1,11 @@
+"""
+Настройки БД, общие для графического приложения (main.py)
+и консольного клиента (simple_client.py)
+"""
+
+DB_NAME = 'test.db'
+# профиль надежности БД (см. sqlite_repository.PROFILES): 'safe' - синхронизация
+# с диском при каждой фиксации, 'balanced' - WAL и synchronous=NORMAL,
+# 'bulk-import' - без синхронизации с диском, только для массовой загрузки данных.
+# Процессы, одновременно работающие с одним файлом, используют один профиль
+DB_PROFILE = 'balanced'
@@ -0,0 +1,114 @@
+"""
+Экспорт расходов и сводных данных в файлы CSV и JSON Lines
+"""
+
+import csv
+import json
+from typing import Any, Iterable, TextIO
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, unwrap
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, init_order
+
+# число строк, читаемых из курсора за один раз
+BATCH_SIZE = 10_000
+
+
+def sqlite_repository(repo: AbstractRepository[Any]) -> SQLiteRepository[Any]:
+    """
+    Получить SQLiteRepository, над которым построен репозиторий
+    (например, CachedRepository); для других репозиториев - ValueError
+    """
+    inner = unwrap(repo)
+    if not isinstance(inner, SQLiteRepository):
+        raise ValueError('only SQLite repositories can be exported')
+    return inner
+
+
+def write_csv(file: TextIO, header: Iterable[str],
+              rows: Iterable[Iterable[Any]]) -> int:
+    """
+    Записать строки в CSV-файл с заголовком. Подходит и для сводных
+    данных, например:
+    write_csv(file, ('period', 'total'), repo.get_totals(...).items())
+
+    Parameters
+    ----------
+    file - файл, открытый с newline=''
+    header - названия столбцов
+    rows - строки значений (None записывается пустой строкой)
+
+    Returns
+    -------
+    Число записанных строк (без заголовка)
+    """
+    writer = csv.writer(file)
+    writer.writerow(header)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_jsonl(file: TextIO, header: Iterable[str],
+                rows: Iterable[Iterable[Any]]) -> int:
+    """
+    Записать строки в файл JSON Lines: по объекту {столбец: значение}
+    в строке. Значения, не представимые в JSON (например, даты),
+    записываются строками.
+
+    Returns
+    -------
+    Число записанных строк
+    """
+    names = tuple(header)
+    encode = json.JSONEncoder(ensure_ascii=False, default=str).encode
+    count = 0
+    for row in rows:
+        file.write(encode(dict(zip(names, row))))
+        file.write('\n')
+        count += 1
+    return count
+
+
+def export_csv(repo: AbstractRepository[Any], path: str,
+               where: dict[str, Any] | None = None,
+               batch_size: int = BATCH_SIZE) -> int:
+    """
+    Выгрузить записи SQLite-репозитория (по условию where) в CSV-файл.
+    Строки читаются из курсора порциями и сразу записываются в файл,
+    объекты модели не создаются, поэтому объем памяти не зависит
+    от числа записей. Значения записываются так, как они хранятся
+    в БД (даты - строками ISO, см. SQLiteRepository.iter_rows).
+
+    Returns
+    -------
+    Число выгруженных записей
+    """
+    inner = sqlite_repository(repo)
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        return write_csv(file, init_order(inner.cls),
+                         inner.iter_rows(where, batch_size))
+
+
+def export_jsonl(repo: AbstractRepository[Any], path: str,
+                 where: dict[str, Any] | None = None,
+                 batch_size: int = BATCH_SIZE) -> int:
+    """
+    Выгрузить записи SQLite-репозитория (по условию where) в файл
+    JSON Lines. Объекты JSON составляет sqlite (см.
+    SQLiteRepository.iter_json), строки записываются в файл по мере
+    чтения из курсора.
+
+    Returns
+    -------
+    Число выгруженных записей
+    """
+    inner = sqlite_repository(repo)
+    count = 0
+    with open(path, 'w', encoding='utf-8') as file:
+        for line in inner.iter_json(where, batch_size):
+            file.write(line)
+            file.write('\n')
+            count += 1
+    return count
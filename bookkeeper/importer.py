@@ -0,0 +1,326 @@
+"""
+Импорт расходов из файлов CSV и банковских выписок OFX
+"""
+
+import csv
+import math
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator
+
+from bookkeeper.models.budget import RunningTotals
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository, unwrap
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.unit_of_work import UnitOfWork
+
+# запись источника: номер строки файла и значения полей
+# amount, category, date, comment (необязательные поля могут отсутствовать)
+Record = tuple[int, dict[str, str]]
+
+DATE_FORMATS = ('%d.%m.%Y', '%d.%m.%Y %H:%M', '%d.%m.%Y %H:%M:%S')
+
+_OFX_TAG = re.compile(r'<(/?)(\w+)>([^<]*)')
+
+
+def read_csv(lines: Iterable[str], columns: dict[str, str] | None = None,
+             delimiter: str = ',') -> Iterator[Record]:
+    """
+    Читать записи из CSV-файла с заголовком по одной строке.
+
+    Parameters
+    ----------
+    lines - файл (открытый с newline='') или строки
+    columns - соответствие названий столбцов файла полям записи,
+    например {'Сумма': 'amount', 'Категория': 'category'}; столбцы
+    с названиями полей (amount, category, date, comment) можно не указывать
+    delimiter - разделитель значений
+
+    Yields
+    -------
+    Пары (номер строки, {поле: значение})
+    """
+    reader = csv.reader(lines, delimiter=delimiter)
+    header = next(reader, None)
+    if header is None:
+        return
+    names = [(columns or {}).get(name.strip(), name.strip()) for name in header]
+    for row in reader:
+        if row:
+            yield reader.line_num, dict(zip(names, row))
+
+
+def read_ofx(lines: Iterable[str]) -> Iterator[Record]:
+    """
+    Читать операции из банковской выписки OFX (SGML или XML) по одной
+    строке. Списания (отрицательные TRNAMT) становятся расходами
+    с положительной суммой, поступления - записями с отрицательной
+    суммой, которые отклоняются при проверке. Категория ищется
+    по получателю платежа (NAME), комментарий - MEMO или NAME.
+
+    Yields
+    -------
+    Пары (номер строки начала операции, {поле: значение})
+    """
+    transaction: dict[str, str] = {}
+    start = 0   # строка начала текущей операции, 0 - вне операции
+    for number, line in enumerate(lines, start=1):
+        for closing, tag, value in _OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and start:
+                    yield start, _ofx_record(transaction)
+                    start = 0
+                elif not closing:
+                    transaction, start = {}, number
+            elif start and not closing:
+                transaction[tag] = value.strip()
+    if start:
+        yield start, _ofx_record(transaction)
+
+
+def _ofx_record(transaction: dict[str, str]) -> dict[str, str]:
+    amount = transaction.get('TRNAMT', '')
+    # дата OFX: ГГГГММДД[ЧЧММСС[.XXX]][[смещение:зона]]
+    posted = transaction.get('DTPOSTED', '')
+    day = f'{posted[:4]}-{posted[4:6]}-{posted[6:8]}'
+    if len(posted) >= 14 and posted[8:14].isdigit():
+        day += f' {posted[8:10]}:{posted[10:12]}:{posted[12:14]}'
+    name = transaction.get('NAME', '')
+    return {'amount': amount[1:] if amount.startswith('-') else f'-{amount}',
+            'category': name,
+            'date': day if posted else '',
+            'comment': transaction.get('MEMO') or name}
+
+
+@dataclass
+class ImportProgress:
+    """
+    Состояние импорта источника, сохраняемое после каждой порции
+    (см. ExpenseImporter).
+    source - название источника (например, путь к файлу)
+    position - число обработанных записей источника
+    added - число добавленных расходов
+    rejected - число отклоненных записей
+    pk - id записи в базе данных
+    """
+    source: str
+    position: int = 0
+    added: int = 0
+    rejected: int = 0
+    pk: int = 0
+
+
+class ExpenseImporter:
+    """
+    Импорт расходов из потока записей (см. read_csv, read_ofx).
+    Категории ищутся по названию в словаре, который строится один раз
+    при создании импортера; записи проверяются и добавляются порциями
+    по batch_size через repo.add_many. Каждая порция вместе с сохраненным
+    состоянием импорта (ImportProgress) записывается одной транзакцией
+    (UnitOfWork), поэтому после сбоя повторный вызов run с тем же
+    источником пропускает уже обработанные записи и продолжает
+    с первой незаписанной. Для загрузки больших файлов в SQLite
+    можно использовать профиль 'bulk-import' (см. PROFILES)
+    и defer_indexes.
+
+    Parameters
+    ----------
+    exp_repo - репозиторий расходов
+    cat_repo - репозиторий категорий
+    progress_repo - репозиторий состояний импорта (в одном пуле с exp_repo
+    для SQLite); без него импорт нельзя продолжить после сбоя
+    batch_size - число записей источника в порции
+    default_category - категория для записей с неизвестной категорией
+    (по умолчанию такие записи отклоняются)
+    max_errors - число сохраняемых описаний ошибок (см. errors)
+    defer_indexes - на время run удалить индексы таблицы расходов
+    SQLite и построить их после загрузки (см.
+    SQLiteRepository.deferred_indexes)
+    totals - суммы RunningTotals, подписанные на exp_repo: на время run
+    они отписываются, и каждая порция учитывается одним изменением
+    затронутых сумм в той же транзакции (см. RunningTotals.added_many).
+    Хранилище сумм SQLite должно использовать пул exp_repo.
+    """
+
+    def __init__(self, exp_repo: AbstractRepository[Expense],
+                 cat_repo: AbstractRepository[Category],
+                 progress_repo: AbstractRepository[ImportProgress] | None = None,
+                 batch_size: int = 10_000,
+                 default_category: str | None = None,
+                 max_errors: int = 100,
+                 defer_indexes: bool = False,
+                 totals: RunningTotals | None = None) -> None:
+        self.exp_repo = exp_repo
+        self.totals = totals
+        self.progress_repo = progress_repo
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.defer_indexes = defer_indexes
+        # одинаковые названия в разных ветвях дерева неоднозначны
+        self.categories: dict[str, int | None] = {}
+        for cat in cat_repo.iter_all():
+            self.categories[cat.name] = None if cat.name in self.categories else cat.pk
+        self.default_category: int | None = None
+        if default_category is not None:
+            self.default_category = self._category(default_category)
+        self.errors: list[tuple[int, str]] = []
+
+    def _category(self, name: str) -> int:
+        if name not in self.categories:
+            raise ValueError(f'unknown category {name!r}')
+        pk = self.categories[name]
+        if pk is None:
+            raise ValueError(f'ambiguous category name {name!r}')
+        return pk
+
+    def parse(self, record: dict[str, str], now: datetime | None = None) -> Expense:
+        """
+        Проверить запись и создать расход. Сумма должна быть
+        положительным числом (допускаются запятая и пробелы), дата -
+        в формате ISO или ДД.ММ.ГГГГ (по умолчанию - now). now также
+        становится датой добавления (по умолчанию - текущее время).
+        При ошибке возбуждается ValueError с описанием.
+        """
+        text = record.get('amount', '')
+        try:
+            amount = float(text)
+        except ValueError:
+            text = text.replace(',', '.').replace(' ', '').replace('\xa0', '')
+            amount = float(text)
+        if not amount > 0 or math.isinf(amount):
+            raise ValueError(f'amount must be a positive number, got {text!r}')
+        name = record.get('category', '').strip()
+        if name in self.categories or self.default_category is None:
+            category = self._category(name)
+        else:
+            category = self.default_category
+        day = record.get('date', '').strip()
+        now = now or datetime.now()
+        return Expense(amount, category, _parse_date(day) if day else now, now,
+                       record.get('comment', '').strip())
+
+    def load_progress(self, source: str) -> ImportProgress:
+        """ Получить сохраненное состояние импорта источника """
+        if self.progress_repo is not None:
+            for state in self.progress_repo.get_all({'source': source}):
+                return state
+        return ImportProgress(source)
+
+    def reset(self, source: str) -> None:
+        """ Удалить состояние импорта, чтобы импортировать источник заново """
+        if self.progress_repo is not None:
+            for state in self.progress_repo.get_all({'source': source}):
+                self.progress_repo.delete(state.pk)
+
+    def run(self, records: Iterable[Record], source: str,
+            progress: Callable[[ImportProgress], Any] | None = None
+            ) -> ImportProgress:
+        """
+        Импортировать записи источника, продолжив с сохраненного
+        положения.
+
+        Parameters
+        ----------
+        records - записи (номер строки, поля)
+        source - название источника для сохранения состояния
+        progress - функция, вызываемая после каждой записанной порции
+
+        Returns
+        -------
+        Состояние импорта (с учетом предыдущих запусков)
+        """
+        state = self.load_progress(source)
+        self.errors = []
+        repo = unwrap(self.exp_repo)
+        if self.totals is not None:
+            self.exp_repo.remove_hook(self.totals)
+        try:
+            if self.defer_indexes and isinstance(repo, SQLiteRepository):
+                with repo.deferred_indexes():
+                    self._run(iter(records), state, progress)
+            else:
+                self._run(iter(records), state, progress)
+        finally:
+            if self.totals is not None:
+                self.exp_repo.add_hook(self.totals)
+        return state
+
+    def _run(self, records: Iterator[Record], state: ImportProgress,
+             progress: Callable[[ImportProgress], Any] | None) -> None:
+        for _ in islice(records, state.position):
+            pass
+        while True:
+            batch: list[Expense] = []
+            consumed = rejected = 0
+            now = datetime.now()
+            for line, record in islice(records, self.batch_size):
+                consumed += 1
+                try:
+                    batch.append(self.parse(record, now))
+                except ValueError as error:
+                    rejected += 1
+                    if len(self.errors) < self.max_errors:
+                        self.errors.append((line, str(error)))
+            if not consumed:
+                return
+            self._write(state, batch, consumed, rejected)
+            if progress is not None:
+                progress(state)
+
+    def _write(self, state: ImportProgress, batch: list[Expense],
+               consumed: int, rejected: int) -> None:
+        repos: list[AbstractRepository[Any]] = [self.exp_repo]
+        if self.progress_repo is not None:
+            repos.append(self.progress_repo)
+        if self.totals is not None:
+            repos.append(self.totals.store)
+        saved = (state.position, state.added, state.rejected)
+        try:
+            with UnitOfWork(*repos):
+                self.exp_repo.add_many(batch)
+                if self.totals is not None:
+                    self.totals.added_many(batch)
+                state.position += consumed
+                state.added += len(batch)
+                state.rejected += rejected
+                if self.progress_repo is not None and state.pk:
+                    self.progress_repo.update(state)
+                elif self.progress_repo is not None:
+                    self.progress_repo.add(state)
+        except BaseException:
+            state.position, state.added, state.rejected = saved
+            if self.totals is not None:
+                self.totals.reload()
+            raise
+
+
+def _parse_date(text: str) -> datetime:
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f'unknown date format {text!r}')
+
+
+def import_file(path: str, importer: ExpenseImporter,
+                progress: Callable[[ImportProgress], Any] | None = None
+                ) -> ImportProgress:
+    """
+    Импортировать файл CSV или OFX (по расширению .ofx, .qfx),
+    источник - путь к файлу (см. ExpenseImporter.run)
+    """
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.lower().endswith(('.ofx', '.qfx')):
+            records = read_ofx(file)
+        else:
+            records = read_csv(file)
+        return importer.run(records, path, progress)
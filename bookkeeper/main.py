@@ -3,14 +3,22 @@
 """
 
 import sys
-from PySide6 import QtWidgets
+from PySide6 import QtCore, QtWidgets
 from bookkeeper.view.expense_view import MainWindow
+from bookkeeper.config import DB_NAME, DB_PROFILE
 from bookkeeper.presenter.expense_presenter import ExpensePresenter
+from bookkeeper.models.budget import Budget, PeriodTotal, RunningTotals
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
+from bookkeeper.repository.async_repository import AsyncRepository
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.change_feed import ChangeFeed
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
 
-DB_NAME = 'test.db'
+# число строк таблицы расходов, загружаемых за один раз при прокрутке
+PAGE_SIZE = 200
+# период проверки изменений, сделанных другими процессами, мс
+POLL_INTERVAL = 1000
 
 if __name__ == '__main__':
     app = QtWidgets.QApplication(sys.argv)
@@ -18,9 +26,24 @@ if __name__ == '__main__':
     view = MainWindow()
     MODEL = None
 
-    cat_repo = SQLiteRepository[Category](DB_NAME, Category)
+    cat_repo = CachedRepository(SQLiteRepository[Category](DB_NAME, Category,
+                                                           profile=DB_PROFILE))
     exp_repo = SQLiteRepository[Expense](DB_NAME, Expense)
+    budget_repo = SQLiteRepository[Budget](DB_NAME, Budget)
+    totals = RunningTotals(exp_repo, SQLiteRepository[PeriodTotal](DB_NAME, PeriodTotal))
 
-    window = ExpensePresenter(MODEL, view, cat_repo, exp_repo)
+    # страницы таблицы, таблица бюджета, добавление и удаление расходов
+    # выполняются в фоновом потоке, не блокируя интерфейс
+    loader = AsyncRepository(exp_repo, dispatch=view.dispatch)
+    app.aboutToQuit.connect(loader.close)
+
+    window = ExpensePresenter(MODEL, view, cat_repo, exp_repo, budget_repo, totals,
+                              loader, page_size=PAGE_SIZE)
+    feed = ChangeFeed(exp_repo.pool)
+    app.aboutToQuit.connect(feed.close)
+    window.watch(feed)
+    timer = QtCore.QTimer()
+    timer.timeout.connect(window.poll_changes)
+    timer.start(POLL_INTERVAL)
     window.show()
     app.exec()
@@ -0,0 +1,291 @@
+"""
+Модель бюджета и расчет сумм расходов за день / неделю / месяц
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime
+from math import isclose
+from typing import Any, Iterable
+
+from .expense import Expense
+from ..repository.abstract_repository import AbstractRepository, RepositoryHook
+from ..repository.query import PERIODS, next_period_start, period_start
+from ..repository.unit_of_work import UnitOfWork
+
+
+@dataclass
+class Budget:
+    """
+    Бюджет - ограничение суммы расходов за период.
+    period - период: 'day', 'week' или 'month'
+    amount - максимальная сумма расходов за период
+    pk - id записи в базе данных
+    """
+    period: str
+    amount: float
+    pk: int = 0
+
+    def get_spent(self, repo: AbstractRepository[Any],
+                  today: date | None = None) -> float:
+        """
+        Получить сумму расходов за текущий период бюджета.
+
+        Parameters
+        ----------
+        repo - репозиторий расходов (Expense)
+        today - дата, определяющая текущий период (по умолчанию сегодня)
+
+        Returns
+        -------
+        Сумма расходов за период
+        """
+        start = period_start(today or datetime.now(), self.period)
+        end = next_period_start(start, self.period)
+        totals = repo.get_totals('amount', 'expense_date', self.period, {
+            'expense_date__ge': datetime.combine(start, datetime.min.time()),
+            'expense_date__lt': datetime.combine(end, datetime.min.time()),
+        })
+        return float(sum(totals.values()))
+
+    def is_exceeded(self, repo: AbstractRepository[Any],
+                    today: date | None = None) -> bool:
+        """ Проверить, превышен ли бюджет в текущем периоде """
+        return self.get_spent(repo, today) > self.amount
+
+
+def rollup(day_totals: dict[date, float], period: str) -> dict[date, float]:
+    """
+    Свернуть суммы по дням в суммы по неделям или месяцам.
+
+    Parameters
+    ----------
+    day_totals - словарь {день: сумма}
+    period - 'day', 'week' или 'month'
+
+    Returns
+    -------
+    Словарь {первый день периода: сумма}
+    """
+    totals: dict[date, float] = {}
+    for day, total in day_totals.items():
+        key = period_start(day, period)
+        totals[key] = totals.get(key, 0) + total
+    return totals
+
+
+def get_rollups(repo: AbstractRepository[Any],
+                where: dict[str, Any] | None = None
+                ) -> dict[str, dict[date, float]]:
+    """
+    Получить суммы расходов по дням, неделям и месяцам. Хранилище
+    вычисляет только суммы по дням, недели и месяцы получаются из них
+    без повторного обращения к расходам.
+
+    Parameters
+    ----------
+    repo - репозиторий расходов (Expense)
+    where - условие отбора расходов (как в get_all)
+
+    Returns
+    -------
+    Словарь {период: {первый день периода: сумма}}
+    """
+    days = repo.get_totals('amount', 'expense_date', 'day', where)
+    return {period: days if period == 'day' else rollup(days, period)
+            for period in PERIODS}
+
+
+@dataclass
+class PeriodTotal:
+    """
+    Сохраненная сумма расходов категории за период (см. RunningTotals).
+    period - 'day', 'week' или 'month'
+    start - первый день периода в формате ISO ('YYYY-MM-DD')
+    category - id категории расходов
+    amount - сумма расходов
+    pk - id записи в базе данных
+    """
+    period: str
+    start: str
+    category: int
+    amount: float
+    pk: int = 0
+
+
+TotalKey = tuple[str, str, int]
+# поля PeriodTotal, образующие ключ суммы
+KEY_FIELDS = ('period', 'start', 'category')
+
+
+def _keys(exp: Expense) -> list[TotalKey]:
+    return [(period, period_start(exp.expense_date, period).isoformat(),
+             int(exp.category)) for period in PERIODS]
+
+
+class RunningTotals(RepositoryHook[Expense]):
+    """
+    Суммы расходов по ключу (период, первый день периода, категория),
+    которые поддерживаются в актуальном состоянии при каждом изменении
+    репозитория расходов: добавление, изменение или удаление расхода
+    меняет не более шести сумм и не требует пересчета.
+    Суммы сохраняются в отдельном репозитории (store), поэтому при запуске
+    приложения просмотр всех расходов не нужен. Изменение суммы
+    прибавляется к сохраненной в хранилище (store.accumulate), поэтому
+    несколько процессов с одним файлом БД не затирают изменения друг
+    друга; кэш получает сумму, фактически записанную в хранилище.
+    Изменения, сделанные в обход подписанного репозитория, можно найти
+    методом check и исправить методом rebuild. При массовой загрузке
+    RunningTotals можно отписать от репозитория и учесть каждую порцию
+    расходов методом added_many.
+    """
+
+    def __init__(self, exp_repo: AbstractRepository[Expense],
+                 store: AbstractRepository[PeriodTotal]) -> None:
+        self.exp_repo = exp_repo
+        self.store = store
+        self._records: dict[TotalKey, PeriodTotal] = {}
+        stored = self.reload()
+        # повторяющиеся ключи оставляли прежние версии, записывавшие
+        # суммы без уникального индекса
+        if (len(self._records) < stored
+                or not self._records and exp_repo.get_page(limit=1)):
+            self.rebuild()
+        exp_repo.add_hook(self)
+
+    def get_total(self, period: str, day: date,
+                  category: int | None = None) -> float:
+        """
+        Получить сумму расходов за период, в который попадает день day,
+        по одной категории или по всем категориям (category=None)
+        """
+        start = period_start(day, period).isoformat()
+        if category is not None:
+            record = self._records.get((period, start, category))
+            return 0 if record is None else float(record.amount)
+        return float(sum(float(record.amount)
+                         for (rec_period, rec_start, _), record in self._records.items()
+                         if rec_period == period and rec_start == start))
+
+    def added(self, obj: Expense) -> None:
+        self._apply(obj, 1)
+
+    def updated(self, old: Expense, new: Expense) -> None:
+        self._apply(old, -1)
+        self._apply(new, 1)
+
+    def deleted(self, obj: Expense) -> None:
+        self._apply(obj, -1)
+
+    def rolled_back(self) -> None:
+        """
+        Перечитать суммы из хранилища; если хранилище не входило
+        в отмененную транзакцию и суммы расходятся с расходами,
+        пересчитать их
+        """
+        if self.check():
+            self.rebuild()
+
+    def reload(self) -> int:
+        """ Перечитать суммы из хранилища, вернуть число прочитанных записей """
+        records = list(self.store.iter_all())
+        self._records = {(t.period, t.start, t.category): t for t in records}
+        return len(records)
+
+    def added_many(self, objs: Iterable[Expense]) -> None:
+        """
+        Учесть расходы, добавленные без вызова обработчика (например,
+        импортом): каждая затронутая сумма изменяется в хранилище один раз
+        """
+        for key, amount in self._sum(objs).items():
+            self._accumulate(key, amount)
+
+    def _apply(self, exp: Expense, sign: int) -> None:
+        for key in _keys(exp):
+            self._accumulate(key, sign * float(exp.amount))
+
+    def _accumulate(self, key: TotalKey, amount: float) -> None:
+        self._records[key] = self.store.accumulate(
+            PeriodTotal(*key, amount), 'amount', KEY_FIELDS)
+
+    @staticmethod
+    def _sum(objs: Iterable[Expense]) -> dict[TotalKey, float]:
+        totals: dict[TotalKey, float] = {}
+        for exp in objs:
+            for key in _keys(exp):
+                totals[key] = totals.get(key, 0) + float(exp.amount)
+        return totals
+
+    def compute(self) -> dict[TotalKey, float]:
+        """ Вычислить суммы заново за один проход по всем расходам """
+        return self._sum(self.exp_repo.iter_all())
+
+    def check(self) -> dict[TotalKey, tuple[float, float]]:
+        """
+        Перечитать сохраненные суммы и сравнить их с вычисленными заново.
+
+        Returns
+        -------
+        Словарь {ключ: (сохраненная сумма, фактическая сумма)}
+        для расходящихся сумм; пустой словарь, если расхождений нет
+        """
+        self.reload()
+        return self._diff(self.compute())
+
+    def _diff(self, actual: dict[TotalKey, float]
+              ) -> dict[TotalKey, tuple[float, float]]:
+        diff = {}
+        for key in actual.keys() | self._records.keys():
+            record = self._records.get(key)
+            stored = 0. if record is None else float(record.amount)
+            if not isclose(stored, actual.get(key, 0.), abs_tol=1e-6):
+                diff[key] = (stored, actual.get(key, 0.))
+        return diff
+
+    def rebuild(self) -> dict[TotalKey, tuple[float, float]]:
+        """
+        Пересчитать суммы заново и заменить ими сохраненные.
+
+        Returns
+        -------
+        Найденные расхождения (как в check)
+        """
+        self.reload()
+        actual = self.compute()
+        diff = self._diff(actual)
+        records = {key: PeriodTotal(*key, amount) for key, amount in actual.items()}
+        # при ошибке в хранилище остаются прежние суммы
+        with UnitOfWork(self.store):
+            for pk in [record.pk for record in self.store.iter_all()]:
+                self.store.delete(pk)
+            self.store.add_many(records.values())
+        self._records = records
+        return diff
+
+
+class StoredTotals(RepositoryHook[PeriodTotal]):
+    """
+    Обработчик изменений хранилища сумм, сделанных другими процессами
+    (см. ChangeFeed.watch): переносит измененные суммы в RunningTotals.
+    Расходы, добавленные другим процессом, учитываются его RunningTotals,
+    поэтому подписывать RunningTotals на такие изменения расходов не нужно,
+    достаточно получить измененные суммы.
+    """
+    # pylint: disable=protected-access
+
+    def __init__(self, totals: RunningTotals) -> None:
+        self.totals = totals
+
+    def added(self, obj: PeriodTotal) -> None:
+        self.totals._records[obj.period, obj.start, obj.category] = obj
+
+    def updated(self, old: PeriodTotal, new: PeriodTotal) -> None:
+        self.added(new)
+
+    def deleted(self, obj: PeriodTotal) -> None:
+        records = self.totals._records
+        key = (obj.period, obj.start, obj.category)
+        if key in records and records[key].pk == obj.pk:
+            del records[key]
+
+    def rolled_back(self) -> None:
+        self.totals.reload()
@@ -2,10 +2,11 @@
 Модель категории расходов
 """
 from collections import defaultdict
-from dataclasses import dataclass
-from typing import Iterator
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator
 
-from ..repository.abstract_repository import AbstractRepository
+from ..repository.abstract_repository import AbstractRepository, RepositoryHook
+from ..repository.unit_of_work import UnitOfWork
 
 
 @dataclass
@@ -14,9 +15,10 @@ class Category:
     Категория расходов, хранит название в атрибуте name и ссылку (id) на
     родителя (категория, подкатегорией которой является данная) в атрибуте parent.
     У категорий верхнего уровня parent = None
+    Поля name и parent индексируются в БД (см. metadata)
     """
-    name: str
-    parent: int | None = None
+    name: str = field(metadata={'index': True})
+    parent: int | None = field(default=None, metadata={'index': True})
     pk: int = 0
 
     def get_parent(self,
@@ -42,6 +44,8 @@ class Category:
                         ) -> Iterator['Category']:
         """
         Получить все категории верхнего уровня в иерархии.
+        Каждый предок запрашивается из репозитория отдельно,
+        для повторных запросов используйте CategoryTree.get_ancestors.
 
         Parameters
         ----------
@@ -63,6 +67,8 @@ class Category:
         """
         Получить все подкатегории из иерархии, т.е. непосредственные
         подкатегории данной, все их подкатегории и т.д.
+        При каждом вызове загружаются все категории,
+        для повторных запросов используйте CategoryTree.get_descendants.
 
         Parameters
         ----------
@@ -94,12 +100,17 @@ class Category:
         Создать дерево категорий из списка пар "потомок-родитель".
         Список должен быть топологически отсортирован, т.е. потомки
         не должны встречаться раньше своего родителя.
+        Категории одного уровня вложенности добавляются одним вызовом
+        repo.add_many.
         Проверка корректности исходных данных не производится.
         При использовании СУБД с проверкой внешних ключей, будет получена
         ошибка (для sqlite3 - IntegrityError). При отсутствии проверки
         со стороны СУБД, результат, возможно, будет корректным, если исходные
         данные корректны за исключением сортировки. Если нет, то нет.
         "Мусор на входе, мусор на выходе".
+        Названия категорий должны быть уникальными: для деревьев
+        с одинаковыми названиями в разных ветвях и для больших деревьев
+        используйте create_from_paths.
 
         Parameters
         ----------
@@ -111,8 +122,206 @@ class Category:
         Список созданных объектов Category
         """
         created: dict[str, Category] = {}
+        # категории группируются по уровням вложенности: родители любого
+        # уровня уже имеют pk к моменту добавления уровня целиком через add_many
+        items: list[tuple[int, Category, Category | None]] = []
+        depth: dict[str, int] = {}
         for child, parent in tree:
-            cat = cls(child, created[parent].pk if parent is not None else None)
-            repo.add(cat)
+            level = 0 if parent is None else depth[parent] + 1
+            cat = cls(child)
+            items.append((level, cat, None if parent is None else created[parent]))
+            depth[child] = level
             created[child] = cat
+        _add_by_level(items, repo)
         return list(created.values())
+
+    @classmethod
+    def create_from_paths(cls, paths: Iterable[tuple[str, ...]],
+                          repo: AbstractRepository['Category'],
+                          batch_size: int = 10_000) -> int:
+        """
+        Создать дерево категорий из путей - кортежей названий от категории
+        верхнего уровня до создаваемой (см. utils.iter_paths), читая их
+        потоком. Путь к родителю должен встретиться раньше потомков,
+        а потомки - идти сразу за родителем или другими его потомками
+        (порядок обхода в глубину, как в текстовом файле дерева).
+        Родитель определяется по пути, поэтому одинаковые названия
+        в разных ветвях допустимы.
+        Категории добавляются порциями по batch_size, порция - одним
+        вызовом repo.add_many на каждый уровень вложенности. В памяти
+        хранятся только порция и категории пути к текущей, поэтому
+        объем памяти не зависит от размера дерева. Все категории
+        добавляются одной транзакцией (UnitOfWork): при ошибке
+        не добавляется ни одна.
+
+        Parameters
+        ----------
+        paths - пути категорий
+        repo - репозиторий для сохранения объектов
+        batch_size - число категорий в порции
+
+        Returns
+        -------
+        Число созданных категорий
+        """
+        created = 0
+        batch: list[tuple[int, Category, Category | None]] = []
+        path_cats: list[Category] = []
+        with UnitOfWork(repo):
+            for path in paths:
+                level = len(path) - 1
+                if (level > len(path_cats)
+                        or [cat.name for cat in path_cats[:level]] != list(path[:-1])):
+                    raise ValueError(f'parent of category {path} must precede it')
+                del path_cats[level:]
+                cat = cls(path[-1])
+                batch.append((level, cat, path_cats[-1] if path_cats else None))
+                path_cats.append(cat)
+                if len(batch) == batch_size:
+                    created += _add_by_level(batch, repo)
+                    batch = []
+            created += _add_by_level(batch, repo)
+        return created
+
+
+def _add_by_level(items: list[tuple[int, Category, Category | None]],
+                  repo: AbstractRepository[Category]) -> int:
+    # элементы - (уровень, категория, родитель); родитель добавляется
+    # раньше потомков, поэтому к добавлению уровня его pk уже известен
+    levels: dict[int, list[tuple[Category, Category | None]]] = defaultdict(list)
+    for level, cat, parent in items:
+        levels[level].append((cat, parent))
+    for level in sorted(levels):
+        for cat, parent in levels[level]:
+            if parent is not None:
+                cat.parent = parent.pk
+        repo.add_many(cat for cat, _ in levels[level])
+    return len(items)
+
+
+class CategoryTree(RepositoryHook[Category]):
+    """
+    Кэшированное дерево категорий репозитория. Все категории загружаются
+    одним запросом при первом обращении, после чего предки, подкатегории
+    и проверка вложенности вычисляются без обращения к репозиторию.
+    Категории хранятся в порядке обхода в глубину, поэтому подкатегории
+    любой категории образуют непрерывный отрезок этого порядка.
+    Дерево подписывается на изменения репозитория и перестраивается
+    при следующем обращении после любого изменения.
+    Категории, родитель которых отсутствует в репозитории, считаются
+    категориями верхнего уровня.
+    """
+
+    def __init__(self, repo: AbstractRepository[Category]) -> None:
+        self.repo = repo
+        self._nodes: dict[int, Category] = {}
+        self._order: list[int] = []
+        self._start: dict[int, int] = {}
+        self._end: dict[int, int] = {}
+        self._valid = False
+        repo.add_hook(self)
+
+    def added(self, obj: Category) -> None:
+        self._valid = False
+
+    def updated(self, old: Category, new: Category) -> None:
+        self._valid = False
+
+    def deleted(self, obj: Category) -> None:
+        self._valid = False
+
+    def rolled_back(self) -> None:
+        self._valid = False
+
+    def _build(self) -> None:
+        if self._valid:
+            return
+        cats = self.repo.get_all()
+        nodes = {cat.pk: cat for cat in cats}
+        children: dict[int | None, list[int]] = defaultdict(list)
+        for cat in cats:
+            children[cat.parent if cat.parent in nodes else None].append(cat.pk)
+        order: list[int] = []
+        start: dict[int, int] = {}
+        end: dict[int, int] = {}
+        stack: list[tuple[int, bool]] = [(pk, False) for pk in reversed(children[None])]
+        while stack:
+            pk, done = stack.pop()
+            if done:
+                end[pk] = len(order)
+                continue
+            start[pk] = len(order)
+            order.append(pk)
+            stack.append((pk, True))
+            stack.extend((child, False) for child in reversed(children[pk])
+                         if child not in start)
+        self._nodes, self._order, self._start, self._end = nodes, order, start, end
+        self._valid = True
+
+    def get(self, pk: int) -> Category | None:
+        """ Получить категорию по id """
+        self._build()
+        return self._nodes.get(pk)
+
+    def get_ancestors(self, pk: int) -> list[Category]:
+        """
+        Получить всех предков категории: от родителя
+        до категории верхнего уровня
+        """
+        self._build()
+        result: list[Category] = []
+        parent = self._nodes[pk].parent
+        while parent in self._nodes and len(result) < len(self._nodes):
+            result.append(self._nodes[parent])
+            parent = self._nodes[parent].parent
+        return result
+
+    def get_descendants(self, pk: int) -> list[Category]:
+        """ Получить все подкатегории любого уровня в порядке обхода в глубину """
+        self._build()
+        return [self._nodes[x] for x in self._order[self._start[pk] + 1:self._end[pk]]]
+
+    def is_under(self, pk: int, ancestor: int) -> bool:
+        """ Проверить, является ли категория pk подкатегорией ancestor """
+        self._build()
+        return self._start[ancestor] < self._start[pk] < self._end[ancestor]
+
+    def roll_up(self, sums: dict[int, float]) -> dict[int, float]:
+        """
+        Просуммировать значения по поддеревьям: для каждой категории
+        вернуть сумму ее собственного значения и значений всех подкатегорий.
+
+        Parameters
+        ----------
+        sums - словарь {id категории: значение}
+
+        Returns
+        -------
+        Словарь {id категории: сумма по поддереву} для всех категорий
+        """
+        self._build()
+        totals = dict.fromkeys(self._order, 0.)
+        for pk in reversed(self._order):
+            totals[pk] += sums.get(pk, 0)
+            parent = self._nodes[pk].parent
+            if parent in totals:
+                totals[parent] += totals[pk]
+        return totals
+
+    def get_subtree_totals(self, exp_repo: AbstractRepository[Any],
+                           where: dict[str, Any] | None = None
+                           ) -> dict[int, float]:
+        """
+        Получить суммы расходов по категориям с учетом всех подкатегорий.
+        Расходы суммируются по категориям одним запросом (get_sums).
+
+        Parameters
+        ----------
+        exp_repo - репозиторий расходов (Expense)
+        where - условие отбора расходов (как в get_all)
+
+        Returns
+        -------
+        Словарь {id категории: сумма расходов по поддереву}
+        """
+        return self.roll_up(exp_repo.get_sums('amount', 'category', where))
@@ -16,10 +16,14 @@ class Expense:
     added_date - дата добавления в бд
     comment - комментарий
     pk - id записи в базе данных
+    Поля category и expense_date индексируются в БД (см. metadata),
+    индекс по expense_date включает amount, чтобы суммы по периодам
+    вычислялись без обращения к таблице
     """
     amount: float
-    category: int
-    expense_date: datetime = field(default_factory=datetime.now)
+    category: int = field(metadata={'index': ('expense_date',)})
+    expense_date: datetime = field(default_factory=datetime.now,
+                                   metadata={'index': ('amount',)})
     added_date: datetime = field(default_factory=datetime.now)
     comment: str = ''
     pk: int = 0
@@ -2,10 +2,19 @@
 Модуль, который отрисовывает данные, полученные извне и переданные в модуль View
 """
 
+from datetime import date
 from inspect import get_annotations
-from typing import Any
+from typing import Any, Callable, Iterable
+from bookkeeper.models.budget import Budget, StoredTotals
 from bookkeeper.models.expense import Expense
 from bookkeeper.models.category import Category
+from bookkeeper.presenter.view_model import ExpenseRows
+from bookkeeper.repository.abstract_repository import RepositoryHook
+from bookkeeper.repository.async_repository import Dispatch, call_now
+from bookkeeper.repository.change_feed import ChangeFeed
+from bookkeeper.repository.query import PERIODS
+
+PERIOD_NAMES = {'day': 'День', 'week': 'Неделя', 'month': 'Месяц'}
 
 
 def make_tuple_from_attr(obj: Any,
@@ -25,39 +34,195 @@ def make_tuple_from_attr(obj: Any,
     return result
 
 
+class ExpenseTableHook(RepositoryHook[Expense]):
+    """
+    Переносит изменения репозитория расходов в таблицу представления:
+    добавляется, заменяется или удаляется только строка измененного расхода.
+    Изменения, сделанные в фоновом потоке (см. AsyncRepository), передаются
+    представлению через функцию dispatch в поток интерфейса.
+    """
+
+    def __init__(self, presenter: 'ExpensePresenter',
+                 dispatch: Dispatch = call_now) -> None:
+        self.presenter = presenter
+        self.dispatch = dispatch
+
+    def added(self, obj: Expense) -> None:
+        self.dispatch(lambda: self.presenter.expense_changed(obj.pk, obj))
+
+    def updated(self, old: Expense, new: Expense) -> None:
+        self.dispatch(lambda: self.presenter.expense_changed(new.pk, new))
+
+    def deleted(self, obj: Expense) -> None:
+        self.dispatch(lambda: self.presenter.expense_changed(obj.pk, None))
+
+    def rolled_back(self) -> None:
+        self.dispatch(self._reload)
+
+    def _reload(self) -> None:
+        if self.presenter.table_shown:
+            self.presenter.update_expense_data()
+
+
+class ChangeFlag(RepositoryHook[Any]):
+    """ Отмечает, что репозиторий изменился """
+
+    changed = False
+
+    def added(self, obj: Any) -> None:
+        self.changed = True
+
+    def updated(self, old: Any, new: Any) -> None:
+        self.changed = True
+
+    def deleted(self, obj: Any) -> None:
+        self.changed = True
+
+    def rolled_back(self) -> None:
+        self.changed = True
+
+
 class ExpensePresenter:
 
-    def __init__(self, model, view, cat_repo, exp_repo):
+    def __init__(self, model, view, cat_repo, exp_repo, budget_repo=None,
+                 totals=None, loader=None, page_size=None):
         self.model = model
         self.view = view
         self.cat_repo = cat_repo
         self.cat_data = []
-        for single_cat in self.cat_repo.get_all():
-            self.cat_data.append(
-                make_tuple_from_attr(single_cat, get_annotations(Category)))
+        self.load_categories()
+        # строки таблицы расходов: названия категорий по pk за O(1)
+        self.rows = ExpenseRows(cat_repo)
 
         self.view.on_expense_add_button_clicked(self.handle_expense_add_button_clicked)
         self.view.on_expense_delete_button_clicked(
             self.handle_expense_delete_button_clicked)
         self.exp_repo = exp_repo
-        self.exp_data = []
-        for single_exp in self.exp_repo.get_all():
-            self.exp_data.append(
-                make_tuple_from_attr(single_exp, get_annotations(Expense)))
+        self.budget_repo = budget_repo
+        self.totals = totals
+        # AsyncRepository: если задан, выборки для таблиц, добавление
+        # и удаление расходов выполняются в фоновом потоке, устаревшие
+        # результаты выборок отбрасываются
+        self.loader = loader
+        # если задан размер страницы, таблица расходов загружается
+        # страницами по мере прокрутки
+        self.page_size = page_size
+        # изменения расходов отражаются в таблице построчно
+        self.table_shown = False
+        self.expense_hook = ExpenseTableHook(
+            self, call_now if loader is None else loader.dispatch)
+        exp_repo.add_hook(self.expense_hook)
+        # журнал изменений, сделанных другими процессами (см. watch)
+        self.feed: ChangeFeed | None = None
+        self.categories_changed = ChangeFlag()
+
+    def load_categories(self) -> None:
+        """ Перечитать список категорий для выпадающего списка """
+        self.cat_data = [make_tuple_from_attr(single_cat, get_annotations(Category))
+                         for single_cat in self.cat_repo.get_all()]
+
+    def watch(self, feed: ChangeFeed) -> None:
+        """
+        Получать изменения БД, сделанные другими процессами (например,
+        simple_client.py): расходы, категории и суммы RunningTotals.
+        Изменения передаются при вызове poll_changes
+        """
+        self.feed = feed
+        feed.watch(self.exp_repo, self.expense_hook)
+        feed.watch(self.cat_repo, self.rows, self.categories_changed)
+        if self.totals is not None:
+            feed.watch(self.totals.store, StoredTotals(self.totals))
+
+    def poll_changes(self) -> None:
+        """
+        Проверить журнал изменений (см. watch) и обновить представление:
+        строки измененных расходов, а при изменении категорий - список
+        категорий и таблицу расходов целиком
+        """
+        if self.feed is None or not self.feed.poll():
+            return
+        if self.categories_changed.changed:
+            self.categories_changed.changed = False
+            self.load_categories()
+            self.view.set_category_dropdown(self.cat_data)
+            if self.table_shown:
+                self.update_expense_data()
+        self.update_budget_data()
+
+    def expense_changed(self, pk: int, exp: Expense | None) -> None:
+        """
+        Обновить строку таблицы расходов для добавленного или измененного
+        расхода exp (None - расход с данным pk удален)
+        """
+        if not self.table_shown:
+            return
+        if self._reloading():
+            self.update_expense_data()
+        elif exp is None:
+            self.view.remove_expense_row(pk)
+        else:
+            self.view.update_expense_row(self.rows.make_row(exp))
 
     def update_expense_data(self) -> None:
         """
-        Обновляет данные для отрисовки в соответствии с текущим состоянием БД
+        Обновляет данные для отрисовки в соответствии с текущим состоянием БД.
+        Если задан page_size, представление получает функцию загрузки
+        страниц и читает расходы по мере прокрутки; если задан loader,
+        данные (и страницы) читаются в фоновом потоке и передаются
+        представлению по готовности
+        """
+        self.table_shown = True
+        if self.page_size is not None:
+            self.view.set_expense_pages(
+                self.fetch_expense_page, len(get_annotations(Expense)), self.page_size,
+                None if self.loader is None else self.loader.submit)
+        elif self.loader is None:
+            self.view.set_expense_table(self.rows.load(self.exp_repo))
+        else:
+            self.loader.submit(self.rows.load, self.exp_repo,
+                               key='expenses', callback=self.view.set_expense_table)
+
+    def fetch_expense_page(self, after_pk: int | None, limit: int) -> list[list[Any]]:
+        """
+        Получить строки таблицы расходов для limit расходов с pk больше after_pk
+        (None - с первого расхода)
+        """
+        return self.rows.load(self.exp_repo, after_pk, limit)
+
+    def make_expense_rows(self, expenses: Iterable[Expense]) -> list[list[Any]]:
+        """
+        Составить строки таблицы расходов, заменив id категорий названиями
+        """
+        return self.rows.make_rows(expenses)
+
+    def update_budget_data(self) -> None:
+        """
+        Обновляет таблицу бюджета: суммы расходов за текущие день, неделю
+        и месяц берутся из поддерживаемых сумм (RunningTotals), если они
+        заданы, иначе считаются в репозитории без загрузки всех расходов.
+        Если задан loader, строки составляются в фоновом потоке
         """
+        if self.loader is not None:
+            self.loader.submit(self.make_budget_rows, key='budget',
+                               callback=self.view.set_budget_table)
+        else:
+            self.view.set_budget_table(self.make_budget_rows())
+
+    def make_budget_rows(self) -> list[list[Any]]:
+        """ Составить строки таблицы бюджета """
+        limits: dict[str, float] = {}
+        if self.budget_repo is not None:
+            limits = {b.period: b.amount for b in self.budget_repo.get_all()}
         data = []
-        for single_exp in self.exp_repo.get_all():
-            row_exp = list(make_tuple_from_attr(single_exp, get_annotations(Expense)))
-            for cat_tup in self.cat_data:
-                if cat_tup[-1] == row_exp[1]:
-                    row_exp[1] = cat_tup[0]
-                    break
-            data.append(row_exp)
-        self.view.set_expense_table(data)
+        for period in PERIODS:
+            limit = limits.get(period)
+            if self.totals is not None:
+                spent = self.totals.get_total(period, date.today())
+            else:
+                spent = Budget(period, limit or 0).get_spent(self.exp_repo)
+            data.append([PERIOD_NAMES[period], spent,
+                         '' if limit is None else limit])
+        return data
 
     def show(self) -> None:
         """
@@ -65,24 +230,42 @@ class ExpensePresenter:
         """
         self.view.show()
         self.update_expense_data()
+        self.update_budget_data()
         self.view.set_category_dropdown(self.cat_data)
 
     def handle_expense_add_button_clicked(self) -> None:
         """
-        Создает новую трату в репозитории;
-        Обновляет таблицу в приложении
+        Создает новую трату в репозитории (в фоновом потоке, если задан
+        loader); добавляет в таблицу приложения только новую строку
         """
         cat_pk = self.view.get_selected_cat()
         amount = self.view.get_amount()
-        exp = Expense(amount, cat_pk)
-        self.exp_repo.add(exp)
-        self.update_expense_data()
+        self._write(self.exp_repo.add, Expense(amount, cat_pk))
 
     def handle_expense_delete_button_clicked(self) -> None:
         """
-        Удаляет выбранную пользователем трату из репозитория;
-        Обновляет таблицу в приложении
+        Удаляет выбранную пользователем трату из репозитория (в фоновом
+        потоке, если задан loader); удаляет из таблицы приложения только
+        ее строку
         """
         exp_pk = self.view.get_selected_exp()
-        self.exp_repo.delete(exp_pk)
-        self.update_expense_data()
+        self._write(self.exp_repo.delete, exp_pk)
+
+    def _write(self, method: Callable[[Any], None], arg: Any) -> None:
+        # таблица расходов обновляется обработчиком ExpenseTableHook,
+        # таблица бюджета - после завершения записи
+        if self.loader is None:
+            method(arg)
+            self.update_budget_data()
+            return
+
+        def reraise(error: BaseException) -> None:
+            raise error
+
+        self.loader.submit(method, arg, callback=lambda _: self.update_budget_data(),
+                           errback=reraise)
+
+    def _reloading(self) -> bool:
+        # пока таблица загружается в фоне, изменение отражается
+        # новой загрузкой: ее результат заменит загружаемый
+        return self.loader is not None and self.loader.pending('expenses')
@@ -0,0 +1,85 @@
+"""
+Модуль описывает преобразование расходов в строки таблицы для отображения
+"""
+
+from inspect import get_annotations
+from operator import attrgetter
+from typing import Any, Iterable
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository, RepositoryHook
+
+
+class ExpenseRows(RepositoryHook[Category]):
+    """
+    Строки таблицы расходов: значения полей расхода в порядке аннотаций
+    Expense (pk - последним), id категории заменен ее названием.
+    Список полей и функция чтения их значений вычисляются один раз,
+    категории хранятся в словаре {pk: Category}, который загружается
+    при первом обращении и поддерживается обработчиками изменений
+    репозитория категорий, поэтому строка составляется за O(1).
+    """
+
+    fields = tuple(get_annotations(Expense))
+    category_column = fields.index('category')
+
+    def __init__(self, cat_repo: AbstractRepository[Category]) -> None:
+        self.cat_repo = cat_repo
+        self._values = attrgetter(*self.fields)
+        self._categories: dict[int, Category] | None = None
+        cat_repo.add_hook(self)
+
+    @property
+    def categories(self) -> dict[int, Category]:
+        """ Словарь {pk: Category} всех категорий """
+        if self._categories is None:
+            self._categories = {cat.pk: cat for cat in self.cat_repo.iter_all()}
+        return self._categories
+
+    def added(self, obj: Category) -> None:
+        if self._categories is not None:
+            self._categories[obj.pk] = obj
+
+    def updated(self, old: Category, new: Category) -> None:
+        self.added(new)
+
+    def deleted(self, obj: Category) -> None:
+        if self._categories is not None:
+            self._categories.pop(obj.pk, None)
+
+    def rolled_back(self) -> None:
+        self._categories = None
+
+    def make_row(self, exp: Expense) -> list[Any]:
+        """ Составить строку таблицы для расхода """
+        row = list(self._values(exp))
+        cat = self.categories.get(row[self.category_column])
+        if cat is not None:
+            row[self.category_column] = cat.name
+        return row
+
+    def make_rows(self, expenses: Iterable[Expense]) -> list[list[Any]]:
+        """ Составить строки таблицы для нескольких расходов """
+        categories = self.categories
+        column = self.category_column
+        get_values = self._values
+        rows = []
+        for exp in expenses:
+            row = list(get_values(exp))
+            cat = categories.get(row[column])
+            if cat is not None:
+                row[column] = cat.name
+            rows.append(row)
+        return rows
+
+    def load(self, exp_repo: AbstractRepository[Expense],
+             after_pk: int | None = None,
+             limit: int | None = None) -> list[list[Any]]:
+        """
+        Получить строки таблицы из репозитория расходов (get_rows): для
+        SQLiteRepository в одном файле с категориями - одним запросом
+        с JOIN, без создания объектов Expense
+        """
+        return exp_repo.get_rows({'category': (self.cat_repo, 'name')},
+                                 after_pk=after_pk, limit=limit)
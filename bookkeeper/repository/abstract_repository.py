@@ -7,8 +7,15 @@
 использовать его для иных целей.
 """
 
+import heapq
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Protocol, Any
+from copy import copy
+from datetime import date
+from inspect import get_annotations
+from operator import attrgetter
+from typing import Generic, Iterable, Iterator, TypeVar, Protocol, Any
+
+from bookkeeper.repository.query import page_key, parse_order, period_start
 
 
 class Model(Protocol):  # pylint: disable=too-few-public-methods
@@ -21,6 +28,29 @@ class Model(Protocol):  # pylint: disable=too-few-public-methods
 T = TypeVar('T', bound=Model)
 
 
+class RepositoryHook(Generic[T]):
+    """
+    Обработчик изменений репозитория (см. AbstractRepository.add_hook).
+    Методы вызываются после того, как изменение выполнено,
+    по умолчанию ничего не делают.
+    """
+
+    def added(self, obj: T) -> None:
+        """ Объект добавлен в репозиторий """
+
+    def updated(self, old: T, new: T) -> None:
+        """ Объект обновлен, old - сохраненная ранее версия """
+
+    def deleted(self, obj: T) -> None:
+        """ Объект удален из репозитория """
+
+    def rolled_back(self) -> None:
+        """
+        Изменения, о которых сообщалось обработчику, отменены (см. UnitOfWork):
+        состояние, вычисленное по ним, нужно перечитать из репозитория
+        """
+
+
 class AbstractRepository(ABC, Generic[T]):
     """
     Абстрактный репозиторий.
@@ -30,8 +60,31 @@ class AbstractRepository(ABC, Generic[T]):
     get_all
     update
     delete
+    Наследники должны вызывать обработчики из hooks после каждого
+    изменения (см. add_hook).
+    Методы с реализацией по умолчанию (наследники могут переопределить
+    их более эффективной версией):
+    add_many
+    accumulate
+    iter_all
+    get_page
+    get_totals
+    get_sums
+    get_all_under
+    get_total_under
+    get_rows
     """
 
+    hooks: tuple[RepositoryHook[T], ...] = ()
+
+    def add_hook(self, hook: RepositoryHook[T]) -> None:
+        """ Подписать обработчик на изменения репозитория """
+        self.hooks = (*self.hooks, hook)
+
+    def remove_hook(self, hook: RepositoryHook[T]) -> None:
+        """ Отписать обработчик от изменений репозитория """
+        self.hooks = tuple(h for h in self.hooks if h is not hook)
+
     @abstractmethod
     def add(self, obj: T) -> int:
         """
@@ -39,6 +92,32 @@ class AbstractRepository(ABC, Generic[T]):
         также записать id в атрибут pk.
         """
 
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить несколько объектов в репозиторий, вернуть список их id,
+        также записать id в атрибут pk каждого объекта.
+        objs может быть генератором, он будет прочитан один раз.
+        """
+        return [self.add(obj) for obj in objs]
+
+    def accumulate(self, obj: T, field: str, key: tuple[str, ...]) -> T:
+        """
+        Прибавить значение поля field объекта obj к записи, у которой
+        значения полей key совпадают со значениями obj, или добавить obj,
+        если такой записи нет.
+
+        Returns
+        -------
+        Записанный объект с итоговым значением field
+        """
+        for old in self.get_all({name: getattr(obj, name) for name in key}):
+            new = copy(old)
+            setattr(new, field, getattr(old, field) + getattr(obj, field))
+            self.update(new)
+            return new
+        self.add(obj)
+        return obj
+
     @abstractmethod
     def get(self, pk: int) -> T | None:
         """ Получить объект по id """
@@ -47,10 +126,141 @@ class AbstractRepository(ABC, Generic[T]):
     def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
         """
         Получить все записи по некоторому условию
-        where - условие в виде словаря {'название_поля': значение}
+        where - условие в виде словаря {'название_поля': значение},
+        ключ может содержать оператор: {'amount__gt': 100}
+        (см. bookkeeper.repository.query)
         если условие не задано (по умолчанию), вернуть все записи
         """
 
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        """
+        Перебрать все записи по некоторому условию (аналогично get_all),
+        не собирая их в список. Объекты создаются по мере чтения,
+        batch_size - размер порции, читаемой из хранилища за один раз.
+        """
+        yield from self.get_all(where)
+
+    def get_page(self, order_by: str = 'pk',
+                 after_key: tuple[Any, int] | None = None,
+                 limit: int = 100) -> list[T]:
+        """
+        Получить страницу записей при постраничной выборке по ключу
+        (keyset pagination).
+        order_by - поле сортировки, '-field' - по убыванию; при равных
+        значениях записи упорядочиваются по pk в том же направлении.
+        Поле сортировки не должно содержать None.
+        after_key - ключ последней записи предыдущей страницы
+        (см. bookkeeper.repository.query.page_key), None - первая страница
+        limit - максимальное число записей на странице
+        """
+        _, descending = parse_order(order_by)
+        objs: Iterable[T] = self.iter_all()
+        if after_key is not None:
+            after = after_key
+            objs = (obj for obj in objs if (page_key(obj, order_by) < after
+                                            if descending else
+                                            page_key(obj, order_by) > after))
+        select = heapq.nlargest if descending else heapq.nsmallest
+        return select(limit, objs, key=lambda obj: page_key(obj, order_by))
+
+    def get_totals(self, value_field: str, date_field: str, period: str,
+                   where: dict[str, Any] | None = None) -> dict[date, float]:
+        """
+        Получить суммы значений поля value_field по периодам.
+        date_field - поле с датой, по которой запись относится к периоду
+        period - 'day', 'week' или 'month'
+        where - условие отбора записей (как в get_all)
+        Возвращает словарь {первый день периода: сумма}
+        для периодов, в которых есть записи.
+        Реализация по умолчанию выполняет один проход по iter_all.
+        """
+        totals: dict[date, float] = {}
+        for obj in self.iter_all(where):
+            key = period_start(getattr(obj, date_field), period)
+            totals[key] = totals.get(key, 0) + getattr(obj, value_field)
+        return totals
+
+    def get_sums(self, value_field: str, group_field: str,
+                 where: dict[str, Any] | None = None) -> dict[Any, float]:
+        """
+        Получить суммы значений поля value_field, сгруппированные
+        по значению поля group_field, для записей, удовлетворяющих условию
+        where (как в get_all). Возвращает словарь {значение group_field: сумма}.
+        Реализация по умолчанию выполняет один проход по iter_all.
+        """
+        sums: dict[Any, float] = {}
+        for obj in self.iter_all(where):
+            key = getattr(obj, group_field)
+            sums[key] = sums.get(key, 0) + getattr(obj, value_field)
+        return sums
+
+    def get_all_under(self, field: str, root: int,
+                      tree: 'AbstractRepository[Any]',
+                      where: dict[str, Any] | None = None) -> list[T]:
+        """
+        Получить записи, у которых поле field ссылается на запись root
+        иерархического репозитория tree или на любого ее потомка
+        (иерархия задается полем parent объектов tree), например расходы
+        по категории со всеми подкатегориями.
+        where - дополнительное условие (как в get_all)
+        """
+        pks = subtree_pks(tree, root)
+        return [obj for obj in self.iter_all(where) if getattr(obj, field) in pks]
+
+    def get_total_under(self, value_field: str, field: str, root: int,
+                        tree: 'AbstractRepository[Any]',
+                        where: dict[str, Any] | None = None) -> float:
+        """
+        Получить сумму значений поля value_field для записей, которые
+        вернул бы get_all_under(field, root, tree, where)
+        """
+        pks = subtree_pks(tree, root)
+        return sum((getattr(obj, value_field) for obj in self.iter_all(where)
+                    if getattr(obj, field) in pks), 0.)
+
+    def get_rows(self, lookups: dict[str, tuple['AbstractRepository[Any]', str]]
+                 | None = None,
+                 where: dict[str, Any] | None = None,
+                 after_pk: int | None = None,
+                 limit: int | None = None) -> list[list[Any]]:
+        """
+        Получить записи в виде строк для отображения: списков значений
+        полей в порядке их объявления, pk - последним. Записи упорядочены
+        по pk.
+        lookups - ссылки на другие репозитории {поле: (репозиторий, поле
+        для отображения)}: id в поле заменяется значением поля записи
+        другого репозитория, например {'category': (cat_repo, 'name')};
+        если такой записи нет, остается id
+        where - условие отбора записей (как в get_all)
+        after_pk, limit - только записи с pk больше after_pk, не более limit
+        Реализация по умолчанию строит словари {pk: значение} для lookups
+        и выполняет один проход по отобранным записям.
+        """
+        values = {field: {obj.pk: getattr(obj, display) for obj in repo.get_all()}
+                  for field, (repo, display) in (lookups or {}).items()}
+        condition = dict(where or {})
+        if after_pk is not None:
+            condition['pk__gt'] = after_pk
+        # get_all, а не iter_all: метод может вызываться из фонового потока
+        # (см. AsyncRepository)
+        found = self.get_all(condition or None)
+        objs: list[T] = (sorted(found, key=attrgetter('pk')) if limit is None
+                         else heapq.nsmallest(limit, found, key=attrgetter('pk')))
+        rows: list[list[Any]] = []
+        if not objs:
+            return rows
+        fields = [name for name in get_annotations(type(objs[0])) if name != 'pk']
+        fields.append('pk')
+        get_values = attrgetter(*fields)
+        replace = [(fields.index(field), mapping) for field, mapping in values.items()]
+        for obj in objs:
+            row = list(get_values(obj))
+            for position, mapping in replace:
+                row[position] = mapping.get(row[position], row[position])
+            rows.append(row)
+        return rows
+
     @abstractmethod
     def update(self, obj: T) -> None:
         """ Обновить данные об объекте. Объект должен содержать поле pk. """
@@ -58,3 +268,31 @@ class AbstractRepository(ABC, Generic[T]):
     @abstractmethod
     def delete(self, pk: int) -> None:
         """ Удалить запись """
+
+
+def unwrap(repo: AbstractRepository[Any]) -> AbstractRepository[Any]:
+    """
+    Получить репозиторий, хранящий данные, из оберток над ним
+    (например, CachedRepository): обертка хранит внутренний
+    репозиторий в атрибуте inner
+    """
+    while True:
+        inner = getattr(repo, 'inner', None)
+        if not isinstance(inner, AbstractRepository):
+            return repo
+        repo = inner
+
+
+def subtree_pks(tree: AbstractRepository[Any], root: int) -> set[int]:
+    """ Получить id записи root и всех ее потомков за один проход по tree """
+    children: dict[int, list[int]] = {}
+    for node in tree.iter_all():
+        children.setdefault(node.parent, []).append(node.pk)
+    pks = {root}
+    stack = [root]
+    while stack:
+        for child in children.get(stack.pop(), ()):
+            if child not in pks:
+                pks.add(child)
+                stack.append(child)
+    return pks
@@ -0,0 +1,139 @@
+"""
+Модуль описывает фасад, выполняющий запросы к репозиторию в фоновом потоке
+"""
+
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable, Generic
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+
+Dispatch = Callable[[Callable[[], None]], None]
+
+
+def call_now(func: Callable[[], None]) -> None:
+    """ Вызвать функцию сразу, в потоке, где завершился запрос """
+    func()
+
+
+class AsyncRepository(Generic[T]):
+    """
+    Фасад, выполняющий запросы к репозиторию в фоновом потоке, чтобы
+    долгие выборки не блокировали поток интерфейса. Результат доступен
+    через возвращаемый Future и передается обработчику callback,
+    который вызывается через функцию dispatch: для Qt это передача
+    в главный поток (см. MainWindow.dispatch).
+
+    Запросы с одинаковым ключом (key) заменяют друг друга: новый запрос
+    отменяет предыдущий, если тот еще не начал выполняться, а результат
+    уже выполняющегося запроса не передается обработчику. Поэтому
+    при частых обновлениях выполняется не больше двух запросов подряд,
+    и обработчик получает только результат последнего.
+    Внутренний репозиторий должен допускать чтение из другого потока:
+    SQLiteRepository открывает для фонового потока свое соединение,
+    MemoryRepository допускает это, только если данные не изменяются
+    во время перебора (get_all безопасен, iter_all - нет).
+
+    Parameters
+    ----------
+    inner - репозиторий, к которому выполняются запросы
+    executor - исполнитель запросов (по умолчанию один фоновый поток,
+    запросы выполняются в порядке поступления)
+    dispatch - функция, вызывающая обработчик в нужном потоке
+    (по умолчанию обработчик вызывается в фоновом потоке)
+    """
+
+    def __init__(self, inner: AbstractRepository[T],
+                 executor: Executor | None = None,
+                 dispatch: Dispatch = call_now) -> None:
+        self.inner = inner
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='repository')
+        self.dispatch = dispatch
+        self.cancelled = 0
+        self.discarded = 0
+        self._lock = threading.Lock()
+        self._latest: dict[str, Future[Any]] = {}
+
+    def submit(self, func: Callable[..., Any], *args: Any, key: str | None = None,
+               callback: Callable[[Any], None] | None = None,
+               errback: Callable[[BaseException], None] | None = None,
+               **kwargs: Any) -> Future[Any]:
+        """
+        Выполнить func(*args, **kwargs) в фоновом потоке.
+
+        Parameters
+        ----------
+        func - функция, выполняющая запрос
+        key - ключ запроса; предыдущий запрос с тем же ключом отменяется
+        callback - обработчик результата
+        errback - обработчик исключения, возникшего при выполнении
+
+        Returns
+        -------
+        Future с результатом func
+        """
+        with self._lock:
+            future = self.executor.submit(func, *args, **kwargs)
+            if key is not None:
+                previous = self._latest.get(key)
+                self._latest[key] = future
+                if previous is not None and previous.cancel():
+                    self.cancelled += 1
+        future.add_done_callback(
+            lambda done: self._done(done, key, callback, errback))
+        return future
+
+    def call(self, method: str, *args: Any, key: str | None = None,
+             callback: Callable[[Any], None] | None = None,
+             errback: Callable[[BaseException], None] | None = None,
+             **kwargs: Any) -> Future[Any]:
+        """
+        Выполнить метод внутреннего репозитория в фоновом потоке, например
+        call('get_all', {'category': 1}, key='expenses', callback=show)
+        (см. submit)
+        """
+        return self.submit(getattr(self.inner, method), *args, key=key,
+                           callback=callback, errback=errback, **kwargs)
+
+    def pending(self, key: str) -> bool:
+        """
+        Проверить, есть ли запрос с ключом key, результат которого
+        еще не передан обработчику
+        """
+        with self._lock:
+            return key in self._latest
+
+    def _done(self, future: Future[Any], key: str | None,
+              callback: Callable[[Any], None] | None,
+              errback: Callable[[BaseException], None] | None) -> None:
+        if future.cancelled():
+            return
+
+        def deliver() -> None:
+            # проверка выполняется в потоке обработчика: пока результат
+            # ждал передачи, мог поступить более новый запрос
+            with self._lock:
+                if key is not None:
+                    if self._latest.get(key) is not future:
+                        self.discarded += 1
+                        return
+                    del self._latest[key]
+            error = future.exception()
+            if error is None:
+                if callback is not None:
+                    callback(future.result())
+            elif errback is not None:
+                errback(error)
+
+        self.dispatch(deliver)
+
+    def close(self) -> None:
+        """
+        Остановить фоновые потоки: ожидающие запросы с ключом отменяются,
+        остальные (например, запись в репозиторий) выполняются до конца
+        """
+        with self._lock:
+            for future in self._latest.values():
+                future.cancel()
+        self.executor.shutdown(wait=True)
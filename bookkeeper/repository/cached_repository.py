@@ -0,0 +1,169 @@
+"""
+Модуль описывает кэширующую обертку над репозиторием
+"""
+
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Iterable, Iterator
+
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, RepositoryHook, T, unwrap)
+
+EVICTION_POLICIES = ('lru', 'fifo')
+
+
+class Invalidator(RepositoryHook[T]):
+    """
+    Сбрасывает записи кэша при изменениях во внутреннем репозитории
+    (или при изменениях, полученных из ChangeFeed)
+    """
+
+    def __init__(self, cache: 'CachedRepository[T]') -> None:
+        self.cache = cache
+
+    def updated(self, old: T, new: T) -> None:
+        self.cache.invalidate(new.pk)
+
+    def deleted(self, obj: T) -> None:
+        self.cache.invalidate(obj.pk)
+
+    def rolled_back(self) -> None:
+        self.cache.invalidate_all()
+
+
+class CachedRepository(AbstractRepository[T]):
+    """
+    Репозиторий-обертка с картой идентичности (identity map) для get:
+    повторный запрос того же pk возвращает тот же объект без обращения
+    к внутреннему репозиторию. Добавленные через обертку объекты
+    также попадают в кэш. Запись кэша сбрасывается при update и delete,
+    в том числе выполненных напрямую через внутренний репозиторий.
+    Остальные запросы передаются внутреннему репозиторию без изменений.
+    Обертка не потокобезопасна.
+
+    Parameters
+    ----------
+    inner - внутренний репозиторий
+    capacity - максимальное число объектов в кэше (None - без ограничения)
+    policy - политика вытеснения: 'lru' (давно не использованные)
+    или 'fifo' (давно добавленные)
+    """
+
+    def __init__(self, inner: AbstractRepository[T],
+                 capacity: int | None = 1024, policy: str = 'lru') -> None:
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f'unknown eviction policy {policy!r}')
+        self.inner = inner
+        self.capacity = capacity
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._cache: OrderedDict[int, T] = OrderedDict()
+        inner.add_hook(Invalidator(self))
+
+    def __getattr__(self, name: str) -> Any:
+        # методы, специфичные для внутреннего репозитория (close, explain...)
+        if name == 'inner':
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def _put(self, obj: T) -> None:
+        self._cache[obj.pk] = obj
+        self._cache.move_to_end(obj.pk)
+        if self.capacity is not None and len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, pk: int) -> None:
+        """ Удалить объект из кэша """
+        self._cache.pop(pk, None)
+
+    def invalidate_all(self) -> None:
+        """ Удалить из кэша все объекты, сохранив счетчики """
+        self._cache.clear()
+
+    def clear(self) -> None:
+        """ Очистить кэш и счетчики """
+        self._cache.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def add_hook(self, hook: RepositoryHook[T]) -> None:
+        self.inner.add_hook(hook)
+
+    def remove_hook(self, hook: RepositoryHook[T]) -> None:
+        self.inner.remove_hook(hook)
+
+    def add(self, obj: T) -> int:
+        pk = self.inner.add(obj)
+        self._put(obj)
+        return pk
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        return self.inner.add_many(objs)
+
+    def accumulate(self, obj: T, field: str, key: tuple[str, ...]) -> T:
+        new = self.inner.accumulate(obj, field, key)
+        self.invalidate(new.pk)
+        return new
+
+    def get(self, pk: int) -> T | None:
+        obj = self._cache.get(pk)
+        if obj is not None:
+            self.hits += 1
+            if self.policy == 'lru':
+                self._cache.move_to_end(pk)
+            return obj
+        self.misses += 1
+        obj = self.inner.get(pk)
+        if obj is not None:
+            self._put(obj)
+        return obj
+
+    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+        return self.inner.get_all(where)
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        return self.inner.iter_all(where, batch_size)
+
+    def get_page(self, order_by: str = 'pk',
+                 after_key: tuple[Any, int] | None = None,
+                 limit: int = 100) -> list[T]:
+        return self.inner.get_page(order_by, after_key, limit)
+
+    def get_totals(self, value_field: str, date_field: str, period: str,
+                   where: dict[str, Any] | None = None) -> dict[date, float]:
+        return self.inner.get_totals(value_field, date_field, period, where)
+
+    def get_sums(self, value_field: str, group_field: str,
+                 where: dict[str, Any] | None = None) -> dict[Any, float]:
+        return self.inner.get_sums(value_field, group_field, where)
+
+    def get_all_under(self, field: str, root: int,
+                      tree: AbstractRepository[Any],
+                      where: dict[str, Any] | None = None) -> list[T]:
+        return self.inner.get_all_under(field, root, unwrap(tree), where)
+
+    def get_total_under(self, value_field: str, field: str, root: int,
+                        tree: AbstractRepository[Any],
+                        where: dict[str, Any] | None = None) -> float:
+        return self.inner.get_total_under(value_field, field, root,
+                                          unwrap(tree), where)
+
+    def get_rows(self, lookups: dict[str, tuple[AbstractRepository[Any], str]]
+                 | None = None,
+                 where: dict[str, Any] | None = None,
+                 after_pk: int | None = None,
+                 limit: int | None = None) -> list[list[Any]]:
+        lookups = {field: (unwrap(repo), display)
+                   for field, (repo, display) in (lookups or {}).items()}
+        return self.inner.get_rows(lookups, where, after_pk, limit)
+
+    def update(self, obj: T) -> None:
+        self.inner.update(obj)
+        self.invalidate(obj.pk)
+
+    def delete(self, pk: int) -> None:
+        self.inner.delete(pk)
+        self.invalidate(pk)
@@ -0,0 +1,271 @@
+"""
+Модуль описывает журнал изменений БД sqlite, по которому процесс узнает
+об изменениях, сделанных другими процессами (или другими программами)
+"""
+
+import json
+import sqlite3
+import uuid
+from typing import Any
+
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, RepositoryHook, unwrap)
+from bookkeeper.repository.cached_repository import CachedRepository, Invalidator
+from bookkeeper.repository.sqlite_repository import (
+    ConnectionPool, SQLiteRepository, init_order, row_factory)
+
+LOG_TABLE = 'change_log'
+# последние прочитанные id журнала для каждого ChangeFeed
+READERS_TABLE = 'change_log_readers'
+# число pk в одном запросе get_all при чтении измененных объектов
+# (ограничение sqlite на число параметров запроса - 32766)
+BATCH_SIZE = 500
+# если другие процессы изменили больше записей (например, импортом),
+# обработчики получают rolled_back вместо вызова для каждой записи
+MAX_CHANGES = 1000
+
+
+class ChangeFeed:
+    """
+    Журнал изменений таблиц репозиториев одного файла БД. Обработчики
+    (RepositoryHook) получают вызовы added, updated, deleted для изменений,
+    зафиксированных другими соединениями: изменения своего процесса
+    по-прежнему передаются обработчикам репозитория (см. add_hook).
+
+    feed = ChangeFeed(exp_repo.pool)
+    feed.watch(exp_repo, hook)
+    ...
+    feed.poll()  # например, по таймеру
+
+    Для наблюдаемой таблицы создаются триггеры, записывающие в таблицу
+    change_log pk измененной записи и (для изменения и удаления) прежние
+    значения полей в JSON. Триггеры хранятся в файле БД и срабатывают
+    при записи любым процессом, но пишут в журнал, только пока открыт
+    хотя бы один ChangeFeed этого файла (есть строка в change_log_readers):
+    без читателей, например при импорте из simple_client без запущенного
+    приложения, журнал не пополняется. Записи, сделанные через соединения
+    пула этого журнала, помечаются временным триггером и не передаются.
+    poll сначала сравнивает последний id журнала с прочитанным ранее
+    и, если журнал не пополнился, больше ничего не запрашивает.
+    Несколько изменений одной записи между вызовами poll передаются
+    одним вызовом обработчика (например, добавление и удаление - никаким).
+    Если нужные записи журнала уже удалены (см. prune) или за один
+    вызов poll изменено больше max_changes записей, обработчики
+    получают вызов rolled_back и должны перечитать данные.
+    Записи журнала, прочитанные всеми журналами этого файла БД,
+    удаляются при вызове poll (всегда остается не больше keep записей),
+    поэтому журнал не растет при долгой работе приложения.
+    Поля моделей наблюдаемых таблиц не должны храниться в BLOB.
+
+    Parameters
+    ----------
+    pool - пул соединений файла БД
+    keep - максимальное число записей журнала (см. prune)
+    max_changes - наибольшее число записей журнала, передаваемых
+    обработчикам по одной за вызов poll
+    """
+
+    def __init__(self, pool: ConnectionPool, keep: int = 10_000,
+                 max_changes: int = MAX_CHANGES) -> None:
+        self.pool = pool
+        self.keep = keep
+        self.max_changes = max_changes
+        self.source = uuid.uuid4().hex
+        self._watched: dict[str, tuple[SQLiteRepository[Any],
+                                       list[RepositoryHook[Any]]]] = {}
+        with pool.transaction() as con:
+            con.execute(f'CREATE TABLE IF NOT EXISTS {LOG_TABLE} '
+                        '(id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                        'tbl TEXT, pk INTEGER, old TEXT, source TEXT)')
+            con.execute(f'CREATE TABLE IF NOT EXISTS {READERS_TABLE} '
+                        '(source TEXT PRIMARY KEY, last INTEGER)')
+        pool.add_initializer(self._mark_own)
+        self.prune(keep)
+        self._last: int = self._query(f'SELECT max(id) FROM {LOG_TABLE}')[0][0] or 0
+        with pool.transaction() as con:
+            self._drop_stale(con)
+            con.execute(f'INSERT INTO {READERS_TABLE} VALUES (?, ?)',
+                        (self.source, self._last))
+
+    def _mark_own(self, con: sqlite3.Connection) -> None:
+        # временный триггер действует только в данном соединении
+        con.execute(f'CREATE TEMP TRIGGER IF NOT EXISTS {LOG_TABLE}_source '
+                    f'AFTER INSERT ON main.{LOG_TABLE} BEGIN '
+                    f"UPDATE {LOG_TABLE} SET source = '{self.source}' "
+                    f'WHERE id = NEW.id; END')
+
+    def _query(self, query: str, params: tuple[Any, ...] = ()) -> list[Any]:
+        with self.pool.transaction() as con:
+            return con.execute(query, params).fetchall()
+
+    def watch(self, repo: AbstractRepository[Any],
+              *hooks: RepositoryHook[Any]) -> None:
+        """
+        Передавать обработчикам hooks изменения таблицы репозитория,
+        сделанные другими процессами. Репозиторий должен быть
+        SQLiteRepository (или CachedRepository над ним) того же пула;
+        кэш CachedRepository сбрасывается при таких изменениях.
+        """
+        inner = unwrap(repo)
+        if not isinstance(inner, SQLiteRepository) or inner.pool is not self.pool:
+            raise ValueError('only SQLite repositories of the feed pool can be watched')
+        if isinstance(repo, CachedRepository):
+            hooks = (Invalidator(repo), *hooks)
+        table = inner.table_name
+        if table not in self._watched:
+            self._create_triggers(inner)
+            self._watched[table] = (inner, [])
+        self._watched[table][1].extend(hooks)
+
+    def unwatch(self, repo: AbstractRepository[Any], hook: RepositoryHook[Any]) -> None:
+        """ Отписать обработчик от изменений таблицы репозитория """
+        inner = unwrap(repo)
+        if not isinstance(inner, SQLiteRepository):
+            return
+        watched = self._watched.get(inner.table_name)
+        if watched is not None:
+            watched[1][:] = [h for h in watched[1] if h is not hook]
+
+    def _create_triggers(self, repo: SQLiteRepository[Any]) -> None:
+        # триггеры пересоздаются: набор полей модели мог измениться
+        table = repo.table_name
+        old = f'json_array({", ".join(f"OLD.{name}" for name in init_order(repo.cls))})'
+        with self.pool.transaction() as con:
+            for event, pk, values in (('insert', 'NEW.pk', 'NULL'),
+                                      ('update', 'OLD.pk', old),
+                                      ('delete', 'OLD.pk', old)):
+                name = f'{LOG_TABLE}_{table}_{event}'
+                con.execute(f'DROP TRIGGER IF EXISTS {name}')
+                con.execute(f'CREATE TRIGGER {name} AFTER {event.upper()} ON {table} '
+                            f'WHEN EXISTS (SELECT 1 FROM {READERS_TABLE}) '
+                            f'BEGIN INSERT INTO {LOG_TABLE} (tbl, pk, old) '
+                            f"VALUES ('{table}', {pk}, {values}); END")
+
+    def poll(self) -> int:
+        """
+        Передать обработчикам изменения, зафиксированные другими
+        процессами после предыдущего вызова
+
+        Returns
+        -------
+        Число переданных изменений записей (если обработчики получили
+        rolled_back - число пропущенных записей журнала)
+        """
+        # решает только последний id журнала: PRAGMA data_version, прочитанная
+        # отдельным запросом, может не учесть запись, зафиксированную другим
+        # процессом между запросами. Записи соединений этого пула
+        # отбрасываются при чтении по source
+        last: int = self._query(f'SELECT max(id) FROM {LOG_TABLE}')[0][0] or 0
+        if last <= self._last:
+            return 0
+        delivered = self._read(last)
+        self._advance(last)
+        return delivered
+
+    def _read(self, last: int) -> int:
+        first = self._query(f'SELECT min(id) FROM {LOG_TABLE}')[0][0]
+        # записи после self._last удалены (см. prune)
+        if last > self._last and (first is None or first > self._last + 1):
+            return self._reset(last)
+        rows = self._query(f'SELECT tbl, pk, old FROM {LOG_TABLE} '
+                           'WHERE id > ? AND id <= ? AND source IS NOT ? '
+                           'ORDER BY id LIMIT ?',
+                           (self._last, last, self.source, self.max_changes + 1))
+        if len(rows) > self.max_changes:
+            return self._reset(last)
+        changes: dict[tuple[str, int], str | None] = {}
+        for table, pk, old in rows:
+            if table in self._watched:
+                changes.setdefault((table, pk), old)
+        return self._deliver(changes)
+
+    def _reset(self, last: int) -> int:
+        for _, hooks in self._watched.values():
+            for hook in hooks:
+                hook.rolled_back()
+        return last - self._last
+
+    def _deliver(self, changes: dict[tuple[str, int], str | None]) -> int:
+        current = self._current(changes)
+        delivered = 0
+        for (table, pk), old in changes.items():
+            repo, hooks = self._watched[table]
+            old_obj = None if old is None else decode(repo, old)
+            new = current.get((table, pk))
+            if old_obj == new:
+                continue
+            delivered += 1
+            for hook in hooks:
+                if old_obj is None:
+                    hook.added(new)
+                elif new is None:
+                    hook.deleted(old_obj)
+                else:
+                    hook.updated(old_obj, new)
+        return delivered
+
+    def _advance(self, last: int) -> None:
+        # записи, прочитанные всеми журналами, больше не нужны; журналы
+        # завершившихся без close процессов задерживают удаление
+        # не более чем на keep записей
+        self._last = last
+        with self.pool.transaction() as con:
+            # строку журнала могли удалить как отставшую (см. _drop_stale)
+            con.execute(f'INSERT OR REPLACE INTO {READERS_TABLE} VALUES (?, ?)',
+                        (self.source, last))
+            self._drop_stale(con)
+            con.execute(f'DELETE FROM {LOG_TABLE} WHERE id <= '
+                        f'(SELECT min(last) FROM {READERS_TABLE}) '
+                        f'OR id <= ? - ?', (last, self.keep))
+
+    def _drop_stale(self, con: sqlite3.Connection) -> None:
+        # журналы, отставшие больше чем на keep записей (например, процессов,
+        # завершившихся без close), все равно получат rolled_back
+        con.execute(f'DELETE FROM {READERS_TABLE} WHERE last < '
+                    f'(SELECT max(id) FROM {LOG_TABLE}) - ?', (self.keep,))
+
+    def _current(self, changes: dict[tuple[str, int], Any]) -> dict[tuple[str, int], Any]:
+        pks: dict[str, list[int]] = {}
+        for table, pk in changes:
+            pks.setdefault(table, []).append(pk)
+        current = {}
+        for table, table_pks in pks.items():
+            repo = self._watched[table][0]
+            for start in range(0, len(table_pks), BATCH_SIZE):
+                for obj in repo.get_all({'pk__in': table_pks[start:start + BATCH_SIZE]}):
+                    current[table, obj.pk] = obj
+        return current
+
+    def close(self) -> None:
+        """
+        Перестать читать журнал: записи, не прочитанные этим журналом,
+        больше не задерживаются при удалении
+        """
+        with self.pool.transaction() as con:
+            con.execute(f'DELETE FROM {READERS_TABLE} WHERE source = ?',
+                        (self.source,))
+
+    def prune(self, keep: int = 10_000) -> None:
+        """
+        Удалить из журнала все записи, кроме keep последних. Процессы,
+        не прочитавшие удаленные записи, перечитают данные целиком
+        """
+        with self.pool.transaction() as con:
+            con.execute(f'DELETE FROM {LOG_TABLE} WHERE id <= '
+                        f'(SELECT max(id) FROM {LOG_TABLE}) - ?', (keep,))
+
+
+def decode(repo: SQLiteRepository[Any], text: str) -> Any:
+    """
+    Восстановить объект из значений полей в JSON, сохраненных
+    триггером журнала: значения преобразуются конвертерами sqlite3
+    по объявленным типам столбцов, как при чтении из таблицы
+    """
+    order = init_order(repo.cls)
+    values = []
+    for name, value in zip(order, json.loads(text)):
+        converter = sqlite3.converters.get(repo.columns.get(name, 'INTEGER').upper())
+        if value is not None and converter is not None:
+            value = converter(str(value).encode())
+        values.append(value)
+    return row_factory(repo.cls, tuple(order), repo.bypass_init)(tuple(values))
@@ -0,0 +1,349 @@
+"""
+Модуль описывает колоночное хранилище расходов на основе массивов NumPy
+"""
+
+import operator
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Iterable, Iterator
+
+import numpy as np
+import numpy.typing as npt
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository, subtree_pks
+from bookkeeper.repository.query import (
+    make_check, parse_order, parse_where, PERIODS)
+
+_DTYPES: dict[str, Any] = {
+    'pk': np.int64,
+    'amount': np.float64,
+    'category': np.int64,
+    'expense_date': np.int64,   # микросекунды от 1970-01-01
+    'added_date': np.int64,
+    'comment': np.int32,        # номер строки в пуле строк
+}
+_DATES = ('expense_date', 'added_date')
+_NUMBERS = ('pk', 'amount', 'category')
+
+_OPERATORS: dict[str, Callable[[Any, Any], Any]] = {
+    'eq': operator.eq, 'ne': operator.ne,
+    'lt': operator.lt, 'le': operator.le, 'gt': operator.gt, 'ge': operator.ge,
+}
+
+Rows = npt.NDArray[np.intp]
+Mask = npt.NDArray[np.bool_]
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _to_us(value: date | str) -> int:
+    """ Преобразовать дату в число микросекунд от 1970-01-01 """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    return (value - _EPOCH) // _MICROSECOND
+
+
+class ColumnarExpenseRepository(AbstractRepository[Expense]):
+    """
+    Репозиторий расходов, хранящий каждое поле Expense в отдельном
+    массиве NumPy: суммы - float64, категории и pk - int64, даты - int64
+    (микросекунды от 1970-01-01), комментарии - номера строк в пуле,
+    где каждая различная строка хранится один раз.
+    Объекты Expense создаются только при чтении (get, get_all, iter_all),
+    а фильтрация (where), суммы и группировки (get_totals, get_sums)
+    вычисляются над массивами целиком.
+    Записи хранятся в порядке возрастания pk, удаленные записи помечаются
+    и вычищаются, когда их становится больше половины.
+    Поддерживаются даты без часового пояса.
+
+    Parameters
+    ----------
+    capacity - начальный размер массивов (увеличивается автоматически)
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._size = 0
+        self._deleted = 0
+        self._last_pk = 0
+        self._columns: dict[str, npt.NDArray[Any]] = {
+            name: np.zeros(capacity, dtype) for name, dtype in _DTYPES.items()}
+        self._alive: Mask = np.zeros(capacity, np.bool_)
+        self._strings: list[str] = []
+        self._string_ids: dict[str, int] = {}
+
+    @property
+    def nbytes(self) -> int:
+        """ Объем памяти, занятой массивами (без пула строк) """
+        return self._alive.nbytes + sum(col.nbytes for col in self._columns.values())
+
+    def _intern(self, text: str) -> int:
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            string_id = self._string_ids[text] = len(self._strings)
+            self._strings.append(text)
+        return string_id
+
+    def _reserve(self, count: int) -> None:
+        capacity = len(self._alive)
+        if self._size + count <= capacity:
+            return
+        capacity = max(2 * capacity, self._size + count)
+        for name, column in self._columns.items():
+            self._columns[name] = np.zeros(capacity, column.dtype)
+            self._columns[name][:self._size] = column[:self._size]
+        alive = np.zeros(capacity, np.bool_)
+        alive[:self._size] = self._alive[:self._size]
+        self._alive = alive
+
+    def _append(self, objs: list[Expense]) -> None:
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        count = len(objs)
+        values = {
+            'amount': [obj.amount for obj in objs],
+            'category': [obj.category for obj in objs],
+            'expense_date': [_to_us(obj.expense_date) for obj in objs],
+            'added_date': [_to_us(obj.added_date) for obj in objs],
+            'comment': [self._intern(obj.comment) for obj in objs],
+        }
+        self._reserve(count)
+        start, end = self._size, self._size + count
+        for name, column_values in values.items():
+            self._columns[name][start:end] = column_values
+        self._columns['pk'][start:end] = np.arange(
+            self._last_pk + 1, self._last_pk + count + 1)
+        self._alive[start:end] = True
+        for pk, obj in enumerate(objs, start=self._last_pk + 1):
+            obj.pk = pk
+        self._size = end
+        self._last_pk += count
+
+    def _write(self, row: int, obj: Expense) -> None:
+        columns = self._columns
+        columns['amount'][row] = obj.amount
+        columns['category'][row] = obj.category
+        columns['expense_date'][row] = _to_us(obj.expense_date)
+        columns['added_date'][row] = _to_us(obj.added_date)
+        columns['comment'][row] = self._intern(obj.comment)
+
+    def _row(self, pk: int) -> int | None:
+        pks = self._columns['pk'][:self._size]
+        row = int(np.searchsorted(pks, pk))
+        if row < self._size and pks[row] == pk and self._alive[row]:
+            return row
+        return None
+
+    def _materialize(self, rows: Rows) -> list[Expense]:
+        columns = self._columns
+        strings = self._strings
+        return [Expense(*values) for values in zip(
+            columns['amount'][rows].tolist(),
+            columns['category'][rows].tolist(),
+            columns['expense_date'][rows].view('datetime64[us]').tolist(),
+            columns['added_date'][rows].view('datetime64[us]').tolist(),
+            [strings[i] for i in columns['comment'][rows].tolist()],
+            columns['pk'][rows].tolist(),
+        )]
+
+    def _column(self, name: str) -> npt.NDArray[Any]:
+        if name not in self._columns:
+            raise ValueError(f'unknown field {name!r}')
+        return self._columns[name][:self._size]
+
+    def _python_values(self, name: str, rows: Rows | slice) -> list[Any]:
+        values = self._column(name)[rows]
+        if name in _DATES:
+            return list(values.view('datetime64[us]').tolist())
+        if name == 'comment':
+            return [self._strings[i] for i in values.tolist()]
+        return list(values.tolist())
+
+    def _convert(self, name: str, value: Any) -> Any:
+        return _to_us(value) if name in _DATES else value
+
+    def _mask(self, name: str, op: str, value: Any) -> Mask:
+        column = self._column(name)
+        if name == 'comment' or op == 'like':
+            # условие проверяется по-отдельности для каждой строки пула
+            # (или для каждого значения), затем переносится на записи
+            check = make_check(op, value)
+            if name == 'comment':
+                pool_mask = np.fromiter(map(check, self._strings), np.bool_,
+                                        len(self._strings))
+                return pool_mask[column] if len(pool_mask) else np.zeros(
+                    self._size, np.bool_)
+            return np.fromiter(map(check, self._python_values(name, slice(None))),
+                               np.bool_, self._size)
+        if value is None and op in ('eq', 'ne'):
+            return np.full(self._size, op == 'ne')
+        if op == 'in':
+            return np.isin(column, [self._convert(name, v) for v in value])
+        if op == 'between':
+            low, high = (self._convert(name, v) for v in value)
+            result: Mask = (column >= low) & (column <= high)
+            return result
+        result = _OPERATORS[op](column, self._convert(name, value))
+        return result
+
+    def _rows(self, where: dict[str, Any] | None) -> Rows:
+        mask = self._alive[:self._size].copy()
+        for name, op, value in parse_where(where or {}):
+            mask &= self._mask(name, op, value)
+        return np.flatnonzero(mask)
+
+    def _compact(self) -> None:
+        rows = np.flatnonzero(self._alive[:self._size])
+        for column in self._columns.values():
+            column[:len(rows)] = column[rows]
+        self._alive[:len(rows)] = True
+        self._alive[len(rows):self._size] = False
+        self._size = len(rows)
+        self._deleted = 0
+
+    def add(self, obj: Expense) -> int:
+        self._append([obj])
+        for hook in self.hooks:
+            hook.added(obj)
+        return obj.pk
+
+    def add_many(self, objs: Iterable[Expense], batch_size: int = 65536) -> list[int]:
+        """
+        Добавить объекты порциями по batch_size: каждая порция
+        записывается в массивы целиком.
+        """
+        pks: list[int] = []
+        batch: list[Expense] = []
+        for obj in objs:
+            batch.append(obj)
+            if len(batch) == batch_size:
+                self._add_batch(batch, pks)
+                batch = []
+        self._add_batch(batch, pks)
+        return pks
+
+    def _add_batch(self, batch: list[Expense], pks: list[int]) -> None:
+        self._append(batch)
+        for obj in batch:
+            pks.append(obj.pk)
+            for hook in self.hooks:
+                hook.added(obj)
+
+    def get(self, pk: int) -> Expense | None:
+        row = self._row(pk)
+        if row is None:
+            return None
+        return self._materialize(np.array([row]))[0]
+
+    def get_all(self, where: dict[str, Any] | None = None) -> list[Expense]:
+        return self._materialize(self._rows(where))
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[Expense]:
+        rows = self._rows(where)
+        for start in range(0, len(rows), batch_size):
+            yield from self._materialize(rows[start:start + batch_size])
+
+    def get_page(self, order_by: str = 'pk',
+                 after_key: tuple[Any, int] | None = None,
+                 limit: int = 100) -> list[Expense]:
+        name, descending = parse_order(order_by)
+        if name == 'comment':
+            return super().get_page(order_by, after_key, limit)
+        rows = self._rows(None)
+        keys = self._column(name)[rows]
+        pks = self._columns['pk'][rows]
+        if after_key is not None:
+            key, pk = self._convert(name, after_key[0]), after_key[1]
+            if descending:
+                selected = (keys < key) | ((keys == key) & (pks < pk))
+            else:
+                selected = (keys > key) | ((keys == key) & (pks > pk))
+            rows, keys, pks = rows[selected], keys[selected], pks[selected]
+        order = np.lexsort((pks, keys))
+        order = order[::-1][:limit] if descending else order[:limit]
+        return self._materialize(rows[order])
+
+    def get_column(self, name: str,
+                   where: dict[str, Any] | None = None) -> npt.NDArray[Any]:
+        """
+        Получить значения поля для записей, удовлетворяющих условию,
+        в виде массива NumPy (даты - datetime64[us], комментарии - строки)
+        """
+        values = self._column(name)[self._rows(where)]
+        if name in _DATES:
+            return values.view('datetime64[us]')
+        if name == 'comment':
+            return np.array(self._strings, dtype=object)[values]
+        return values
+
+    def get_totals(self, value_field: str, date_field: str, period: str,
+                   where: dict[str, Any] | None = None) -> dict[date, float]:
+        if date_field not in _DATES or value_field not in _NUMBERS:
+            raise ValueError(f'cannot sum {value_field!r} by {date_field!r}')
+        if period not in PERIODS:
+            raise ValueError(f'unknown period {period!r}')
+        rows = self._rows(where)
+        days = self._column(date_field)[rows].view('datetime64[us]').astype(
+            'datetime64[D]')
+        if period == 'week':
+            numbers = days.view(np.int64)
+            # 1970-01-01 - четверг, неделя начинается с понедельника
+            days = (numbers - (numbers + 3) % 7).view('datetime64[D]')
+        elif period == 'month':
+            days = days.astype('datetime64[M]').astype('datetime64[D]')
+        keys, inverse = np.unique(days, return_inverse=True)
+        sums = np.bincount(inverse, weights=self._column(value_field)[rows],
+                           minlength=len(keys))
+        return dict(zip(keys.tolist(), sums.tolist()))
+
+    def get_sums(self, value_field: str, group_field: str,
+                 where: dict[str, Any] | None = None) -> dict[Any, float]:
+        if value_field not in _NUMBERS:
+            raise ValueError(f'cannot sum {value_field!r}')
+        rows = self._rows(where)
+        keys, inverse = np.unique(self._column(group_field)[rows], return_inverse=True)
+        sums = np.bincount(inverse, weights=self._column(value_field)[rows],
+                           minlength=len(keys))
+        if group_field in _DATES:
+            python_keys = keys.view('datetime64[us]').tolist()
+        elif group_field == 'comment':
+            python_keys = [self._strings[i] for i in keys.tolist()]
+        else:
+            python_keys = keys.tolist()
+        return dict(zip(python_keys, sums.tolist()))
+
+    def get_total_under(self, value_field: str, field: str, root: int,
+                        tree: AbstractRepository[Any],
+                        where: dict[str, Any] | None = None) -> float:
+        if value_field not in _NUMBERS:
+            raise ValueError(f'cannot sum {value_field!r}')
+        rows = self._rows(where)
+        selected = np.isin(self._column(field)[rows], list(subtree_pks(tree, root)))
+        return float(self._column(value_field)[rows[selected]].sum())
+
+    def update(self, obj: Expense) -> None:
+        if obj.pk == 0:
+            raise ValueError('attempt to update object with unknown primary key')
+        row = self._row(obj.pk)
+        if row is None:
+            raise KeyError(f'no object with pk {obj.pk}')
+        old = self._materialize(np.array([row]))[0] if self.hooks else None
+        self._write(row, obj)
+        for hook in self.hooks:
+            hook.updated(old, obj)  # type: ignore[arg-type]
+
+    def delete(self, pk: int) -> None:
+        row = self._row(pk)
+        if row is None:
+            raise KeyError(f'no object with pk {pk}')
+        obj = self._materialize(np.array([row]))[0] if self.hooks else None
+        self._alive[row] = False
+        self._deleted += 1
+        if self._deleted > self._size // 2:
+            self._compact()
+        for hook in self.hooks:
+            hook.deleted(obj)  # type: ignore[arg-type]
@@ -2,42 +2,177 @@
 Модуль описывает репозиторий, работающий в оперативной памяти
 """
 
+from bisect import bisect_left, bisect_right, insort
 from itertools import count
-from typing import Any
+from typing import Any, Iterable, Iterator, NamedTuple
 
 from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.query import make_predicate, parse_order
+
+
+class Snapshot(NamedTuple):
+    """
+    Сохраненное состояние MemoryRepository (см. snapshot): журнал отмены
+    {pk: объект до первого изменения после снимка или None, если
+    объекта не было} и счетчик pk
+    """
+    undo: dict[int, Any]
+    next_pk: int
 
 
 class MemoryRepository(AbstractRepository[T]):
     """
     Репозиторий, работающий в оперативной памяти. Хранит данные в словаре.
+    Для постраничной выборки поддерживаются отсортированные списки ключей
+    (значение поля, pk), которые строятся при первом обращении к полю,
+    пополняются при add и сбрасываются при остальных изменениях.
     """
 
     def __init__(self) -> None:
         self._container: dict[int, T] = {}
         self._counter = count(1)
+        self._sorted: dict[str, list[tuple[Any, int]]] = {}
+        self._snapshots: list[Snapshot] = []
+
+    def snapshot(self) -> Snapshot:
+        """
+        Сохранить состояние репозитория для последующего restore.
+        Объекты не копируются: до restore или release каждое изменение
+        записывает прежний объект в журнал снимка, поэтому снимок и
+        изменения после него занимают время, пропорциональное числу
+        измененных объектов. Изменения объекта на месте (без update)
+        не отменяются.
+        """
+        next_pk = next(self._counter)
+        self._counter = count(next_pk)
+        snapshot = Snapshot({}, next_pk)
+        self._snapshots.append(snapshot)
+        return snapshot
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """
+        Вернуть репозиторий к состоянию snapshot, включая счетчик pk.
+        Снимки, сделанные после snapshot, становятся недействительными.
+        Обработчики не вызываются (см. RepositoryHook.rolled_back).
+        """
+        self.release(snapshot)
+        reinserted = False
+        for pk, obj in snapshot.undo.items():
+            if obj is None:
+                self._container.pop(pk, None)
+            else:
+                reinserted = reinserted or pk not in self._container
+                self._container[pk] = obj
+        if reinserted:
+            # get_all возвращает объекты в порядке pk
+            self._container = dict(sorted(self._container.items()))
+        self._counter = count(snapshot.next_pk)
+        self._sorted.clear()
+
+    def release(self, snapshot: Snapshot) -> None:
+        """
+        Перестать вести журнал снимка (и снимков, сделанных после него):
+        снимок больше не нужен для restore
+        """
+        for i, saved in enumerate(self._snapshots):
+            if saved is snapshot:
+                del self._snapshots[i:]
+                return
+
+    def _save(self, pk: int) -> None:
+        for snapshot in self._snapshots:
+            snapshot.undo.setdefault(pk, self._container.get(pk))
 
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
         pk = next(self._counter)
+        self._save(pk)
         self._container[pk] = obj
         obj.pk = pk
+        for name, keys in self._sorted.items():
+            insort(keys, (getattr(obj, name), pk))
+        for hook in self.hooks:
+            hook.added(obj)
         return pk
 
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        container = self._container
+        counter = self._counter
+        pks = []
+        self._sorted.clear()
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+            pk = next(counter)
+            for snapshot in self._snapshots:
+                snapshot.undo[pk] = None
+            container[pk] = obj
+            obj.pk = pk
+            pks.append(pk)
+            for hook in self.hooks:
+                hook.added(obj)
+        return pks
+
     def get(self, pk: int) -> T | None:
         return self._container.get(pk)
 
     def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
         if where is None:
             return list(self._container.values())
-        return [obj for obj in self._container.values()
-                if all(getattr(obj, attr) == value for attr, value in where.items())]
+        return list(filter(make_predicate(where), self._container.values()))
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        """
+        Перебрать записи без копирования словаря. Изменение репозитория
+        во время перебора приводит к RuntimeError.
+        """
+        if where is None:
+            return iter(self._container.values())
+        return filter(make_predicate(where), self._container.values())
+
+    def get_page(self, order_by: str = 'pk',
+                 after_key: tuple[Any, int] | None = None,
+                 limit: int = 100) -> list[T]:
+        name, descending = parse_order(order_by)
+        keys = self._sorted_keys(name)
+        if descending:
+            end = len(keys) if after_key is None else bisect_left(keys, after_key)
+            selected = keys[max(0, end - limit):end][::-1]
+        else:
+            start = 0 if after_key is None else bisect_right(keys, after_key)
+            selected = keys[start:start + limit]
+        return [self._container[pk] for _, pk in selected]
+
+    def _sorted_keys(self, name: str) -> list[tuple[Any, int]]:
+        keys = self._sorted.get(name)
+        if keys is None:
+            keys = self._sorted[name] = sorted(
+                (getattr(obj, name), pk) for pk, obj in self._container.items())
+        return keys
 
     def update(self, obj: T) -> None:
+        """
+        Обновить объект. Обработчики получают в old объект, хранившийся
+        в репозитории; если obj - тот же объект, измененный на месте,
+        прежние значения его полей недоступны.
+        """
         if obj.pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
+        old = self._container.get(obj.pk)
+        self._save(obj.pk)
         self._container[obj.pk] = obj
+        self._sorted.clear()
+        for hook in self.hooks:
+            if old is None:
+                hook.added(obj)
+            else:
+                hook.updated(old, obj)
 
     def delete(self, pk: int) -> None:
-        self._container.pop(pk)
+        self._save(pk)
+        obj = self._container.pop(pk)
+        self._sorted.clear()
+        for hook in self.hooks:
+            hook.deleted(obj)
@@ -0,0 +1,292 @@
+"""
+Модуль описывает условия выборки (where), общие для всех репозиториев
+
+Условие задается словарем {'название_поля': значение}. Ключ может содержать
+оператор сравнения через двойное подчеркивание: {'amount__gt': 100}.
+Поддерживаемые операторы:
+eq - равно (по умолчанию), ne - не равно,
+lt, le, gt, ge - меньше, меньше или равно, больше, больше или равно,
+in - входит в коллекцию значений,
+between - входит в диапазон (пара значений, границы включаются),
+like - соответствует шаблону sqlite LIKE ('%' - любая подстрока,
+'_' - любой символ, без учета регистра только латинских букв).
+Сравнение с None оператором eq/ne означает IS NULL/IS NOT NULL.
+Несколько условий объединяются через AND.
+Значения условия приводятся к типу поля (см. coerce), поэтому
+все репозитории отбирают одни и те же объекты.
+"""
+
+import operator
+import re
+from datetime import date, datetime, time, timedelta
+from types import NoneType, UnionType
+from typing import Any, Callable, Iterable, Union, get_args, get_origin
+
+OPERATORS = ('eq', 'ne', 'lt', 'le', 'gt', 'ge', 'in', 'between', 'like')
+
+_SQL_OPERATORS = {'eq': '=', 'ne': '!=', 'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>='}
+
+_PY_OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    'eq': operator.eq, 'ne': operator.ne,
+    'lt': operator.lt, 'le': operator.le, 'gt': operator.gt, 'ge': operator.ge,
+}
+
+Condition = tuple[str, str, Any]
+
+
+def parse_where(where: dict[str, Any]) -> list[Condition]:
+    """
+    Разобрать условие выборки в список троек (поле, оператор, значение)
+
+    Parameters
+    ----------
+    where - условие в виде словаря {'поле[__оператор]': значение}
+
+    Returns
+    -------
+    Список троек (поле, оператор, значение)
+    """
+    conditions = []
+    for key, value in where.items():
+        name, _, op = key.partition('__')
+        op = op or 'eq'
+        if op not in OPERATORS:
+            raise ValueError(f'unknown operator {op!r} in condition {key!r}')
+        if op == 'between' and len(value) != 2:
+            raise ValueError(f'condition {key!r} requires a pair of values')
+        conditions.append((name, op, value))
+    return conditions
+
+
+def coerce(value: Any, field_type: Any) -> Any:
+    """
+    Привести значение условия к типу поля: дата для поля datetime
+    означает полночь, дата и время для поля date - дату, строка
+    для числового поля - число (как при сравнении со столбцом
+    INTEGER/REAL в sqlite). Остальные значения не меняются.
+
+    Parameters
+    ----------
+    value - значение условия (для in и between - одно из значений)
+    field_type - тип или аннотация поля (int | None - как int)
+
+    Returns
+    -------
+    Приведенное значение
+    """
+    if get_origin(field_type) in (Union, UnionType):
+        args = [arg for arg in get_args(field_type) if arg is not NoneType]
+        field_type = args[0] if len(args) == 1 else None
+    if not isinstance(field_type, type):
+        return value
+    if issubclass(field_type, datetime):
+        if isinstance(value, date) and not isinstance(value, datetime):
+            return datetime.combine(value, time())
+    elif issubclass(field_type, date):
+        if isinstance(value, datetime):
+            return value.date()
+    elif issubclass(field_type, (int, float)) and not issubclass(field_type, bool):
+        if isinstance(value, str):
+            return _to_number(value)
+    return value
+
+
+def _to_number(value: str) -> Any:
+    for number in (int, float):
+        try:
+            return number(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _coerce_operand(op: str, value: Any, field_type: Any) -> Any:
+    if op == 'like' or value is None:
+        return value
+    if op in ('in', 'between'):
+        return [coerce(item, field_type) for item in value]
+    return coerce(value, field_type)
+
+
+def compile_sql(where: dict[str, Any], fields: Iterable[str],
+                types: dict[str, Any] | None = None) -> tuple[str, list[Any]]:
+    """
+    Преобразовать условие выборки в параметризованное выражение WHERE
+
+    Parameters
+    ----------
+    where - условие выборки
+    fields - допустимые названия полей (столбцов таблицы)
+    types - типы или аннотации полей {название: тип} для приведения
+    значений условия (см. coerce)
+
+    Returns
+    -------
+    Строка условия (без слова WHERE) и список параметров
+    """
+    allowed = set(fields)
+    clauses: list[str] = []
+    params: list[Any] = []
+    for name, op, value in parse_where(where):
+        if name not in allowed:
+            raise ValueError(f'unknown field {name!r}')
+        if types and name in types:
+            value = _coerce_operand(op, value, types[name])
+        if op in ('eq', 'ne') and value is None:
+            clauses.append(f'{name} IS {"NOT " if op == "ne" else ""}NULL')
+        elif op == 'in':
+            values = list(value)
+            clauses.append(f'{name} IN ({", ".join("?" * len(values))})')
+            params.extend(values)
+        elif op == 'between':
+            clauses.append(f'{name} BETWEEN ? AND ?')
+            params.extend(value)
+        elif op == 'like':
+            clauses.append(f'{name} LIKE ?')
+            params.append(value)
+        else:
+            clauses.append(f'{name} {_SQL_OPERATORS[op]} ?')
+            params.append(value)
+    return ' AND '.join(clauses), params
+
+
+def _like_char(char: str) -> str:
+    if char == '%':
+        return '.*'
+    if char == '_':
+        return '.'
+    # sqlite LIKE не различает регистр только латинских букв
+    if char.isascii() and char.isalpha():
+        return f'[{char.lower()}{char.upper()}]'
+    return re.escape(char)
+
+
+def _like_to_regex(pattern: str) -> re.Pattern[str]:
+    return re.compile(''.join(map(_like_char, pattern)), re.DOTALL)
+
+
+def _make_typed_check(op: str, value: Any) -> Callable[[Any], bool]:
+    if op == 'in':
+        values = list(value)
+        return lambda attr: attr in values
+    if op == 'between':
+        low, high = value
+        return lambda attr: bool(low <= attr <= high)
+    compare = _PY_OPERATORS[op]
+    return lambda attr: bool(compare(attr, value))
+
+
+def make_check(op: str, value: Any) -> Callable[[Any], bool]:
+    """
+    Построить функцию, проверяющую значение одного поля
+    на соответствие оператору op со значением value (см. make_predicate).
+    Значение условия приводится к типу проверяемого значения (см. coerce);
+    проверка для каждого типа строится один раз.
+    """
+    if value is None and op in ('eq', 'ne'):
+        return (lambda attr: attr is None) if op == 'eq' else (
+            lambda attr: attr is not None)
+    if op == 'like':
+        regex = _like_to_regex(value)
+        return lambda attr: attr is not None and regex.fullmatch(str(attr)) is not None
+    checks: dict[type, Callable[[Any], bool]] = {}
+
+    def check(attr: Any) -> bool:
+        if attr is None:
+            return False
+        typed = checks.get(type(attr))
+        if typed is None:
+            typed = checks[type(attr)] = _make_typed_check(
+                op, _coerce_operand(op, value, type(attr)))
+        return typed(attr)
+    return check
+
+
+def make_predicate(where: dict[str, Any]) -> Callable[[Any], bool]:
+    """
+    Построить функцию, проверяющую соответствие объекта условию выборки.
+    Значение None, как и NULL в sqlite, не удовлетворяет
+    никаким сравнениям, кроме eq/ne с None.
+
+    Parameters
+    ----------
+    where - условие выборки
+
+    Returns
+    -------
+    Функция obj -> bool
+    """
+    checks = [(name, make_check(op, value))
+              for name, op, value in parse_where(where)]
+    return lambda obj: all(check(getattr(obj, name)) for name, check in checks)
+
+
+def parse_order(order_by: str) -> tuple[str, bool]:
+    """
+    Разобрать порядок сортировки: 'field' - по возрастанию,
+    '-field' - по убыванию.
+
+    Returns
+    -------
+    Название поля и признак сортировки по убыванию
+    """
+    if order_by.startswith('-'):
+        return order_by[1:], True
+    return order_by, False
+
+
+def page_key(obj: Any, order_by: str) -> tuple[Any, int]:
+    """
+    Получить ключ объекта для постраничной выборки (get_page):
+    пару (значение поля сортировки, pk). Ключ последнего объекта страницы
+    передается в get_page как after_key для получения следующей страницы.
+    """
+    name, _ = parse_order(order_by)
+    return getattr(obj, name), obj.pk
+
+
+PERIODS = ('day', 'week', 'month')
+
+_PERIOD_SQL = {
+    'day': "date({})",
+    'week': "date({}, '-6 days', 'weekday 1')",
+    'month': "date({}, 'start of month')",
+}
+
+
+def period_start(value: date | str, period: str) -> date:
+    """
+    Получить первый день периода ('day', 'week' или 'month'),
+    в который попадает дата value. Неделя начинается с понедельника.
+    Дата может быть задана строкой в формате ISO.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    day = value.date() if isinstance(value, datetime) else value
+    if period == 'day':
+        return day
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    raise ValueError(f'unknown period {period!r}')
+
+
+def next_period_start(value: date, period: str) -> date:
+    """ Получить первый день периода, следующего за периодом даты value """
+    start = period_start(value, period)
+    if period == 'day':
+        return start + timedelta(days=1)
+    if period == 'week':
+        return start + timedelta(weeks=1)
+    return (start + timedelta(days=31)).replace(day=1)
+
+
+def period_sql(column: str, period: str) -> str:
+    """
+    Получить выражение sqlite, вычисляющее первый день периода
+    для значения столбца column (строка вида 'YYYY-MM-DD')
+    """
+    if period not in _PERIOD_SQL:
+        raise ValueError(f'unknown period {period!r}')
+    return _PERIOD_SQL[period].format(column)
@@ -2,11 +2,382 @@
 Модуль для работы с базой данных с использованием СУБД sqlite3
 """
 
+import os
 import sqlite3
+import threading
 
+from contextlib import contextmanager
+from dataclasses import fields as dataclass_fields, is_dataclass
+from functools import lru_cache
+from operator import attrgetter
+from datetime import date, datetime
 from inspect import get_annotations
-from typing import Any
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from types import NoneType, TracebackType, UnionType
+from typing import Any, Callable, Iterable, Iterator, Union, get_args, get_origin
+from bookkeeper.repository.abstract_repository import AbstractRepository, T, unwrap
+from bookkeeper.repository.query import compile_sql, parse_order, period_sql
+
+
+PROFILES: dict[str, dict[str, Any]] = {
+    # синхронизация с диском при каждой фиксации; режим журнала
+    # не меняется: он хранится в файле БД, и переход из WAL невозможен,
+    # пока файл открыт другим процессом (например, главным окном)
+    'safe': {'foreign_keys': 'ON', 'synchronous': 'FULL'},
+    # журнал упреждающей записи (WAL): читатели не блокируют писателя,
+    # синхронизация только при контрольных точках; после сбоя питания
+    # могут потеряться последние транзакции, но не целостность БД
+    'balanced': {'foreign_keys': 'ON', 'journal_mode': 'WAL', 'synchronous': 'NORMAL'},
+    # массовая загрузка: без синхронизации с диском, кэш страниц 256 МБ;
+    # сбой ОС во время загрузки может повредить БД
+    'bulk-import': {'foreign_keys': 'ON', 'journal_mode': 'WAL', 'synchronous': 'OFF',
+                    'cache_size': -262144, 'temp_store': 'MEMORY'},
+}
+
+
+class ConnectionPool:
+    """
+    Менеджер соединений с файлом БД sqlite.
+    Хранит по одному долгоживущему соединению на поток, прагмы выполняются
+    один раз при открытии соединения. Репозитории, работающие с одним файлом,
+    по умолчанию разделяют общий пул (см. for_file).
+    После close() пул остается пригодным: при следующем обращении
+    соединение будет открыто заново.
+    Соединения кэшируют до cached_statements подготовленных запросов
+    (по умолчанию в sqlite3 - 128): запросы репозиториев с одинаковым
+    текстом разбираются sqlite один раз на соединение.
+    Методы begin / commit / rollback объединяют операции репозиториев,
+    использующих пул, в одну транзакцию (см. UnitOfWork); вложенные
+    вызовы begin создают точки сохранения (SAVEPOINT).
+    Прагмы соединений задаются профилем надежности (см. PROFILES):
+    'safe' (по умолчанию), 'balanced' или 'bulk-import'.
+    Дополнительная настройка соединений (функции, временные триггеры)
+    задается функциями add_initializer.
+    """
+
+    _pools: dict[str, 'ConnectionPool'] = {}
+    _pools_lock = threading.Lock()
+
+    db_file: str
+    profile: str
+    pragmas: dict[str, Any]
+    cached_statements: int
+
+    def __init__(self, db_file: str,
+                 pragmas: dict[str, Any] | None = None,
+                 cached_statements: int = 512,
+                 profile: str = 'safe') -> None:
+        """
+        Parameters
+        ----------
+        db_file - путь к файлу БД
+        pragmas - прагмы в дополнение к прагмам профиля
+        (или вместо них, если название совпадает)
+        cached_statements - размер кэша подготовленных запросов
+        profile - профиль надежности (см. PROFILES)
+        """
+        if profile not in PROFILES:
+            raise ValueError(f'unknown profile {profile!r}')
+        self.db_file = db_file
+        self.profile = profile
+        self._extra_pragmas = pragmas or {}
+        self.pragmas = {**PROFILES[profile], **self._extra_pragmas}
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._initializers: list[Callable[[sqlite3.Connection], None]] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_file(cls, db_file: str, profile: str | None = None) -> 'ConnectionPool':
+        """
+        Получить общий пул для файла БД, создав его при первом обращении.
+        Если задан профиль, отличный от профиля существующего пула,
+        профиль пула меняется (см. set_profile).
+        """
+        key = db_file if db_file == ':memory:' else os.path.abspath(db_file)
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+            if pool is None:
+                pool = cls._pools[key] = cls(db_file, profile=profile or 'safe')
+        if profile is not None and profile != pool.profile:
+            pool.set_profile(profile)
+        return pool
+
+    def set_profile(self, profile: str) -> None:
+        """
+        Сменить профиль надежности. Открытые соединения закрываются
+        и при следующем обращении открываются с прагмами нового профиля,
+        поэтому профиль следует менять, когда другие потоки не работают с БД.
+        Режим журнала WAL сохраняется в файле БД и действует
+        и для других процессов.
+        """
+        if profile not in PROFILES:
+            raise ValueError(f'unknown profile {profile!r}')
+        if self.depth():
+            raise RuntimeError('cannot change profile inside a transaction')
+        self.close()
+        self.profile = profile
+        self.pragmas = {**PROFILES[profile], **self._extra_pragmas}
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Получить соединение текущего потока, открыв его при необходимости
+        """
+        con: sqlite3.Connection | None = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.db_file, check_same_thread=False,
+                                  detect_types=sqlite3.PARSE_DECLTYPES,
+                                  cached_statements=self.cached_statements)
+            try:
+                for name, value in self.pragmas.items():
+                    con.execute(f'PRAGMA {name} = {value}')
+                with self._lock:
+                    initializers = list(self._initializers)
+                for initializer in initializers:
+                    initializer(con)
+            except BaseException:
+                con.close()
+                raise
+            self._local.con = con
+            with self._lock:
+                self._connections.append(con)
+        return con
+
+    def add_initializer(self, initializer: Callable[[sqlite3.Connection], None]) -> None:
+        """
+        Добавить функцию настройки соединения: она вызывается для каждого
+        соединения, открываемого пулом, и сразу - для уже открытых
+        """
+        with self._lock:
+            self._initializers.append(initializer)
+            connections = list(self._connections)
+        for con in connections:
+            initializer(con)
+
+    def depth(self) -> int:
+        """ Уровень вложенности транзакций, начатых begin в текущем потоке """
+        depth: int = getattr(self._local, 'depth', 0)
+        return depth
+
+    def begin(self) -> None:
+        """
+        Начать транзакцию в соединении текущего потока (BEGIN IMMEDIATE),
+        внутри уже начатой - точку сохранения. До соответствующего
+        вызова commit или rollback операции репозиториев не фиксируют
+        изменения.
+        """
+        con = self.connection()
+        depth = self.depth()
+        con.execute('BEGIN IMMEDIATE' if depth == 0 else f'SAVEPOINT uow_{depth}')
+        self._local.depth = depth + 1
+
+    def commit(self) -> None:
+        """
+        Зафиксировать транзакцию или точку сохранения, начатую begin.
+        Если транзакцию зафиксировать не удалось, она откатывается.
+        """
+        depth = self._leave()
+        con = self.connection()
+        if depth == 0:
+            try:
+                con.commit()
+            except sqlite3.Error:
+                con.rollback()
+                raise
+        else:
+            con.execute(f'RELEASE uow_{depth}')
+
+    def rollback(self) -> None:
+        """ Отменить изменения транзакции или точки сохранения, начатой begin """
+        depth = self._leave()
+        con = self.connection()
+        if depth == 0:
+            con.rollback()
+        else:
+            con.execute(f'ROLLBACK TO uow_{depth}')
+            con.execute(f'RELEASE uow_{depth}')
+
+    def _leave(self) -> int:
+        depth = self.depth() - 1
+        if depth < 0:
+            raise RuntimeError('no transaction started with begin()')
+        self._local.depth = depth
+        return depth
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Получить соединение для одной операции репозитория. Изменения
+        фиксируются (или откатываются при исключении) при выходе из блока,
+        если в потоке не начата транзакция методом begin; иначе они
+        остаются в этой транзакции.
+        """
+        con = self.connection()
+        if self.depth():
+            yield con
+        else:
+            with con:
+                yield con
+
+    def close(self) -> None:
+        """ Закрыть все открытые пулом соединения """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for con in connections:
+            con.close()
+
+    def __enter__(self) -> 'ConnectionPool':
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None,
+                 exc_val: BaseException | None,
+                 exc_tb: TracebackType | None) -> None:
+        self.close()
+
+
+SQL_TYPES: dict[type, str] = {int: 'INTEGER', float: 'REAL', str: 'TEXT'}
+
+
+def register_type(py_type: type, sql_type: str,
+                  adapter: Callable[[Any], Any] | None = None,
+                  converter: Callable[[bytes], Any] | None = None) -> None:
+    """
+    Зарегистрировать тип столбца для типа Python. Адаптер преобразует
+    значение при записи в БД (в int, float, str или bytes), конвертер -
+    при чтении из столбцов объявленного типа sql_type (получает bytes).
+    Регистрация действует для всех репозиториев.
+
+    Parameters
+    ----------
+    py_type - тип поля модели
+    sql_type - объявленный тип столбца
+    adapter - функция преобразования значения для записи
+    converter - функция восстановления значения при чтении
+    """
+    SQL_TYPES[py_type] = sql_type
+    if adapter is not None:
+        sqlite3.register_adapter(py_type, adapter)
+    if converter is not None:
+        sqlite3.register_converter(sql_type, converter)
+
+
+# даты хранятся строками ISO: так их понимают date() и strftime() в sqlite,
+# а сравнение строк совпадает с хронологическим порядком
+register_type(bool, 'BOOLEAN', int, lambda value: bool(int(value)))
+register_type(datetime, 'TIMESTAMP', lambda value: value.isoformat(' '),
+              lambda value: datetime.fromisoformat(value.decode()))
+register_type(date, 'DATE', date.isoformat,
+              lambda value: date.fromisoformat(value.decode()))
+
+
+def column_type(annotation: Any, types: dict[type, str] | None = None) -> str:
+    """
+    Получить тип столбца для аннотации поля модели. Необязательные поля
+    (int | None, Optional[int]) получают тип основного поля, подклассы -
+    тип ближайшего зарегистрированного предка, остальные поля - TEXT.
+
+    Parameters
+    ----------
+    annotation - аннотация поля
+    types - дополнительные соответствия {тип Python: тип столбца},
+    имеющие приоритет над зарегистрированными (см. register_type)
+
+    Returns
+    -------
+    Объявленный тип столбца
+    """
+    if get_origin(annotation) in (Union, UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not NoneType]
+        if len(args) == 1:
+            annotation = args[0]
+    for base in getattr(annotation, '__mro__', (annotation,)):
+        sql_type = (types or {}).get(base) or SQL_TYPES.get(base)
+        if sql_type is not None:
+            return sql_type
+    return 'TEXT'
+
+
+def init_order(cls: type) -> list[str]:
+    """
+    Получить названия полей в порядке аргументов конструктора класса:
+    для датакласса - порядок его полей, для остальных классов -
+    порядок аннотаций с pk в конце
+    """
+    if is_dataclass(cls):
+        return [fld.name for fld in dataclass_fields(cls) if fld.init]
+    names = [name for name in get_annotations(cls) if name != 'pk']
+    return [*names, 'pk']
+
+
+@lru_cache(maxsize=None)
+def row_factory(cls: type, columns: tuple[str, ...],
+                bypass_init: bool = False) -> Callable[[tuple[Any, ...]], Any]:
+    """
+    Построить функцию, создающую объект класса cls из строки результата
+    запроса, столбцы которой перечислены в columns. Функция строится
+    один раз для класса и набора столбцов.
+
+    Parameters
+    ----------
+    cls - класс объектов
+    columns - названия столбцов строки
+    bypass_init - не вызывать __init__: объект создается через __new__,
+    значения присваиваются атрибутам напрямую. Недопустимо для
+    неизменяемых (frozen) датаклассов и классов с __post_init__.
+    Без bypass_init столбцы должны идти в порядке аргументов
+    конструктора (см. init_order).
+
+    Returns
+    -------
+    Функция row -> объект
+    """
+    if not bypass_init:
+        if list(columns) != init_order(cls):
+            raise ValueError(f'columns {columns} do not match '
+                             f'{cls.__name__} constructor')
+        return lambda row: cls(*row)
+    if hasattr(cls, '__post_init__') or (
+            is_dataclass(cls) and cls.__dataclass_params__.frozen):  # type: ignore
+        raise ValueError(f'cannot bypass __init__ of {cls.__name__}')
+    # функция компилируется из текста, как методы датаклассов: присваивание
+    # распаковкой кортежа не требует цикла по столбцам и вызова setattr
+    targets = ''.join(f'obj.{name}, ' for name in columns)
+    source = ('def make(row):\n'
+              '    obj = new(cls)\n'
+              f'    {targets}= row\n'
+              '    return obj\n')
+    namespace: dict[str, Any] = {'new': cls.__new__, 'cls': cls}
+    exec(source, namespace)  # pylint: disable=exec-used
+    make: Callable[[tuple[Any, ...]], Any] = namespace['make']
+    return make
+
+
+def model_indexes(cls: type) -> list[tuple[str, ...]]:
+    """
+    Получить индексы, объявленные в метаданных полей модели-датакласса:
+    field(metadata={'index': True}) - индекс по одному полю,
+    field(metadata={'index': ('other_field',)}) - составной индекс
+    по данному полю и перечисленным полям.
+
+    Parameters
+    ----------
+    cls - класс модели
+
+    Returns
+    -------
+    Список кортежей названий столбцов
+    """
+    if not is_dataclass(cls):
+        return []
+    indexes: list[tuple[str, ...]] = []
+    for fld in dataclass_fields(cls):
+        index = fld.metadata.get('index')
+        if index is True:
+            indexes.append((fld.name,))
+        elif index:
+            indexes.append((fld.name, *index))
+    return indexes
 
 
 class SQLiteRepository(AbstractRepository[T]):
@@ -18,30 +389,219 @@ class SQLiteRepository(AbstractRepository[T]):
     cls: type
     table_name: str
     fields: dict[str, Any]
+    columns: dict[str, str]
+    bypass_init: bool
+    pool: ConnectionPool
+    indexes: dict[str, tuple[str, ...]]
 
-    def __init__(self, db_file: str, cls: type) -> None:
+    def __init__(self, db_file: str, cls: type,
+                 pool: ConnectionPool | None = None,
+                 indexes: Iterable[str | tuple[str, ...]] | None = None,
+                 types: dict[type, str] | None = None,
+                 bypass_init: bool = False,
+                 profile: str | None = None) -> None:
+        """
+        Parameters
+        ----------
+        db_file - путь к файлу БД
+        cls - класс хранимых объектов
+        pool - пул соединений (по умолчанию общий пул для db_file)
+        indexes - индексы таблицы: названия столбцов или кортежи названий
+        для составных индексов. По умолчанию берутся из метаданных полей
+        модели (см. model_indexes). Отсутствующие индексы создаются
+        при инициализации.
+        types - соответствия {тип Python: тип столбца} для полей модели
+        в дополнение к зарегистрированным (см. column_type)
+        bypass_init - создавать прочитанные объекты без вызова __init__
+        (см. row_factory)
+        profile - профиль надежности пула соединений: 'safe', 'balanced'
+        или 'bulk-import' (см. PROFILES); по умолчанию профиль пула
+        не меняется
+        Тексты запросов CRUD-операций составляются один раз при создании
+        репозитория, значения всегда передаются параметрами.
+        Таблица, созданная с другими типами столбцов (например, прежними
+        версиями программы, хранившими суммы и даты в TEXT), переводится
+        на новые типы при инициализации (см. migrate).
+        """
         self.db_file = db_file
+        if pool is None:
+            pool = ConnectionPool.for_file(db_file, profile)
+        elif profile is not None and profile != pool.profile:
+            pool.set_profile(profile)
+        self.pool = pool
         self.cls = cls
         self.table_name = self.cls.__name__.lower()
         self.fields = get_annotations(cls, eval_str=True)
         self.fields.pop('pk')
 
-        attr_names = list(self.fields.keys())
-        for name in range(len(attr_names)):
-            attr_names[name] = str(attr_names[name])
-        attr_values = list(self.fields.values())
-        for val in range(len(attr_values)):
-            if str(attr_values[val]).find('int') != -1:
-                attr_values[val] = 'INTEGER'
-            else:
-                attr_values[val] = 'TEXT'
-        attributes = list(n + ' ' + v for (n, v) in zip(attr_names, attr_values))
-        attributes = ', '.join(['pk INTEGER PRIMARY KEY'] + attributes)
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            # cur.execute(f'DROP TABLE IF EXISTS {self.table_name}')
-            cur.execute(f'CREATE TABLE IF NOT EXISTS {self.table_name} ({attributes})')
-        con.close()
+        self.columns = {name: column_type(annotation, types)
+                        for name, annotation in self.fields.items()}
+        names = ', '.join(self.fields)
+        self._insert_sql = (f'INSERT INTO {self.table_name} ({names}) '
+                            f'VALUES ({", ".join("?" * len(self.fields))})')
+        # значения полей объекта в порядке столбцов INSERT
+        self._values: Callable[[Any], tuple[Any, ...]] = (
+            attrgetter(*self.fields) if len(self.fields) > 1
+            else lambda obj: tuple(getattr(obj, name) for name in self.fields))
+        # столбцы выбираются в порядке аргументов конструктора,
+        # поэтому строка результата передается в него без перестановок
+        order = tuple(init_order(cls))
+        self.bypass_init = bypass_init
+        self._make_obj = row_factory(cls, order, bypass_init)
+        self._select_sql = f'SELECT {", ".join(order)} FROM {self.table_name}'
+        self._get_sql = f'{self._select_sql} WHERE pk = ?'
+        self._update_sql = (f'UPDATE {self.table_name} SET '
+                            f'{", ".join(f"{name} = ?" for name in self.fields)} '
+                            f'WHERE pk = ?')
+        self._delete_sql = f'DELETE FROM {self.table_name} WHERE pk = ?'
+        with self.pool.transaction() as con:
+            con.execute(f'CREATE TABLE IF NOT EXISTS {self.table_name} '
+                        f'({self._columns_sql()})')
+        self.migrate()
+        self.indexes = {}
+        for index in model_indexes(cls) if indexes is None else indexes:
+            self.create_index(index)
+
+    def _columns_sql(self) -> str:
+        return ', '.join(['pk INTEGER PRIMARY KEY'] + [
+            f'{name} {sql_type}' for name, sql_type in self.columns.items()])
+
+    def migrate(self) -> bool:
+        """
+        Привести таблицу к типам столбцов модели, если они различаются.
+        Таблица пересоздается одной транзакцией, данные копируются
+        с преобразованием к новым типам: числа, сохраненные строками,
+        становятся числами, строка 'None' в нетекстовых столбцах - NULL,
+        даты вида 'YYYY-MM-DDTHH:MM:SS' приводятся к виду с пробелом.
+        Столбцы, отсутствующие в модели, удаляются, новые заполняются NULL.
+        Индексы удаляются вместе со старой таблицей и создаются заново
+        при инициализации репозитория.
+        Если типы столбцов совпадают, в необязательных числовых полях
+        (например, Category.parent) строки 'None', записанные прежними
+        версиями update, заменяются на NULL.
+
+        Returns
+        -------
+        True, если таблица была изменена
+        """
+        con = self.pool.connection()
+        old = {row[1]: row[2].upper() for row in
+               con.execute(f'PRAGMA table_info({self.table_name})')}
+        if old == {'pk': 'INTEGER', **self.columns}:
+            nullable = [name for name, annotation in self.fields.items()
+                        if self.columns[name] != 'TEXT'
+                        and NoneType in get_args(annotation)]
+            fixed = 0
+            with self.pool.transaction():
+                for name in nullable:
+                    fixed += con.execute(f'UPDATE {self.table_name} SET {name} = NULL '
+                                         f"WHERE {name} = 'None'").rowcount
+            return fixed > 0
+        copied = [name for name in self.columns if name in old]
+        values = []
+        for name in copied:
+            # преобразование в число выполняет sqlite при записи в столбец
+            # REAL или INTEGER (type affinity)
+            value = name if self.columns[name] == 'TEXT' else f"NULLIF({name}, 'None')"
+            if self.columns[name] == 'TIMESTAMP':
+                value = f"replace({value}, 'T', ' ')"
+            values.append(value)
+        backup = f'{self.table_name}__old'
+        with self.pool.transaction():
+            if not con.in_transaction:
+                con.execute('BEGIN IMMEDIATE')
+            con.execute(f'ALTER TABLE {self.table_name} RENAME TO {backup}')
+            con.execute(f'CREATE TABLE {self.table_name} ({self._columns_sql()})')
+            con.execute(f'INSERT INTO {self.table_name} ({", ".join(["pk", *copied])}) '
+                        f'SELECT {", ".join(["pk", *values])} FROM {backup}')
+            con.execute(f'DROP TABLE {backup}')
+        return True
+
+    def create_index(self, columns: str | tuple[str, ...], unique: bool = False) -> str:
+        """
+        Создать индекс по столбцам таблицы, если его еще нет.
+
+        Parameters
+        ----------
+        columns - название столбца или кортеж названий
+        unique - уникальный индекс (UNIQUE): записи с одинаковыми
+        значениями столбцов запрещены
+
+        Returns
+        -------
+        Название индекса
+        """
+        if isinstance(columns, str):
+            columns = (columns,)
+        unknown = set(columns) - set(self.fields) - {'pk'}
+        if unknown:
+            raise ValueError(f'unknown fields {sorted(unknown)} in index')
+        name = '_'.join(('ux' if unique else 'ix', self.table_name, *columns))
+        with self.pool.transaction() as con:
+            con.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS '
+                        f'{name} ON {self.table_name} ({", ".join(columns)})')
+        self.indexes[name] = columns
+        return name
+
+    @contextmanager
+    def deferred_indexes(self) -> Iterator[None]:
+        """
+        Удалить индексы таблицы на время массовой загрузки и создать
+        их заново после нее (в том числе после ошибки): построение
+        индекса по готовой таблице быстрее, чем его обновление
+        при добавлении каждой строки. Если процесс прервется до
+        завершения загрузки, недостающие индексы будут созданы
+        при следующей инициализации репозитория.
+        Выборки внутри блока выполняются без индексов.
+        """
+        indexes = dict(self.indexes)
+        with self.pool.transaction() as con:
+            for name in indexes:
+                con.execute(f'DROP INDEX IF EXISTS {name}')
+        try:
+            yield
+        finally:
+            for columns in indexes.values():
+                self.create_index(columns)
+
+    def explain(self, where: dict[str, Any] | None = None) -> list[str]:
+        """
+        Получить план выполнения запроса get_all(where)
+        (вывод EXPLAIN QUERY PLAN), например
+        ['SEARCH expense USING INDEX ix_expense_category (category=?)']
+        """
+        query, params = self._select(where)
+        with self.pool.transaction() as con:
+            return [row[-1] for row in
+                    con.execute(f'EXPLAIN QUERY PLAN {query}', params)]
+
+    def index_report(self,
+                     queries: Iterable[dict[str, Any] | None]) -> dict[str, list[str]]:
+        """
+        Составить отчет об использовании индексов: для каждого условия
+        выборки вернуть названия использованных индексов из плана запроса
+        (пустой список означает полный просмотр таблицы).
+        Ключ отчета - строковое представление условия.
+        """
+        report = {}
+        for where in queries:
+            plan = self.explain(where)
+            report[repr(where)] = [name for name in self.indexes
+                                   if any(f'INDEX {name} ' in f'{line} '
+                                          for line in plan)]
+        return report
+
+    def close(self) -> None:
+        """ Закрыть соединения пула, используемого репозиторием """
+        self.pool.close()
+
+    def __enter__(self) -> 'SQLiteRepository[T]':
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None,
+                 exc_val: BaseException | None,
+                 exc_tb: TracebackType | None) -> None:
+        self.close()
 
     def add(self, obj: T) -> int:
         """
@@ -55,84 +615,369 @@ class SQLiteRepository(AbstractRepository[T]):
         #    raise ValueError("cannot add object with defined attribute pk")
         if getattr(obj, 'pk', None) != 0:
             raise ValueError("cannot add object with defined attribute pk")
-        names = ', '.join(self.fields.keys())
-        place_holders = ', '.join("?" * len(self.fields))
         values = [getattr(obj, x) for x in self.fields]
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            cur.execute('PRAGMA foreign_keys = ON')
-            cur.execute(
-                f'INSERT INTO {self.table_name} ({names}) VALUES ({place_holders})',
-                values
-            )
+        with self.pool.transaction() as con:
+            cur = con.execute(self._insert_sql, values)
             obj.pk = cur.lastrowid
-        con.close()
+        for hook in self.hooks:
+            hook.added(obj)
         return obj.pk
 
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить несколько объектов одной транзакцией с помощью executemany,
+        вернуть список id, также записать id в атрибут pk каждого объекта.
+        objs может быть генератором: объекты не собираются в список,
+        а передаются в executemany по мере чтения.
+        Идентификаторы назначаются последовательно после максимального pk
+        в таблице, запись блокируется на время транзакции (BEGIN IMMEDIATE).
+        При ошибке транзакция откатывается, однако pk объектов, уже
+        прочитанных из objs, не восстанавливается.
+        Если к репозиторию подключены обработчики (hooks), объекты
+        запоминаются и передаются обработчикам после завершения транзакции.
+        Внутри транзакции, начатой ConnectionPool.begin (см. UnitOfWork),
+        отдельная транзакция не начинается.
+        """
+        pks: list[int] = []
+        added: list[T] | None = [] if self.hooks else None
+        values = self._values
+
+        def rows(first_pk: int) -> Iterator[tuple[Any, ...]]:
+            for pk, obj in enumerate(objs, start=first_pk):
+                if getattr(obj, 'pk', None) != 0:
+                    raise ValueError("cannot add object with defined attribute pk")
+                yield values(obj)
+                obj.pk = pk
+                pks.append(pk)
+                if added is not None:
+                    added.append(obj)
+
+        with self.pool.transaction() as con:
+            if not con.in_transaction:
+                con.execute('BEGIN IMMEDIATE')
+            cur = con.cursor()
+            cur.execute(f'SELECT max(pk) FROM {self.table_name}')
+            last_pk = cur.fetchone()[0] or 0
+            cur.executemany(self._insert_sql, rows(last_pk + 1))
+            if pks and cur.execute('SELECT last_insert_rowid()').fetchone()[0] != pks[-1]:
+                raise RuntimeError("unexpected primary keys assigned by add_many")
+        for obj in added or ():
+            for hook in self.hooks:
+                hook.added(obj)
+        return pks
+
+    def accumulate(self, obj: T, field: str, key: tuple[str, ...]) -> T:
+        """
+        Прибавить значение поля field к записи с теми же значениями
+        полей key или добавить obj (см. AbstractRepository.accumulate)
+        одним запросом INSERT ... ON CONFLICT DO UPDATE: сложение
+        выполняет sqlite, поэтому изменения, одновременно сделанные
+        другими процессами, не теряются. По полям key создается
+        уникальный индекс (при первом вызове).
+        Возвращается объект, прочитанный из записанной строки.
+        """
+        if field not in self.fields or field in key:
+            raise ValueError(f'cannot accumulate field {field!r}')
+        name = '_'.join(('ux', self.table_name, *key))
+        if name not in self.indexes:
+            self.create_index(key, unique=True)
+        order = ', '.join(init_order(self.cls))
+        query = (f'{self._insert_sql} ON CONFLICT ({", ".join(key)}) '
+                 f'DO UPDATE SET {field} = {field} + excluded.{field} '
+                 f'RETURNING {order}')
+        values = [getattr(obj, x) for x in self.fields]
+        with self.pool.transaction() as con:
+            if self.hooks and not con.in_transaction:
+                con.execute('BEGIN IMMEDIATE')
+            old: T | None = None
+            if self.hooks:
+                select, params = self._select({name: getattr(obj, name) for name in key})
+                row = con.execute(select, params).fetchone()
+                old = None if row is None else self._make_obj(row)
+            new: T = self._make_obj(con.execute(query, values).fetchone())
+        for hook in self.hooks:
+            if old is None:
+                hook.added(new)
+            else:
+                hook.updated(old, new)
+        return new
+
     def get(self, pk: int) -> T | None:
         """ Получить объект по id """
 
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            cur.execute('PRAGMA foreign_keys = ON')
-            cur.execute(f'SELECT * FROM {self.table_name} WHERE pk = {pk}')
-            tuple_obj = cur.fetchone()
-        con.close()
+        with self.pool.transaction() as con:
+            tuple_obj = con.execute(self._get_sql, (pk,)).fetchone()
         if tuple_obj is None:
             return None
-        tuple_pk = int(tuple_obj[0])
-        new_tuple_obj = list(tuple_obj)[1:]
-        new_tuple_obj.append(tuple_pk)
-        new_tuple_obj = tuple(new_tuple_obj)
-        obj = self.cls(*new_tuple_obj)  # to avoid TestSQLiteRepo(pk=(1, ''), text='')
-        return obj
+        return self._make_obj(tuple_obj)
 
     def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
         """
         Получить все записи по некоторому условию
-        where - условие в виде словаря {'название_поля': значение}
+        where - условие в виде словаря {'название_поля': значение},
+        ключ может содержать оператор: {'amount__gt': 100}
+        (см. bookkeeper.repository.query)
         если условие не задано (по умолчанию), вернуть все записи
+        Условие преобразуется в параметризованное выражение WHERE,
+        объекты создаются только для подходящих записей.
         """
 
-        with sqlite3.connect(self.db_file) as con:
+        query, params = self._select(where)
+        with self.pool.transaction() as con:
             cur = con.cursor()
-            cur.execute('PRAGMA foreign_keys = ON')
-            cur.execute(f'SELECT * FROM {self.table_name}')
+            cur.execute(query, params)
             tuple_objs = cur.fetchall()
-        con.close()
-        objs = []
-        for tuple_obj in tuple_objs:
-            tuple_pk = int(tuple_obj[0])
-            new_tuple_obj = list(tuple_obj)[1:]
-            new_tuple_obj.append(tuple_pk)
-            new_tuple_obj = tuple(new_tuple_obj)
-            objs.append(self.cls(*new_tuple_obj))
-        if where is None:
-            return objs
-        objs = [obj for obj in objs if
-                all(getattr(obj, attr) == where[attr] for attr in where.keys())]
-        return objs
+        return list(map(self._make_obj, tuple_objs))
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        """
+        Перебрать записи по условию (аналогично get_all), читая их
+        из курсора порциями по batch_size строк (fetchmany).
+        В памяти одновременно находится не более одной порции.
+        """
+        query, params = self._select(where)
+        yield from map(self._make_obj, self._fetch(query, params, batch_size))
+
+    def iter_rows(self, where: dict[str, Any] | None = None,
+                  batch_size: int = 1000) -> Iterator[tuple[Any, ...]]:
+        """
+        Перебрать строки таблицы по условию без создания объектов:
+        кортежи значений столбцов в порядке init_order(cls) в том виде,
+        в каком они хранятся в БД (конвертеры sqlite3 не применяются,
+        например, даты остаются строками ISO). Строки читаются
+        из курсора порциями по batch_size, как в iter_all.
+        """
+        clause, params = self._where(where)
+        # унарный + не меняет значение, но лишает столбец объявленного
+        # типа, по которому sqlite3 выбирает конвертер
+        names = ', '.join(
+            f'+{name}' if self.columns.get(name, 'INTEGER').upper() in sqlite3.converters
+            else name for name in init_order(self.cls))
+        yield from self._fetch(f'SELECT {names} FROM {self.table_name}{clause}',
+                               params, batch_size)
+
+    def iter_json(self, where: dict[str, Any] | None = None,
+                  batch_size: int = 1000) -> Iterator[str]:
+        """
+        Перебрать строки таблицы по условию в виде объектов JSON
+        {столбец: значение}, составленных в sqlite (json_object).
+        Значения передаются в том виде, в каком они хранятся в БД
+        (см. iter_rows).
+        """
+        clause, params = self._where(where)
+        pairs = ', '.join(f"'{name}', {name}" for name in init_order(self.cls))
+        query = f'SELECT json_object({pairs}) FROM {self.table_name}{clause}'
+        for row in self._fetch(query, params, batch_size):
+            yield row[0]
+
+    def _fetch(self, query: str, params: list[Any],
+               batch_size: int) -> Iterator[tuple[Any, ...]]:
+        # в памяти одновременно находится не более одной порции строк
+        cur = self.pool.connection().cursor()
+        try:
+            cur.execute(query, params)
+            while rows := cur.fetchmany(batch_size):
+                yield from rows
+        finally:
+            cur.close()
+
+    def get_page(self, order_by: str = 'pk',
+                 after_key: tuple[Any, int] | None = None,
+                 limit: int = 100) -> list[T]:
+        """
+        Получить страницу записей при постраничной выборке по ключу
+        (см. AbstractRepository.get_page). Условие на ключ записывается
+        сравнением (поле, pk) > (?, ?), поэтому при наличии индекса по полю
+        сортировки стоимость запроса не зависит от размера таблицы.
+        """
+        name, descending = parse_order(order_by)
+        if name != 'pk' and name not in self.fields:
+            raise ValueError(f'unknown field {name!r}')
+        direction = 'DESC' if descending else 'ASC'
+        query = self._select_sql
+        params: list[Any] = []
+        if after_key is not None:
+            query += f' WHERE ({name}, pk) {"<" if descending else ">"} (?, ?)'
+            params.extend(after_key)
+        query += f' ORDER BY {name} {direction}, pk {direction} LIMIT ?'
+        params.append(limit)
+        with self.pool.transaction() as con:
+            cur = con.cursor()
+            cur.execute(query, params)
+            return list(map(self._make_obj, cur.fetchall()))
+
+    def get_totals(self, value_field: str, date_field: str, period: str,
+                   where: dict[str, Any] | None = None) -> dict[date, float]:
+        """
+        Получить суммы значений поля value_field по периодам
+        (см. AbstractRepository.get_totals). Суммирование выполняется
+        в sqlite запросом с GROUP BY, объекты не создаются.
+        """
+        for name in (value_field, date_field):
+            if name not in self.fields:
+                raise ValueError(f'unknown field {name!r}')
+        clause, params = self._where(where)
+        query = (f'SELECT {period_sql(date_field, period)} AS period, '
+                 f'SUM({value_field}) FROM {self.table_name}{clause} '
+                 f'GROUP BY period ORDER BY period')
+        with self.pool.transaction() as con:
+            return {date.fromisoformat(day): total
+                    for day, total in con.execute(query, params)}
+
+    def get_sums(self, value_field: str, group_field: str,
+                 where: dict[str, Any] | None = None) -> dict[Any, float]:
+        """
+        Получить суммы значений поля по группам
+        (см. AbstractRepository.get_sums) одним запросом с GROUP BY
+        """
+        for name in (value_field, group_field):
+            if name != 'pk' and name not in self.fields:
+                raise ValueError(f'unknown field {name!r}')
+        clause, params = self._where(where)
+        query = (f'SELECT {group_field}, SUM({value_field}) FROM {self.table_name}'
+                 f'{clause} GROUP BY {group_field}')
+        with self.pool.transaction() as con:
+            return dict(con.execute(query, params).fetchall())
+
+    def get_all_under(self, field: str, root: int,
+                      tree: AbstractRepository[Any],
+                      where: dict[str, Any] | None = None) -> list[T]:
+        """
+        Получить записи, относящиеся к поддереву root иерархического
+        репозитория tree (см. AbstractRepository.get_all_under).
+        Если tree хранится в том же файле БД, поддерево и записи
+        выбираются одним запросом WITH RECURSIVE.
+        """
+        if not self._same_db(tree):
+            return super().get_all_under(field, root, tree, where)
+        inner = unwrap(tree)
+        if not isinstance(inner, SQLiteRepository):
+            raise TypeError('tree is not a SQLite repository')
+        query, params = self._under(self._select_sql,
+                                    field, root, inner, where)
+        with self.pool.transaction() as con:
+            return list(map(self._make_obj, con.execute(query, params)))
+
+    def get_total_under(self, value_field: str, field: str, root: int,
+                        tree: AbstractRepository[Any],
+                        where: dict[str, Any] | None = None) -> float:
+        """
+        Получить сумму значений поля для записей поддерева
+        (см. AbstractRepository.get_total_under) одним запросом
+        WITH RECURSIVE, если tree хранится в том же файле БД.
+        """
+        if not self._same_db(tree):
+            return super().get_total_under(value_field, field, root, tree, where)
+        inner = unwrap(tree)
+        if not isinstance(inner, SQLiteRepository):
+            raise TypeError('tree is not a SQLite repository')
+        if value_field not in self.fields:
+            raise ValueError(f'unknown field {value_field!r}')
+        query, params = self._under(
+            f'SELECT TOTAL({value_field}) FROM {self.table_name}',
+            field, root, inner, where)
+        with self.pool.transaction() as con:
+            total: float = con.execute(query, params).fetchone()[0]
+            return total
+
+    def get_rows(self, lookups: dict[str, tuple[AbstractRepository[Any], str]]
+                 | None = None,
+                 where: dict[str, Any] | None = None,
+                 after_pk: int | None = None,
+                 limit: int | None = None) -> list[list[Any]]:
+        """
+        Получить записи в виде строк для отображения
+        (см. AbstractRepository.get_rows). Если репозитории lookups
+        хранятся в том же файле БД, значения подставляются одним запросом
+        с LEFT JOIN, объекты моделей не создаются.
+        """
+        lookups = lookups or {}
+        if not all(self._same_db(repo) for repo, _ in lookups.values()):
+            return super().get_rows(lookups, where, after_pk, limit)
+        for name in lookups:
+            if name not in self.fields:
+                raise ValueError(f'unknown field {name!r}')
+        condition = dict(where or {})
+        if after_pk is not None:
+            condition['pk__gt'] = after_pk
+        clause, params = self._where(condition)
+        columns = []
+        joins: list[str] = []
+        for name in [*self.fields, 'pk']:
+            if name not in lookups:
+                columns.append(f't.{name}')
+                continue
+            repo = unwrap(lookups[name][0])
+            if not isinstance(repo, SQLiteRepository):
+                raise TypeError(f'lookup {name!r} is not a SQLite repository')
+            display = lookups[name][1]
+            if display != 'pk' and display not in repo.fields:
+                raise ValueError(f'unknown field {display!r}')
+            alias = f'j{len(joins)}'
+            joins.append(f' LEFT JOIN {repo.table_name} AS {alias} '
+                         f'ON {alias}.pk = t.{name}')
+            columns.append(f'COALESCE({alias}.{display}, t.{name})')
+        # условие применяется во вложенном запросе, чтобы названия полей
+        # не совпадали со столбцами присоединенных таблиц
+        query = (f'SELECT {", ".join(columns)} FROM '
+                 f'(SELECT * FROM {self.table_name}{clause}) AS t'
+                 f'{"".join(joins)} ORDER BY t.pk')
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self.pool.transaction() as con:
+            return [list(row) for row in con.execute(query, params)]
+
+    def _same_db(self, other: AbstractRepository[Any]) -> bool:
+        other = unwrap(other)
+        return isinstance(other, SQLiteRepository) and other.pool is self.pool
+
+    def _under(self, select: str, field: str, root: int,
+               tree: 'SQLiteRepository[Any]',
+               where: dict[str, Any] | None) -> tuple[str, list[Any]]:
+        if field not in self.fields:
+            raise ValueError(f'unknown field {field!r}')
+        clause, params = self._where(where)
+        clause += ' AND ' if clause else ' WHERE '
+        query = (f'WITH RECURSIVE subtree(pk) AS ('
+                 f'SELECT ? UNION '
+                 f'SELECT node.pk FROM {tree.table_name} AS node '
+                 f'JOIN subtree ON node.parent = subtree.pk) '
+                 f'{select}{clause}{field} IN subtree')
+        return query, [root, *params]
+
+    def _where(self, where: dict[str, Any] | None) -> tuple[str, list[Any]]:
+        if not where:
+            return '', []
+        clause, params = compile_sql(where, ['pk', *self.fields], self.fields)
+        return f' WHERE {clause}', params
+
+    def _select(self, where: dict[str, Any] | None) -> tuple[str, list[Any]]:
+        clause, params = self._where(where)
+        return f'{self._select_sql}{clause}', params
 
     def update(self, obj: T) -> None:
         """ Обновить данные об объекте. Объект должен содержать поле pk. """
 
         if obj.pk == 0:
             raise ValueError("object with unknown primary key")
-        names = list(self.fields.keys())
-        sets = ', '.join(f'{name} = \'{getattr(obj, name)}\'' for name in names)
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            cur.execute('PRAGMA foreign_keys = ON')
-            cur.execute(f'UPDATE {self.table_name} SET {sets} WHERE pk = {obj.pk}')
-        con.close()
+        old = self.get(obj.pk) if self.hooks else None
+        values = [getattr(obj, x) for x in self.fields]
+        values.append(obj.pk)
+        with self.pool.transaction() as con:
+            con.execute(self._update_sql, values)
+        if old is not None:
+            for hook in self.hooks:
+                hook.updated(old, obj)
 
     def delete(self, pk: int) -> None:
         """ Удалить запись """
 
-        if self.get(pk) is None:
+        obj = self.get(pk)
+        if obj is None:
             raise KeyError("no object with such pk")
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            cur.execute('PRAGMA foreign_keys = ON')
-            cur.execute(f'DELETE FROM {self.table_name} WHERE pk = {pk}')
-        con.close()
+        with self.pool.transaction() as con:
+            con.execute(self._delete_sql, (pk,))
+        for hook in self.hooks:
+            hook.deleted(obj)
@@ -0,0 +1,89 @@
+"""
+Модуль описывает единицу работы - группу операций над несколькими
+репозиториями, которые выполняются целиком или не выполняются совсем
+"""
+
+from types import TracebackType
+from typing import Any
+
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, RepositoryHook, unwrap)
+from bookkeeper.repository.memory_repository import MemoryRepository, Snapshot
+from bookkeeper.repository.sqlite_repository import ConnectionPool, SQLiteRepository
+
+
+class UnitOfWork:
+    """
+    Контекстный менеджер, объединяющий операции над репозиториями
+    в одну транзакцию:
+
+    with UnitOfWork(cat_repo, exp_repo):
+        Category.create_from_tree(tree, cat_repo)
+        exp_repo.add_many(expenses)
+
+    Репозитории SQLiteRepository должны использовать общий пул соединений
+    (по умолчанию так и есть для репозиториев одного файла БД): их
+    операции выполняются одной транзакцией, которая фиксируется при выходе
+    из блока и откатывается при исключении. Изменения не фиксируются
+    после каждой операции, поэтому запись большого числа объектов
+    требует одной синхронизации с диском вместо многих.
+    Для MemoryRepository при входе сохраняется снимок (snapshot),
+    который восстанавливается при исключении; снимок не копирует
+    объекты, поэтому многократные единицы работы над большим
+    репозиторием (например, импорт порциями) не замедляются.
+    Кэширующие обертки (CachedRepository) заменяются внутренними
+    репозиториями, их кэш сбрасывается при откате. Вложенные единицы
+    работы над тем же пулом используют точки сохранения: исключение
+    во вложенном блоке отменяет только его изменения.
+    После отката обработчики (hooks) перечисленных репозиториев получают
+    вызов rolled_back.
+    Транзакция относится к соединению текущего потока: операции других
+    потоков в нее не входят.
+    """
+
+    def __init__(self, *repos: AbstractRepository[Any]) -> None:
+        self.repos = [unwrap(repo) for repo in repos]
+        pools = {id(repo.pool): repo.pool for repo in self.repos
+                 if isinstance(repo, SQLiteRepository)}
+        if len(pools) > 1:
+            raise ValueError('SQLite repositories in a unit of work '
+                             'must share a connection pool')
+        self.pool: ConnectionPool | None = next(iter(pools.values()), None)
+        self._snapshots: list[tuple[MemoryRepository[Any], Snapshot]] = []
+
+    def __enter__(self) -> 'UnitOfWork':
+        self._snapshots = [(repo, repo.snapshot()) for repo in self.repos
+                           if isinstance(repo, MemoryRepository)]
+        if self.pool is not None:
+            self.pool.begin()
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None,
+                 exc_val: BaseException | None,
+                 exc_tb: TracebackType | None) -> None:
+        if exc_type is None:
+            try:
+                if self.pool is not None:
+                    self.pool.commit()
+            except BaseException:
+                self._restore()
+                raise
+            for memory_repo, snapshot in self._snapshots:
+                memory_repo.release(snapshot)
+            self._snapshots = []
+            return
+        if self.pool is not None:
+            self.pool.rollback()
+        self._restore()
+
+    def _restore(self) -> None:
+        for memory_repo, snapshot in self._snapshots:
+            memory_repo.restore(snapshot)
+        self._snapshots = []
+        notified: set[int] = set()
+        hook: RepositoryHook[Any]
+        for repo in self.repos:
+            for hook in repo.hooks:
+                if id(hook) not in notified:
+                    notified.add(id(hook))
+                    hook.rolled_back()
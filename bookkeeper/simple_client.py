@@ -2,14 +2,22 @@
 Простой тестовый скрипт для терминала
 """
 
+from typing import Callable
+
+from bookkeeper.config import DB_NAME, DB_PROFILE
+from bookkeeper.importer import ExpenseImporter, ImportProgress, import_file
+from bookkeeper.models.budget import PeriodTotal, RunningTotals
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
 # from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.cached_repository import CachedRepository
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
-from bookkeeper.utils import read_tree
+from bookkeeper.utils import iter_paths
 
-cat_repo = SQLiteRepository[Category]('test.db', Category)
-exp_repo = SQLiteRepository[Expense]('test.db', Expense)
+cat_repo = CachedRepository(SQLiteRepository[Category](DB_NAME, Category,
+                                                       profile=DB_PROFILE))
+exp_repo = SQLiteRepository[Expense](DB_NAME, Expense)
+totals = RunningTotals(exp_repo, SQLiteRepository[PeriodTotal](DB_NAME, PeriodTotal))
 
 cats = '''
 продукты
@@ -21,7 +29,70 @@ cats = '''
 одежда
 '''.splitlines()
 
-Category.create_from_tree(read_tree(cats), cat_repo)
+Category.create_from_paths(iter_paths(cats), cat_repo)
+
+
+def show_categories(_: str) -> None:
+    """ Вывести все категории """
+    for cat in cat_repo.iter_all():
+        print(cat)
+
+
+def show_expenses(_: str) -> None:
+    """ Вывести все расходы """
+    for exp in exp_repo.iter_all():
+        print(exp)
+
+
+def check_totals(_: str) -> None:
+    """ Пересчитать суммы расходов и вывести исправленные расхождения """
+    diff = totals.rebuild()
+    for (period, start, category), (stored, actual) in sorted(diff.items()):
+        print(f'{period} {start} категория {category}: '
+              f'было {stored}, пересчитано {actual}')
+    print(f'исправлено расхождений: {len(diff)}')
+
+
+def import_expenses(path: str) -> None:
+    """ Импортировать расходы из файла CSV или OFX """
+    importer = ExpenseImporter(
+        exp_repo, cat_repo,
+        SQLiteRepository[ImportProgress](DB_NAME, ImportProgress),
+        totals=totals)
+    try:
+        state = import_file(path, importer,
+                            lambda s: print(f'обработано записей: {s.position}'))
+    except OSError as error:
+        print(error)
+        return
+    for line, message in importer.errors:
+        print(f'строка {line}: {message}')
+    print(f'добавлено {state.added}, отклонено {state.rejected}')
+
+
+def add_expense(text: str) -> None:
+    """ Добавить расход: '<сумма> <категория>' """
+    amount, name = text.split(maxsplit=1)
+    try:
+        cat = cat_repo.get_all({'name': name})[0]
+    except IndexError:
+        print(f'категория {name} не найдена')
+        return
+    exp = Expense(int(amount), cat.pk)
+    exp_repo.add(exp)
+    print(exp)
+
+
+# команды без аргументов
+COMMANDS: dict[str, Callable[[str], None]] = {
+    'категории': show_categories,
+    'расходы': show_expenses,
+    'проверить итоги': check_totals,
+}
+# команды с аргументом: '<команда> <аргумент>'
+COMMANDS_WITH_ARG: dict[str, Callable[[str], None]] = {
+    'импорт': import_expenses,
+}
 
 while True:
     try:
@@ -30,17 +101,10 @@ while True:
         break
     if not cmd:
         continue
-    if cmd == 'категории':
-        print(*cat_repo.get_all(), sep='\n')
-    elif cmd == 'расходы':
-        print(*exp_repo.get_all(), sep='\n')
+    command, _, arg = cmd.partition(' ')
+    if cmd in COMMANDS:
+        COMMANDS[cmd](cmd)
+    elif command in COMMANDS_WITH_ARG and arg:
+        COMMANDS_WITH_ARG[command](arg)
     elif cmd[0].isdecimal():
-        amount, name = cmd.split(maxsplit=1)
-        try:
-            cat = cat_repo.get_all({'name': name})[0]
-        except IndexError:
-            print(f'категория {name} не найдена')
-            continue
-        exp = Expense(int(amount), cat.pk)
-        exp_repo.add(exp)
-        print(exp)
+        add_expense(cmd)
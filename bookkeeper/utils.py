@@ -16,6 +16,58 @@ def _lines_with_indent(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
         yield _get_indent(line), line.strip()
 
 
+def iter_paths(lines: Iterable[str]) -> Iterator[tuple[str, ...]]:
+    """
+    Читать структуру дерева из текста на основе отступов по одной строке:
+    для каждого элемента выдать путь к нему - кортеж названий от элемента
+    верхнего уровня до самого элемента. Пути выдаются в порядке обхода
+    дерева в глубину, родитель - раньше потомков.
+    В памяти хранится только путь к текущему элементу, поэтому файл
+    любого размера читается потоком. Путь однозначно определяет элемент,
+    даже если элементы разных ветвей называются одинаково.
+
+    Пример. Текст из описания read_tree даст такие пути:
+    ('parent',), ('parent', 'child1'), ('parent', 'child1', 'child2'),
+    ('parent', 'child3')
+
+    Parameters
+    ----------
+    lines - Итерируемый объект, содержащий строки текста (файл или список строк)
+
+    Yields
+    -------
+    Кортежи названий
+    """
+    names: list[str] = []
+    indents: list[int] = []
+    for i, (indent, name) in enumerate(_lines_with_indent(lines)):
+        dedented = False
+        while indents and indent < indents[-1]:
+            indents.pop()
+            names.pop()
+            dedented = True
+        if indents and indent == indents[-1]:
+            indents.pop()
+            names.pop()
+        elif dedented:
+            raise IndentationError(
+                f'unindent does not match any outer indentation '
+                f'level in line {i}:\n'
+            )
+        indents.append(indent)
+        names.append(name)
+        yield tuple(names)
+
+
+def iter_tree(lines: Iterable[str]) -> Iterator[tuple[str, str | None]]:
+    """
+    Потоковый вариант read_tree: выдавать пары "потомок-родитель"
+    по мере чтения строк (см. iter_paths)
+    """
+    for path in iter_paths(lines):
+        yield path[-1], path[-2] if len(path) > 1 else None
+
+
 def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     """
     Прочитать структуру дерева из текста на основе отступов. Вернуть список
@@ -32,7 +84,8 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     [('parent', None), ('child1', 'parent'),
      ('child2', 'child1'), ('child3', 'parent')]
 
-    Пустые строки игнорируются.
+    Пустые строки игнорируются. Для больших файлов используйте
+    генераторы iter_tree и iter_paths, не хранящие дерево целиком.
 
     Parameters
     ----------
@@ -42,22 +95,4 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     -------
     Список пар "потомок-родитель"
     """
-    parents: list[tuple[str | None, int]] = []
-    last_indent = -1
-    last_name = None
-    result: list[tuple[str, str | None]] = []
-    for i, (indent, name) in enumerate(_lines_with_indent(lines)):
-        if indent > last_indent:
-            parents.append((last_name, last_indent))
-        elif indent < last_indent:
-            while indent < last_indent:
-                _, last_indent = parents.pop()
-            if indent != last_indent:
-                raise IndentationError(
-                    f'unindent does not match any outer indentation '
-                    f'level in line {i}:\n'
-                )
-        result.append((name, parents[-1][0]))
-        last_name = name
-        last_indent = indent
-    return result
+    return list(iter_tree(lines))
@@ -2,31 +2,46 @@
 Модуль, в котором задаются параметры окон и виджетов в приложении
 """
 
-from typing import Any
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Any, Callable
 from PySide6 import QtCore, QtWidgets, QtGui
 
+# submit(func, *args, callback=...) - выполнить func в фоновом потоке и передать
+# результат callback в главном потоке (например, AsyncRepository.submit)
+Submit = Callable[..., Any]
+
 
 class TableModel(QtCore.QAbstractTableModel):
     """
     Модель таблицы расходов, которая отстраивается в соответствии
     с данными в БД Expenses.
-    Готовая таблица отображается в основном окне приложения
+    Готовая таблица отображается в основном окне приложения.
+    Строки можно добавлять, удалять и изменять по одной (insert_row,
+    remove_row, update_row): представление перерисовывает только
+    затронутые строки, а не всю таблицу.
+    Если задан key_column, строки упорядочены по возрастанию значения
+    в этом столбце (например, pk), и find_row находит строку
+    двоичным поиском.
     """
 
-    def __init__(self, data: list[list[Any]]) -> None:
+    def __init__(self, data: list[list[Any]], key_column: int | None = None) -> None:
         super().__init__()
         self._data = data
+        self._columns = len(data[0]) if data else 0
+        self.key_column = key_column
 
-    def data(self, index: Any, role: int) -> Any:
+    def data(self, index: QtCore.QModelIndex | QtCore.QPersistentModelIndex,
+             role: int = QtCore.Qt.ItemDataRole.DisplayRole) -> Any:
         """
         Структурирует данные в виде таблицы.
         Ряды - внешний список
         Колонки - внутренний список
         """
-        if role == QtCore.Qt.DisplayRole:
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
             return self._data[index.row()][index.column()]
 
-    def rowCount(self, index: Any) -> int:
+    def rowCount(self, index: Any = QtCore.QModelIndex()) -> int:
         """
         Определяет количество строк таблицы в окне
 
@@ -36,7 +51,7 @@ class TableModel(QtCore.QAbstractTableModel):
         """
         return len(self._data)
 
-    def columnCount(self, index: Any) -> int:
+    def columnCount(self, index: Any = QtCore.QModelIndex()) -> int:
         """
         Определяет количество столбцов для таблицы в окне
 
@@ -44,9 +59,322 @@ class TableModel(QtCore.QAbstractTableModel):
         -------
         Количество элементов в кортеже с данными
         """
-        # The following takes the first sub-list, and returns
-        # the length (only works if all rows are an equal length)
-        return len(self._data[0])
+        # число столбцов определяется первой строкой
+        # (все строки должны быть одинаковой длины)
+        return self._columns
+
+    def find_row(self, key: Any) -> int | None:
+        """
+        Найти номер строки по значению ключевого столбца (key_column)
+
+        Returns
+        -------
+        Номер строки или None, если строки с таким ключом нет
+        """
+        if self.key_column is None:
+            raise ValueError('table has no key column')
+        column = self.key_column
+        position = bisect_left(self._data, key, key=lambda row: row[column])
+        if position < len(self._data) and self._data[position][column] == key:
+            return position
+        return None
+
+    def insert_row(self, row: list[Any], position: int | None = None) -> int:
+        """
+        Вставить строку в позицию position. По умолчанию строка
+        добавляется в конец, а при заданном key_column - в позицию,
+        сохраняющую порядок ключей.
+
+        Returns
+        -------
+        Номер вставленной строки
+        """
+        if position is None:
+            if self.key_column is None:
+                position = len(self._data)
+            else:
+                column = self.key_column
+                position = bisect_left(self._data, row[column],
+                                       key=lambda item: item[column])
+        if not self._columns:
+            self.beginInsertColumns(QtCore.QModelIndex(), 0, len(row) - 1)
+            self._columns = len(row)
+            self.endInsertColumns()
+        self.beginInsertRows(QtCore.QModelIndex(), position, position)
+        self._data.insert(position, row)
+        self.endInsertRows()
+        return position
+
+    def remove_row(self, position: int) -> list[Any]:
+        """ Удалить строку с номером position и вернуть ее """
+        self.beginRemoveRows(QtCore.QModelIndex(), position, position)
+        row = self._data.pop(position)
+        self.endRemoveRows()
+        return row
+
+    def update_row(self, position: int, row: list[Any]) -> None:
+        """ Заменить строку с номером position """
+        self._data[position] = row
+        self.dataChanged.emit(self.index(position, 0),
+                              self.index(position, self._columns - 1))
+
+
+class PagedTableModel(QtCore.QAbstractTableModel):
+    """
+    Модель таблицы, загружающая строки страницами по мере прокрутки
+    (canFetchMore / fetchMore). Строки упорядочены по возрастанию ключа
+    в последнем столбце (pk). В памяти хранятся не более max_pages
+    последних использованных страниц; вытесненная страница загружается
+    заново при обращении к ее строкам. Для каждой страницы запоминаются
+    только ее размер и ключ последней строки.
+    Если задана функция submit, страницы при прокрутке загружаются
+    в фоновом потоке: пока страница загружается, ее ячейки пусты.
+    Поддерживает те же изменения по одной строке, что и TableModel
+    (для них нужная страница загружается сразу).
+
+    Parameters
+    ----------
+    fetch - функция fetch(after_key, limit), возвращающая до limit строк
+    с ключами больше after_key (None - с начала) в порядке ключей
+    columns - число столбцов
+    page_size - число строк в странице
+    max_pages - число страниц, хранящихся в памяти
+    submit - функция, выполняющая fetch в фоновом потоке (см. Submit)
+    """
+
+    def __init__(self, fetch: Callable[[Any, int], list[list[Any]]], columns: int,
+                 page_size: int = 200, max_pages: int = 10,
+                 submit: Submit | None = None) -> None:
+        super().__init__()
+        self._fetch = fetch
+        self._columns = columns
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self._cache: OrderedDict[int, list[list[Any]]] = OrderedDict()
+        self._sizes: list[int] = []
+        self._last: list[Any] = []
+        self._starts: list[int] = []
+        self._exhausted = False
+        self._submit = submit
+        # загружаемые в фоне страницы (по ключу последней строки)
+        # и следующая страница (fetchMore)
+        self._requested: set[Any] = set()
+        self._fetching = False
+
+    def rowCount(self, index: Any = QtCore.QModelIndex()) -> int:
+        """ Количество уже загруженных (известных) строк """
+        return self._starts[-1] + self._sizes[-1] if self._sizes else 0
+
+    def columnCount(self, index: Any = QtCore.QModelIndex()) -> int:
+        """ Количество столбцов таблицы """
+        return self._columns
+
+    def data(self, index: QtCore.QModelIndex | QtCore.QPersistentModelIndex,
+             role: int = QtCore.Qt.ItemDataRole.DisplayRole) -> Any:
+        """ Значение ячейки; страница строки загружается при необходимости """
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            page = bisect_right(self._starts, index.row()) - 1
+            if self._submit is None or page in self._cache:
+                rows = self._page(page)
+            else:
+                rows = self._request(page, self._submit)
+            offset = index.row() - self._starts[page]
+            # строк может стать меньше, если их удалили в обход модели
+            return rows[offset][index.column()] if offset < len(rows) else None
+        return None
+
+    def canFetchMore(self, parent: Any = QtCore.QModelIndex()) -> bool:
+        """ Есть ли строки, которые еще не загружались """
+        return not self._exhausted and not self._fetching
+
+    def fetchMore(self, parent: Any = QtCore.QModelIndex()) -> None:
+        """ Загрузить следующую страницу строк """
+        after = self._last[-1] if self._last else None
+        if self._submit is None:
+            self._append(self._fetch(after, self.page_size))
+        elif not self._fetching:
+            self._fetching = True
+            self._submit(self._fetch, after, self.page_size, callback=self._fetched)
+
+    def _fetched(self, rows: list[list[Any]]) -> None:
+        self._fetching = False
+        self._append(rows)
+
+    def _append(self, rows: list[list[Any]]) -> None:
+        if len(rows) < self.page_size:
+            self._exhausted = True
+        if not rows:
+            return
+        first = self.rowCount()
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(rows) - 1)
+        self._starts.append(first)
+        self._sizes.append(len(rows))
+        self._last.append(rows[-1][-1])
+        self._put(len(self._sizes) - 1, rows)
+        self.endInsertRows()
+
+    def _page(self, page: int) -> list[list[Any]]:
+        rows = self._cache.get(page)
+        if rows is None:
+            after = self._last[page - 1] if page else None
+            rows = self._fetch_range(after, self._last[page], self._sizes[page])
+            self._put(page, rows)
+            if len(rows) != self._sizes[page]:
+                self._resize(page, len(rows))
+        else:
+            self._cache.move_to_end(page)
+        return rows
+
+    def _request(self, page: int, submit: Submit) -> list[list[Any]]:
+        # страница загружается в фоне, пока ее строки пусты
+        after = self._last[page - 1] if page else None
+        last = self._last[page]
+        if last in self._requested:
+            return []
+        self._requested.add(last)
+
+        def received(rows: list[list[Any]]) -> None:
+            self._requested.discard(last)
+            page = bisect_left(self._last, last)
+            # страницу могли удалить или загрузить сразу, пока она загружалась
+            if (page == len(self._last) or self._last[page] != last
+                    or (self._last[page - 1] if page else None) != after
+                    or page in self._cache):
+                return
+            self._put(page, rows)
+            if len(rows) != self._sizes[page]:
+                self._resize(page, len(rows))
+            elif rows:
+                first = self._starts[page]
+                self.dataChanged.emit(self.index(first, 0), self.index(
+                    first + len(rows) - 1, self._columns - 1))
+
+        submit(self._fetch_range, after, last, self._sizes[page], callback=received)
+        return []
+
+    def _fetch_range(self, after: Any, last: Any, size: int) -> list[list[Any]]:
+        # страница - строки с ключами в (after, last]: строки могли
+        # удалить или добавить в обход модели, поэтому их число
+        # может отличаться от прежнего
+        rows: list[list[Any]] = []
+        while True:
+            chunk = self._fetch(after, max(size, 1))
+            rows.extend(row for row in chunk if row[-1] <= last)
+            if len(chunk) < max(size, 1) or chunk[-1][-1] >= last:
+                return rows
+            after = chunk[-1][-1]
+
+    def _resize(self, page: int, size: int) -> None:
+        # пустая страница остается с нулевым размером: ее начало совпадает
+        # с началом следующей, и поиск строк (bisect_right) ее пропускает
+        start, old = self._starts[page], self._sizes[page]
+        if size < old:
+            self.beginRemoveRows(QtCore.QModelIndex(), start + size, start + old - 1)
+        else:
+            self.beginInsertRows(QtCore.QModelIndex(), start + old, start + size - 1)
+        self._sizes[page] = size
+        for following in range(page + 1, len(self._starts)):
+            self._starts[following] += size - old
+        if size < old:
+            self.endRemoveRows()
+        else:
+            self.endInsertRows()
+        if size:
+            self.dataChanged.emit(self.index(start, 0),
+                                  self.index(start + size - 1, self._columns - 1))
+
+    def _put(self, page: int, rows: list[list[Any]]) -> None:
+        self._cache[page] = rows
+        self._cache.move_to_end(page)
+        while len(self._cache) > self.max_pages:
+            self._cache.popitem(last=False)
+
+    def _locate(self, key: Any) -> tuple[int, int] | None:
+        page = bisect_left(self._last, key)
+        if page == len(self._last):
+            return None
+        rows = self._page(page)
+        offset = bisect_left(rows, key, key=lambda row: row[-1])
+        if offset == len(rows) or rows[offset][-1] != key:
+            return None
+        return page, offset
+
+    def find_row(self, key: Any) -> int | None:
+        """ Найти номер загруженной строки по ключу (pk) """
+        found = self._locate(key)
+        return None if found is None else self._starts[found[0]] + found[1]
+
+    def insert_row(self, row: list[Any]) -> int | None:
+        """
+        Добавить строку с ключом больше всех имеющихся. Если загружены
+        еще не все строки, строка появится при загрузке очередной страницы.
+
+        Returns
+        -------
+        Номер вставленной строки или None
+        """
+        if not self._exhausted:
+            return None
+        position = self.rowCount()
+        self.beginInsertRows(QtCore.QModelIndex(), position, position)
+        if self._sizes and self._sizes[-1] < self.page_size:
+            page = len(self._sizes) - 1
+            self._page(page).append(row)
+            self._sizes[page] += 1
+            self._last[page] = row[-1]
+        else:
+            self._starts.append(position)
+            self._sizes.append(1)
+            self._last.append(row[-1])
+            self._put(len(self._sizes) - 1, [row])
+        self.endInsertRows()
+        return position
+
+    def remove_row(self, position: int) -> list[Any]:
+        """ Удалить строку с номером position и вернуть ее """
+        page = bisect_right(self._starts, position) - 1
+        rows = self._page(page)
+        self.beginRemoveRows(QtCore.QModelIndex(), position, position)
+        row = rows.pop(position - self._starts[page])
+        self._sizes[page] -= 1
+        for following in range(page + 1, len(self._starts)):
+            self._starts[following] -= 1
+        if not rows:
+            # пустая страница сливается с предыдущей: ее ключ больше не нужен
+            del self._sizes[page], self._starts[page], self._last[page]
+            self._cache = OrderedDict((p - (p > page), r)
+                                      for p, r in self._cache.items() if p != page)
+        self.endRemoveRows()
+        return row
+
+    def update_row(self, position: int, row: list[Any]) -> None:
+        """ Заменить строку с номером position """
+        page = bisect_right(self._starts, position) - 1
+        self._page(page)[position - self._starts[page]] = row
+        self.dataChanged.emit(self.index(position, 0),
+                              self.index(position, self._columns - 1))
+
+
+class Dispatcher(QtCore.QObject):
+    """
+    Передает функции для вызова в поток, в котором создан объект
+    (главный поток приложения). Сигнал, испущенный из другого потока,
+    ставится в очередь событий главного потока.
+    """
+
+    called = QtCore.Signal(object)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.called.connect(self._call)
+
+    def dispatch(self, func: Callable[[], None]) -> None:
+        """ Вызвать func в главном потоке """
+        self.called.emit(func)
+
+    @staticmethod
+    def _call(func: Callable[[], None]) -> None:
+        func()
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -55,13 +383,13 @@ class MainWindow(QtWidgets.QMainWindow):
     Задать окна для: таблицы расходов,
                      кнопок добавления расхода в нужной категории
                      кнопок удаления расхода по идентификатору
-                     отображения бюджета (ПУСТОЕ)
+                     отображения бюджета на день / неделю / месяц
     """
 
     def __init__(self) -> None:
         super().__init__()
 
-        self.item_model = None
+        self.item_model: TableModel | PagedTableModel | None = None
         self.setWindowTitle("Программа для ведения бюджета")
         self.setFixedSize(500, 600)
 
@@ -73,8 +401,12 @@ class MainWindow(QtWidgets.QMainWindow):
         self.layout.addWidget(self.expenses_grid)
 
         self.layout.addWidget(QtWidgets.QLabel('Бюджет'))
-        self.layout.addWidget(QtWidgets.QLabel(
-            '<TODO: таблица бюджета>\n\n\n\n\n\n\n\n'))
+
+        self.dispatcher = Dispatcher()
+
+        self.budget_model: TableModel | None = None
+        self.budget_grid = QtWidgets.QTableView()
+        self.layout.addWidget(self.budget_grid)
 
         self.bottom_controls = QtWidgets.QGridLayout()
 
@@ -128,9 +460,75 @@ class MainWindow(QtWidgets.QMainWindow):
         if not isinstance(data, list):
             raise ValueError("can add only a list into TableModel")
 
-        self.item_model = TableModel(data)
+        self.item_model = TableModel(data, key_column=-1)
+        self.expenses_grid.setModel(self.item_model)
+
+    def set_expense_pages(self, fetch: Callable[[Any, int], list[list[Any]]],
+                          columns: int, page_size: int = 200,
+                          submit: Submit | None = None) -> None:
+        """
+        Отображать таблицу расходов, загружая строки страницами
+        по мере прокрутки (см. PagedTableModel)
+
+        Parameters
+        ----------
+        fetch - функция fetch(after_pk, limit), возвращающая строки расходов
+        с pk больше after_pk
+        columns - число столбцов
+        page_size - число строк в странице
+        submit - функция, загружающая страницы в фоновом потоке
+        (см. PagedTableModel)
+        """
+        self.item_model = PagedTableModel(fetch, columns, page_size, submit=submit)
         self.expenses_grid.setModel(self.item_model)
 
+    def insert_expense_row(self, row: list[Any]) -> None:
+        """
+        Добавить в таблицу расходов одну строку (последний элемент - pk),
+        не перестраивая остальные
+        """
+        if self.item_model is None:
+            self.set_expense_table([row])
+        else:
+            self.item_model.insert_row(row)
+
+    def update_expense_row(self, row: list[Any]) -> None:
+        """ Заменить строку таблицы расходов с тем же pk, что у row """
+        model = self.item_model
+        position = None if model is None else model.find_row(row[-1])
+        if model is None or position is None:
+            self.insert_expense_row(row)
+        else:
+            model.update_row(position, row)
+
+    def remove_expense_row(self, pk: int) -> None:
+        """ Удалить из таблицы расходов строку с данным pk, если она есть """
+        model = self.item_model
+        position = None if model is None else model.find_row(pk)
+        if model is not None and position is not None:
+            model.remove_row(position)
+
+    def set_budget_table(self, data: list[list[Any]]) -> None:
+        """
+        Отобразить таблицу бюджета
+
+        Parameters
+        ----------
+        data - список строк [период, потрачено, бюджет]
+        """
+        if not isinstance(data, list):
+            raise ValueError("can add only a list into TableModel")
+
+        self.budget_model = TableModel(data)
+        self.budget_grid.setModel(self.budget_model)
+
+    def dispatch(self, func: Callable[[], None]) -> None:
+        """
+        Вызвать func в главном потоке приложения. Используется
+        для передачи результатов фоновых запросов (см. AsyncRepository)
+        """
+        self.dispatcher.dispatch(func)
+
     def set_category_dropdown(self, data: list[tuple[Any]]) -> None:
         """
         Отобразить выпадающий список доступных категорий.
@@ -139,9 +537,16 @@ class MainWindow(QtWidgets.QMainWindow):
         ----------
         data - список кортежей, содержащих значения атрибутов экземпляров
         класса Category из БД
+        Список заменяется целиком; выбранная категория остается
+        выбранной, если она есть в новом списке.
         """
+        selected = self.category_dropdown.currentData()
+        self.category_dropdown.clear()
         for tup in data:
-            self.category_dropdown.addItems([str(tup[-1]) + ' ' + tup[0]])
+            self.category_dropdown.addItem(str(tup[-1]) + ' ' + tup[0], tup[-1])
+        index = self.category_dropdown.findData(selected)
+        if selected is not None and index >= 0:
+            self.category_dropdown.setCurrentIndex(index)
 
     def on_expense_add_button_clicked(self, slot: Any) -> None:
         """
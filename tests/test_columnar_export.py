@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from bookkeeper.columnar_export import (  # noqa: E402
+    StringColumn, export_columns, load_columns)
+from bookkeeper.models.category import Category  # noqa: E402
+from bookkeeper.models.expense import Expense  # noqa: E402
+from bookkeeper.repository.sqlite_repository import SQLiteRepository  # noqa: E402
+
+
+def test_export_columns(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'export.db'), Expense)
+    repo.add_many([Expense(100.5, 1, datetime(2023, 1, 2, 10, 0, 0, 5), comment='обед'),
+                   Expense(20, 2, datetime(2023, 1, 3)),
+                   Expense(7, 1, datetime(2023, 1, 4), comment='книги')])
+    path = str(tmp_path / 'expenses')
+    assert export_columns(repo, path, batch_size=2) == 3
+    columns = load_columns(path)
+    assert list(columns) == ['amount', 'category', 'expense_date', 'added_date',
+                             'comment', 'pk']
+    assert isinstance(columns['amount'], np.memmap)
+    assert columns['amount'].sum() == 127.5
+    assert list(columns['category']) == [1, 2, 1]
+    assert columns['expense_date'][0] == np.datetime64('2023-01-02T10:00:00.000005')
+    assert list(columns['comment']) == ['обед', '', 'книги']
+    assert columns['comment'][-1] == 'книги'
+    assert export_columns(repo, path, where={'category': 3}) == 0
+    assert len(load_columns(path)['comment']) == 0
+
+
+def test_export_nullable_columns(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'export.db'), Category)
+    root = Category('еда')
+    repo.add(root)
+    repo.add(Category('мясо', root.pk))
+    path = str(tmp_path / 'categories')
+    export_columns(repo, path)
+    columns = load_columns(path)
+    assert columns['parent'].tolist() == [None, root.pk]
+    assert isinstance(columns['name'], StringColumn)
+    assert list(columns['name']) == ['еда', 'мясо']
+    with pytest.raises(IndexError):
+        columns['name'][2]
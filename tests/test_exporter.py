@@ -0,0 +1,60 @@
+from bookkeeper.exporter import export_csv, export_jsonl, write_csv, write_jsonl
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+import csv
+import io
+import json
+from datetime import date, datetime
+
+import pytest
+
+
+@pytest.fixture
+def exp_repo(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'export.db'), Expense)
+    repo.add_many([Expense(100.5, 1, datetime(2023, 1, 2, 10), datetime(2023, 1, 2),
+                           'обед, "кафе"'),
+                   Expense(20, 2, datetime(2023, 1, 3), datetime(2023, 1, 3))])
+    return repo
+
+
+def test_export_csv(exp_repo, tmp_path):
+    path = str(tmp_path / 'expenses.csv')
+    assert export_csv(exp_repo, path, batch_size=1) == 2
+    with open(path, encoding='utf-8', newline='') as file:
+        rows = list(csv.reader(file))
+    assert rows == [['amount', 'category', 'expense_date', 'added_date', 'comment', 'pk'],
+                    ['100.5', '1', '2023-01-02 10:00:00', '2023-01-02 00:00:00',
+                     'обед, "кафе"', '1'],
+                    ['20.0', '2', '2023-01-03 00:00:00', '2023-01-03 00:00:00', '', '2']]
+    assert export_csv(exp_repo, path, where={'category': 2}) == 1
+
+
+def test_export_jsonl(exp_repo, tmp_path):
+    path = str(tmp_path / 'expenses.jsonl')
+    assert export_jsonl(CachedRepository(exp_repo), path) == 2
+    with open(path, encoding='utf-8') as file:
+        first = json.loads(file.readline())
+    assert first == {'amount': 100.5, 'category': 1,
+                     'expense_date': '2023-01-02 10:00:00',
+                     'added_date': '2023-01-02 00:00:00', 'comment': 'обед, "кафе"',
+                     'pk': 1}
+
+
+def test_export_requires_sqlite(tmp_path):
+    with pytest.raises(ValueError):
+        export_csv(MemoryRepository[Category](), str(tmp_path / 'x.csv'))
+
+
+def test_write_aggregates(exp_repo):
+    totals = exp_repo.get_totals('amount', 'expense_date', 'day')
+    file = io.StringIO()
+    assert write_jsonl(file, ('day', 'total'), totals.items()) == 2
+    assert file.getvalue().splitlines()[0] == '{"day": "2023-01-02", "total": 100.5}'
+    file = io.StringIO(newline='')
+    write_csv(file, ('day', 'total'), [(date(2023, 1, 2), None)])
+    assert file.getvalue() == 'day,total\r\n2023-01-02,\r\n'
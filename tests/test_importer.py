@@ -0,0 +1,152 @@
+from bookkeeper.importer import (
+    ExpenseImporter, ImportProgress, import_file, read_csv, read_ofx)
+from bookkeeper.models.budget import RunningTotals
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import ConnectionPool, SQLiteRepository
+
+from datetime import date, datetime
+from textwrap import dedent
+
+import pytest
+
+CSV = dedent('''\
+    Сумма;category;date;comment
+    100,50;еда;2023-01-02;обед
+    20;транспорт;03.01.2023 10:15;
+    -5;еда;2023-01-02;
+    7;книги;;
+    1 000;еда;2023-01-05 12:00:00;ужин
+''')
+
+OFX = dedent('''\
+    OFXHEADER:100
+    <OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+    <STMTTRN>
+    <TRNTYPE>DEBIT
+    <DTPOSTED>20230102120000.000[+3:MSK]
+    <TRNAMT>-150.00
+    <NAME>еда
+    <MEMO>магазин
+    </STMTTRN>
+    <STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20230103<TRNAMT>1000.00<NAME>зарплата</STMTTRN>
+    </BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+''')
+
+
+@pytest.fixture
+def cat_repo():
+    repo = MemoryRepository()
+    repo.add_many([Category('еда'), Category('транспорт')])
+    return repo
+
+
+def test_read_csv():
+    records = list(read_csv(CSV.splitlines(), {'Сумма': 'amount'}, delimiter=';'))
+    assert records[0] == (2, {'amount': '100,50', 'category': 'еда',
+                              'date': '2023-01-02', 'comment': 'обед'})
+    assert len(records) == 5
+
+
+def test_read_ofx():
+    assert list(read_ofx(OFX.splitlines())) == [
+        (3, {'amount': '150.00', 'category': 'еда', 'date': '2023-01-02 12:00:00',
+             'comment': 'магазин'}),
+        (10, {'amount': '-1000.00', 'category': 'зарплата', 'date': '2023-01-03',
+              'comment': 'зарплата'})]
+
+
+def test_import_validates_rows(cat_repo):
+    exp_repo = MemoryRepository()
+    importer = ExpenseImporter(exp_repo, cat_repo, batch_size=2)
+    reports = []
+    state = importer.run(read_csv(CSV.splitlines(), {'Сумма': 'amount'}, ';'),
+                         'test.csv', lambda p: reports.append(p.position))
+    assert (state.position, state.added, state.rejected) == (5, 3, 2)
+    assert reports == [2, 4, 5]
+    assert [line for line, _ in importer.errors] == [4, 5]
+    assert 'книги' in importer.errors[1][1]
+    exps = exp_repo.get_all()
+    assert [(e.amount, e.category) for e in exps] == [(100.5, 1), (20, 2), (1000, 1)]
+    assert exps[1].expense_date == datetime(2023, 1, 3, 10, 15)
+    assert exps[2].comment == 'ужин'
+
+
+def test_default_and_ambiguous_categories(cat_repo):
+    cat_repo.add(Category('еда', parent=2))
+    importer = ExpenseImporter(MemoryRepository(), cat_repo, default_category='транспорт')
+    assert importer.parse({'amount': '1', 'category': 'кино'}).category == 2
+    with pytest.raises(ValueError):
+        importer.parse({'amount': '1', 'category': 'еда'})
+    with pytest.raises(ValueError):
+        importer.parse({'amount': 'nan', 'category': 'транспорт'})
+
+
+class Failing(MemoryRepository):
+    """ Репозиторий, в котором запись порции падает один раз """
+
+    def __init__(self, fail_at):
+        super().__init__()
+        self.fail_at = fail_at
+
+    def add_many(self, objs):
+        objs = list(objs)
+        if len(self.get_all()) + len(objs) > self.fail_at:
+            self.fail_at = float('inf')
+            raise OSError('disk full')
+        return super().add_many(objs)
+
+
+def test_resume_after_failure(cat_repo):
+    exp_repo = Failing(fail_at=3)
+    importer = ExpenseImporter(exp_repo, cat_repo, MemoryRepository(), batch_size=2)
+    records = [(i, {'amount': str(i), 'category': 'еда'}) for i in range(1, 8)]
+    with pytest.raises(OSError):
+        importer.run(records, 'src')
+    assert importer.load_progress('src').position == 2
+    state = importer.run(records, 'src')
+    assert (state.position, state.added) == (7, 7)
+    assert [e.amount for e in exp_repo.get_all()] == list(range(1, 8))
+    assert importer.run(records, 'src').added == 7
+    assert len(exp_repo.get_all()) == 7
+    importer.reset('src')
+    assert importer.load_progress('src') == ImportProgress('src')
+
+
+def test_import_file_sqlite(tmp_path):
+    db_file = str(tmp_path / 'import.db')
+    pool = ConnectionPool(db_file)
+    cat_repo = SQLiteRepository(db_file, Category, pool=pool)
+    cat_repo.add(Category('еда'))
+    exp_repo = SQLiteRepository(db_file, Expense, pool=pool)
+    progress_repo = SQLiteRepository(db_file, ImportProgress, pool=pool)
+    path = tmp_path / 'statement.ofx'
+    path.write_text(OFX, encoding='utf-8')
+    importer = ExpenseImporter(exp_repo, cat_repo, progress_repo, defer_indexes=True)
+    state = import_file(str(path), importer)
+    assert (state.added, state.rejected) == (1, 1)
+    assert exp_repo.index_report([{'category': 1}])["{'category': 1}"]
+    assert progress_repo.get_all() == [state]
+    assert exp_repo.get_all()[0].expense_date == datetime(2023, 1, 2, 12)
+
+
+def test_import_updates_totals_once_per_batch(cat_repo):
+    exp_repo = Failing(fail_at=3)
+    store = MemoryRepository()
+    totals = RunningTotals(exp_repo, store)
+    calls = []
+    store.accumulate = lambda *args: calls.append(args) or MemoryRepository.accumulate(
+        store, *args)
+    importer = ExpenseImporter(exp_repo, cat_repo, batch_size=2, totals=totals)
+    records = [(i, {'amount': str(i), 'category': 'еда', 'date': '2023-01-02'})
+               for i in range(1, 6)]
+    with pytest.raises(OSError):
+        importer.run(records, 'src')
+    assert totals.get_total('day', date(2023, 1, 2)) == 3
+    importer.run(records[2:], 'src')
+    assert totals.get_total('month', date(2023, 1, 2)) == 15
+    assert not totals.check()
+    # по одному изменению суммы на период в каждой порции
+    assert len(calls) == 3 * 3
+    assert exp_repo.hooks == (totals,)
@@ -0,0 +1,175 @@
+"""
+Тесты для бюджета и сумм расходов по периодам
+"""
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.models.budget import (
+    Budget, PeriodTotal, RunningTotals, StoredTotals, get_rollups, rollup)
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import ConnectionPool, SQLiteRepository
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def repo(request, tmp_path):
+    if request.param == 'memory':
+        repo = MemoryRepository()
+    else:
+        repo = SQLiteRepository(str(tmp_path / 'budget.db'), Expense)
+    repo.add_many([
+        Expense(10, 1, datetime(2023, 1, 30, 10)),   # понедельник
+        Expense(20, 1, datetime(2023, 1, 31, 12)),
+        Expense(30, 2, datetime(2023, 2, 1, 23, 59)),
+        Expense(40, 2, datetime(2023, 2, 6)),        # следующая неделя
+    ])
+    return repo
+
+
+def test_create_object():
+    b = Budget('day', 1000)
+    assert b.period == 'day'
+    assert b.amount == 1000
+    assert b.pk == 0
+
+
+def test_get_spent(repo):
+    assert Budget('day', 100).get_spent(repo, date(2023, 1, 31)) == 20
+    assert Budget('week', 100).get_spent(repo, date(2023, 2, 1)) == 60
+    assert Budget('month', 100).get_spent(repo, date(2023, 2, 28)) == 70
+    assert Budget('month', 100).get_spent(repo, date(2023, 3, 1)) == 0
+
+
+def test_is_exceeded(repo):
+    assert Budget('week', 50).is_exceeded(repo, date(2023, 2, 1))
+    assert not Budget('week', 60).is_exceeded(repo, date(2023, 2, 1))
+
+
+def test_rollup():
+    days = {date(2023, 1, 30): 1, date(2023, 2, 5): 2, date(2023, 2, 6): 4}
+    assert rollup(days, 'week') == {date(2023, 1, 30): 3, date(2023, 2, 6): 4}
+    assert rollup(days, 'month') == {date(2023, 1, 1): 1, date(2023, 2, 1): 6}
+
+
+def test_get_rollups(repo):
+    rollups = get_rollups(repo)
+    assert rollups['day'] == {date(2023, 1, 30): 10, date(2023, 1, 31): 20,
+                              date(2023, 2, 1): 30, date(2023, 2, 6): 40}
+    assert rollups['week'] == {date(2023, 1, 30): 60, date(2023, 2, 6): 40}
+    assert rollups['month'] == {date(2023, 1, 1): 30, date(2023, 2, 1): 70}
+    assert get_rollups(repo, {'category': 2})['month'] == {date(2023, 2, 1): 70}
+
+
+def test_unknown_period(repo):
+    with pytest.raises(ValueError):
+        Budget('year', 100).get_spent(repo)
+
+
+@pytest.fixture
+def totals_store(repo, tmp_path):
+    if isinstance(repo, MemoryRepository):
+        return MemoryRepository()
+    return SQLiteRepository(str(tmp_path / 'budget.db'), PeriodTotal)
+
+
+def test_running_totals_initial_rebuild(repo, totals_store):
+    totals = RunningTotals(repo, totals_store)
+    assert totals.get_total('month', date(2023, 2, 10)) == 70
+    assert totals.get_total('week', date(2023, 2, 1), 1) == 30
+    assert totals.get_total('day', date(2023, 2, 1), 1) == 0
+    assert len(totals_store.get_all()) == len(totals.compute())
+
+
+def test_running_totals_updates(repo, totals_store):
+    totals = RunningTotals(repo, totals_store)
+    repo.add(Expense(5, 1, datetime(2023, 2, 2)))
+    assert totals.get_total('week', date(2023, 2, 1)) == 65
+    exp = repo.get_all({'amount': 10})[0]
+    repo.update(Expense(15, 2, datetime(2023, 2, 3), pk=exp.pk))
+    assert totals.get_total('month', date(2023, 1, 1)) == 20
+    assert totals.get_total('month', date(2023, 2, 1), 2) == 85
+    repo.delete(exp.pk)
+    assert totals.get_total('month', date(2023, 2, 1)) == 75
+    assert totals.check() == {}
+
+
+def test_running_totals_persisted(repo, totals_store):
+    RunningTotals(repo, totals_store)
+    repo.add(Expense(5, 1, datetime(2023, 2, 2)))
+    # новый объект загружает сохраненные суммы без пересчета
+    totals = RunningTotals(repo, totals_store)
+    assert totals.get_total('month', date(2023, 2, 1)) == 75
+
+
+def test_running_totals_check_and_rebuild(repo, totals_store):
+    totals = RunningTotals(repo, totals_store)
+    repo.remove_hook(totals)
+    repo.add(Expense(5, 1, datetime(2023, 2, 2)))
+    key = ('month', '2023-02-01', 1)
+    assert totals.check()[key] == (0, 5)
+    assert totals.rebuild()[key] == (0, 5)
+    assert totals.check() == {}
+    assert RunningTotals(repo, totals_store).get_total('month', date(2023, 2, 1)) == 75
+
+
+def test_running_totals_rebuild_atomic(repo, totals_store, monkeypatch):
+    totals = RunningTotals(repo, totals_store)
+    stored = totals_store.get_all()
+
+    def fail(objs):
+        raise RuntimeError
+
+    monkeypatch.setattr(totals_store, 'add_many', fail)
+    with pytest.raises(RuntimeError):
+        totals.rebuild()
+    assert totals_store.get_all() == stored
+    assert totals.get_total('month', date(2023, 2, 10)) == 70
+
+
+def test_stored_totals(repo, totals_store):
+    totals = RunningTotals(repo, totals_store)
+    repo.remove_hook(totals)
+    # суммы ведет другой объект (как другой процесс), изменения хранилища
+    # передаются обработчику так же, как их передал бы ChangeFeed
+    stored = StoredTotals(totals)
+    totals_store.add_hook(stored)
+    RunningTotals(repo, totals_store)
+    repo.add(Expense(5, 1, datetime(2023, 2, 2)))
+    repo.add(Expense(1, 3, datetime(2023, 3, 1)))
+    assert totals.get_total('month', date(2023, 2, 1)) == 75
+    assert totals.get_total('month', date(2023, 3, 1), 3) == 1
+    record = totals_store.get_all({'category': 3, 'period': 'day'})[0]
+    totals_store.delete(record.pk)
+    assert totals.get_total('day', date(2023, 3, 1)) == 0
+    stored.rolled_back()
+    assert totals.check() == {('day', '2023-03-01', 3): (0, 1)}
+
+
+def test_running_totals_two_writers(tmp_path):
+    # два процесса с одним файлом БД: у каждого свой пул соединений
+    db_file = str(tmp_path / 'shared.db')
+    writers = []
+    for _ in range(2):
+        pool = ConnectionPool(db_file)
+        exp_repo = SQLiteRepository(db_file, Expense, pool=pool)
+        writers.append((exp_repo, RunningTotals(
+            exp_repo, SQLiteRepository(db_file, PeriodTotal, pool=pool))))
+    writers[0][0].add(Expense(100, 1, datetime(2023, 2, 2)))
+    writers[1][0].add(Expense(50, 1, datetime(2023, 2, 2)))
+    assert writers[1][1].get_total('day', date(2023, 2, 2)) == 150
+    for _, totals in writers:
+        assert totals.check() == {}
+    assert writers[0][1].get_total('month', date(2023, 2, 2)) == 150
+    assert len(writers[0][1].store.get_all()) == 3
+
+
+def test_running_totals_merge_duplicates(repo, totals_store):
+    # прежние версии могли сохранить одну сумму несколькими записями
+    totals_store.add_many([PeriodTotal('month', '2023-02-01', 2, 30),
+                           PeriodTotal('month', '2023-02-01', 2, 40)])
+    totals = RunningTotals(repo, totals_store)
+    assert totals.check() == {}
+    assert len(totals_store.get_all({'period': 'month', 'category': 2})) == 1
+    repo.add(Expense(5, 2, datetime(2023, 2, 2)))
+    assert totals.get_total('month', date(2023, 2, 1), 2) == 75
@@ -5,8 +5,10 @@ from inspect import isgenerator
 
 import pytest
 
-from bookkeeper.models.category import Category
+from bookkeeper.models.category import Category, CategoryTree
+from bookkeeper.models.expense import Expense
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
 
 
 @pytest.fixture
@@ -106,3 +108,103 @@ def test_create_from_tree_error(repo):
     tree = [('1', 'parent'), ('parent', None)]
     with pytest.raises(KeyError):
         Category.create_from_tree(tree, repo)
+
+
+def test_create_from_tree_levels(repo):
+    tree = [('a', None), ('b', 'a'), ('c', 'b'), ('d', 'a'), ('e', None)]
+    cats = {c.name: c for c in Category.create_from_tree(tree, repo)}
+    assert cats['a'].parent is None and cats['e'].parent is None
+    assert cats['b'].parent == cats['a'].pk
+    assert cats['c'].parent == cats['b'].pk
+    assert cats['d'].parent == cats['a'].pk
+    assert len(repo.get_all()) == 5
+
+
+def paths_of(repo):
+    cats = {c.pk: c for c in repo.get_all()}
+
+    def path(cat):
+        return (*path(cats[cat.parent]), cat.name) if cat.parent else (cat.name,)
+
+    return sorted(path(cat) for cat in cats.values())
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 100])
+def test_create_from_paths(repo, batch_size):
+    paths = [('еда',), ('еда', 'прочее'), ('одежда',), ('одежда', 'прочее'),
+             ('одежда', 'прочее', 'носки'), ('одежда', 'обувь'), ('прочее',)]
+    count = Category.create_from_paths(iter(paths), repo, batch_size=batch_size)
+    assert count == len(paths)
+    assert paths_of(repo) == sorted(paths)
+
+
+def test_create_from_paths_error(repo):
+    repo.add(Category('старая'))
+    with pytest.raises(ValueError):
+        Category.create_from_paths([('a',), ('a', 'b'), ('c', 'b')], repo, batch_size=1)
+    assert [c.name for c in repo.get_all()] == ['старая']
+
+
+def test_create_from_paths_sqlite(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'paths.db'), Category)
+    paths = [('a',), ('a', 'b'), ('c',), ('c', 'b'), ('c', 'b', 'd')]
+    assert Category.create_from_paths(paths, repo, batch_size=2) == 5
+    assert paths_of(repo) == sorted(paths)
+    with pytest.raises(ValueError):
+        Category.create_from_paths([('e',), ('f', 'g')], repo)
+    assert len(repo.get_all()) == 5
+
+
+@pytest.fixture
+def tree_repo(repo):
+    Category.create_from_tree(
+        [('0', None), ('1', '0'), ('2', '0'), ('3', '2'), ('4', '2'), ('5', None)], repo)
+    return repo
+
+
+def pk_of(repo, name):
+    return repo.get_all({'name': name})[0].pk
+
+
+def test_tree_ancestors_and_descendants(tree_repo):
+    tree = CategoryTree(tree_repo)
+    pk3 = pk_of(tree_repo, '3')
+    assert [c.name for c in tree.get_ancestors(pk3)] == ['2', '0']
+    assert [c.name for c in tree.get_descendants(pk_of(tree_repo, '0'))] == [
+        '1', '2', '3', '4']
+    assert tree.get_descendants(pk3) == []
+    assert tree.get(pk3).name == '3'
+
+
+def test_tree_is_under(tree_repo):
+    tree = CategoryTree(tree_repo)
+    assert tree.is_under(pk_of(tree_repo, '4'), pk_of(tree_repo, '0'))
+    assert not tree.is_under(pk_of(tree_repo, '4'), pk_of(tree_repo, '1'))
+    assert not tree.is_under(pk_of(tree_repo, '0'), pk_of(tree_repo, '0'))
+    assert not tree.is_under(pk_of(tree_repo, '0'), pk_of(tree_repo, '5'))
+
+
+def test_tree_invalidation(tree_repo):
+    tree = CategoryTree(tree_repo)
+    pk5 = pk_of(tree_repo, '5')
+    assert tree.get_descendants(pk5) == []
+    pk6 = tree_repo.add(Category('6', pk5))
+    assert [c.pk for c in tree.get_descendants(pk5)] == [pk6]
+    tree_repo.update(Category('6', pk_of(tree_repo, '1'), pk6))
+    assert tree.is_under(pk6, pk_of(tree_repo, '0'))
+    tree_repo.delete(pk6)
+    assert tree.get(pk6) is None
+
+
+def test_tree_roll_up(tree_repo):
+    tree = CategoryTree(tree_repo)
+    exp_repo = MemoryRepository()
+    exp_repo.add_many([Expense(10, pk_of(tree_repo, '3')),
+                       Expense(20, pk_of(tree_repo, '4')),
+                       Expense(5, pk_of(tree_repo, '0')),
+                       Expense(1, pk_of(tree_repo, '5'))])
+    totals = tree.get_subtree_totals(exp_repo)
+    assert totals[pk_of(tree_repo, '0')] == 35
+    assert totals[pk_of(tree_repo, '2')] == 30
+    assert totals[pk_of(tree_repo, '1')] == 0
+    assert totals[pk_of(tree_repo, '5')] == 1
@@ -1 +1,150 @@
 from bookkeeper.presenter.expense_presenter import ExpensePresenter
+from bookkeeper.models.budget import Budget, RunningTotals
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.async_repository import AsyncRepository
+from bookkeeper.repository.change_feed import ChangeFeed
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import ConnectionPool, SQLiteRepository
+
+import pytest
+
+
+class FakeView:
+    def __init__(self):
+        self.expense_table = None
+        self.budget_table = None
+
+    def show(self): pass
+    def on_expense_add_button_clicked(self, slot): pass
+    def on_expense_delete_button_clicked(self, slot): pass
+    def set_expense_table(self, data): self.expense_table = data
+    def set_budget_table(self, data): self.budget_table = data
+
+    def set_expense_pages(self, fetch, columns, page_size, submit=None):
+        self.expense_table = fetch(None, page_size)
+
+    def insert_expense_row(self, row): self.expense_table.append(row)
+
+    def update_expense_row(self, row):
+        pks = [r[-1] for r in self.expense_table]
+        if row[-1] in pks:
+            self.expense_table[pks.index(row[-1])] = row
+        else:
+            self.insert_expense_row(row)
+
+    def set_category_dropdown(self, data): self.categories = data
+
+    def remove_expense_row(self, pk):
+        self.expense_table = [row for row in self.expense_table if row[-1] != pk]
+
+    def get_selected_cat(self): return 1
+    def get_amount(self): return 50.
+    def get_selected_exp(self): return 1
+
+
+@pytest.fixture
+def presenter():
+    cat_repo = MemoryRepository()
+    cat_repo.add(Category('продукты'))
+    exp_repo = MemoryRepository()
+    exp_repo.add(Expense(100, 1))
+    budget_repo = MemoryRepository()
+    budget_repo.add(Budget('day', 1000))
+    return ExpensePresenter(None, FakeView(), cat_repo, exp_repo, budget_repo)
+
+
+def test_update_expense_data(presenter):
+    presenter.update_expense_data()
+    assert len(presenter.view.expense_table) == 1
+    assert presenter.view.expense_table[0][:2] == [100, 'продукты']
+
+
+def test_update_budget_data(presenter):
+    presenter.update_budget_data()
+    assert presenter.view.budget_table == [
+        ['День', 100, 1000], ['Неделя', 100, ''], ['Месяц', 100, '']]
+
+
+def test_update_budget_data_from_totals(presenter):
+    presenter.totals = RunningTotals(presenter.exp_repo, MemoryRepository())
+    presenter.exp_repo.add(Expense(50, 1))
+    presenter.update_budget_data()
+    assert [row[1] for row in presenter.view.budget_table] == [150, 150, 150]
+
+
+def test_update_with_loader(presenter):
+    presenter.loader = AsyncRepository(presenter.exp_repo)
+    presenter.update_expense_data()
+    presenter.update_budget_data()
+    presenter.loader.executor.shutdown(wait=True)
+    assert presenter.view.expense_table[0][:2] == [100, 'продукты']
+    assert presenter.view.budget_table[0] == ['День', 100, 1000]
+
+
+def test_add_and_delete_push_deltas(presenter):
+    presenter.update_expense_data()
+    table = presenter.view.expense_table
+    presenter.handle_expense_add_button_clicked()
+    assert presenter.view.expense_table is table
+    assert [row[0] for row in table] == [100, 50]
+    presenter.handle_expense_delete_button_clicked()
+    assert [row[0] for row in presenter.view.expense_table] == [50]
+    assert presenter.view.budget_table[0][1] == 50
+
+
+def test_add_and_delete_with_loader(presenter):
+    queue = []
+    loader = AsyncRepository(presenter.exp_repo, dispatch=queue.append)
+    presenter = ExpensePresenter(None, FakeView(), presenter.cat_repo,
+                                 presenter.exp_repo, presenter.budget_repo,
+                                 loader=loader)
+    presenter.update_expense_data()
+    presenter.handle_expense_add_button_clicked()
+    presenter.handle_expense_delete_button_clicked()
+    # фоновый поток выполняет запросы по порядку
+    loader.executor.submit(lambda: None).result()
+    # запись выполнена в фоновом потоке, представление еще не обновлено
+    assert presenter.exp_repo.get(1) is None
+    assert presenter.view.expense_table is None
+    while queue:
+        queue.pop(0)()
+        loader.executor.submit(lambda: None).result()
+    loader.close()
+    assert [row[0] for row in presenter.view.expense_table] == [50]
+    assert presenter.view.budget_table[0][1] == 50
+
+
+def test_paged_expense_table(presenter):
+    presenter.exp_repo.add_many([Expense(i, 1) for i in range(5)])
+    presenter.page_size = 2
+    presenter.update_expense_data()
+    assert [row[-1] for row in presenter.view.expense_table] == [1, 2]
+    assert [row[-1] for row in presenter.fetch_expense_page(2, 10)] == [3, 4, 5, 6]
+
+
+def test_external_changes(tmp_path):
+    db_file = str(tmp_path / 'presenter.db')
+    pool = ConnectionPool(db_file)
+    cat_repo = SQLiteRepository(db_file, Category, pool=pool)
+    cat_repo.add(Category('продукты'))
+    exp_repo = SQLiteRepository(db_file, Expense, pool=pool)
+    exp_repo.add(Expense(100, 1))
+    presenter = ExpensePresenter(None, FakeView(), cat_repo, exp_repo)
+    presenter.watch(ChangeFeed(pool))
+    presenter.show()
+    # запись другим процессом: отдельный пул соединений
+    other_pool = ConnectionPool(db_file)
+    other_cats = SQLiteRepository(db_file, Category, pool=other_pool)
+    other_exps = SQLiteRepository(db_file, Expense, pool=other_pool)
+    table = presenter.view.expense_table
+    other_exps.add(Expense(50, 1))
+    other_exps.update(Expense(70, 1, pk=1))
+    presenter.poll_changes()
+    assert presenter.view.expense_table is table
+    assert [row[0] for row in table] == [70, 50]
+    assert presenter.view.budget_table[0][1] == 120
+    other_cats.update(Category('еда', pk=1))
+    presenter.poll_changes()
+    assert presenter.view.categories == [('еда', None, 1)]
+    assert [row[1] for row in presenter.view.expense_table] == ['еда', 'еда']
@@ -0,0 +1,44 @@
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.presenter.view_model import ExpenseRows
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+import pytest
+
+
+@pytest.fixture
+def cat_repo():
+    repo = MemoryRepository()
+    repo.add(Category('Еда'))
+    return repo
+
+
+def test_make_rows(cat_repo):
+    rows = ExpenseRows(cat_repo)
+    exp = Expense(10, 1, comment='обед', pk=3)
+    assert rows.make_row(exp) == [10, 'Еда', exp.expense_date, exp.added_date,
+                                  'обед', 3]
+    assert rows.make_rows([exp, Expense(5, 7, pk=4)])[1][1] == 7
+
+
+def test_categories_follow_repository(cat_repo):
+    rows = ExpenseRows(cat_repo)
+    assert list(rows.categories) == [1]
+    cat_repo.add(Category('Транспорт'))
+    cat_repo.update(Category('Продукты', pk=1))
+    cat_repo.delete(2)
+    cat_repo.add(Category('Книги'))
+    names = {pk: cat.name for pk, cat in rows.categories.items()}
+    assert names == {1: 'Продукты', 3: 'Книги'}
+    rows.rolled_back()
+    assert rows._categories is None
+    assert rows.make_row(Expense(1, 3))[1] == 'Книги'
+
+
+def test_load(cat_repo):
+    exp_repo = MemoryRepository()
+    exps = [Expense(i, 1) for i in range(3)]
+    exp_repo.add_many(exps)
+    rows = ExpenseRows(cat_repo)
+    assert rows.load(exp_repo) == rows.make_rows(exps)
+    assert rows.load(exp_repo, exps[0].pk, 1) == rows.make_rows(exps[1:2])
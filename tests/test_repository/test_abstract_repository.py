@@ -1,4 +1,6 @@
-from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.abstract_repository import AbstractRepository, unwrap
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
 
 import pytest
 
@@ -18,3 +20,49 @@ def test_can_create_subclass():
 
     t = Test()
     assert isinstance(t, AbstractRepository)
+
+
+def test_default_add_many():
+    class Test(AbstractRepository):
+        def __init__(self): self.added = []
+
+        def add(self, obj):
+            self.added.append(obj)
+            return len(self.added)
+
+        def get(self, pk): pass
+        def get_all(self, where=None): pass
+        def update(self, obj): pass
+        def delete(self, pk): pass
+
+    t = Test()
+    assert t.add_many(iter('abc')) == [1, 2, 3]
+    assert t.added == ['a', 'b', 'c']
+
+
+def test_default_get_page():
+    class Obj:
+        def __init__(self, pk, value):
+            self.pk = pk
+            self.value = value
+
+    class Test(AbstractRepository):
+        def add(self, obj): pass
+        def get(self, pk): pass
+
+        def get_all(self, where=None):
+            return [Obj(1, 'b'), Obj(2, 'a'), Obj(3, 'b')]
+
+        def update(self, obj): pass
+        def delete(self, pk): pass
+
+    t = Test()
+    assert [o.pk for o in t.get_page('value', limit=2)] == [2, 1]
+    assert [o.pk for o in t.get_page('value', ('b', 1))] == [3]
+    assert [o.pk for o in t.get_page('-value', ('b', 1))] == [2]
+
+
+def test_unwrap():
+    repo = MemoryRepository()
+    assert unwrap(repo) is repo
+    assert unwrap(CachedRepository(CachedRepository(repo))) is repo
@@ -0,0 +1,86 @@
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.async_repository import AsyncRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def repo():
+    repo = MemoryRepository()
+    repo.add_many([Expense(10, 1), Expense(20, 2)])
+    return repo
+
+
+@pytest.fixture
+def loader(repo):
+    loader = AsyncRepository(repo)
+    yield loader
+    loader.close()
+
+
+def test_call(loader):
+    results = []
+    future = loader.call('get_all', {'category': 2}, callback=results.append)
+    assert [e.amount for e in future.result()] == [20]
+    loader.close()
+    assert results == [future.result()]
+
+
+def test_errback(loader):
+    errors = []
+    future = loader.call('delete', 100, errback=errors.append)
+    with pytest.raises(KeyError):
+        future.result()
+    loader.close()
+    assert isinstance(errors[0], KeyError)
+
+
+def test_stale_requests_are_coalesced(loader):
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait()
+        return 'first'
+
+    results = []
+    first = loader.submit(blocking, key='table', callback=results.append)
+    started.wait()
+    waiting = [loader.submit(lambda i=i: i, key='table', callback=results.append)
+               for i in range(5)]
+    release.set()
+    assert waiting[-1].result() == 4
+    loader.close()
+    assert all(f.cancelled() for f in waiting[:-1])
+    assert first.result() == 'first'
+    assert results == [4]
+    assert loader.cancelled == 4
+    assert loader.discarded == 1
+
+
+def test_dispatch_checks_staleness_on_delivery(repo):
+    queue = []
+    loader = AsyncRepository(repo, dispatch=queue.append)
+    results = []
+    loader.call('get', 1, key='obj', callback=results.append).result()
+    loader.call('get', 2, key='obj', callback=results.append).result()
+    loader.close()
+    assert loader.pending('obj')
+    for deliver in queue:
+        deliver()
+    assert not loader.pending('obj')
+    assert results == [repo.get(2)]
+    assert loader.discarded == 1
+
+
+def test_sqlite_in_worker_thread(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'async.db'), Expense)
+    repo.add(Expense(5, 1))
+    loader = AsyncRepository(repo)
+    assert loader.call('get_all').result() == repo.get_all()
+    loader.close()
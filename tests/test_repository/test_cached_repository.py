@@ -0,0 +1,106 @@
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+import pytest
+
+
+@pytest.fixture
+def inner(tmp_path):
+    return SQLiteRepository(str(tmp_path / 'cache.db'), Category)
+
+
+@pytest.fixture
+def repo(inner):
+    return CachedRepository(inner, capacity=2)
+
+
+def test_identity_map(repo, inner):
+    pk = inner.add(Category('a'))
+    first = repo.get(pk)
+    assert repo.get(pk) is first
+    assert (repo.hits, repo.misses) == (1, 1)
+
+
+def test_added_objects_cached(repo):
+    cat = Category('a')
+    pk = repo.add(cat)
+    assert repo.get(pk) is cat
+    assert repo.misses == 0
+
+
+def test_missing_not_cached(repo):
+    assert repo.get(100) is None
+    assert repo.get(100) is None
+    assert repo.misses == 2
+
+
+def test_lru_eviction(repo, inner):
+    pks = inner.add_many([Category('a'), Category('b'), Category('c')])
+    a = repo.get(pks[0])
+    repo.get(pks[1])
+    repo.get(pks[0])  # a становится недавно использованной
+    repo.get(pks[2])  # вытесняет b
+    assert repo.evictions == 1
+    assert repo.get(pks[0]) is a
+    repo.get(pks[1])
+    assert repo.misses == 4
+
+
+def test_fifo_eviction(inner):
+    repo = CachedRepository(inner, capacity=2, policy='fifo')
+    pks = inner.add_many([Category('a'), Category('b'), Category('c')])
+    a = repo.get(pks[0])
+    repo.get(pks[1])
+    repo.get(pks[0])
+    repo.get(pks[2])  # вытесняет a, добавленную раньше всех
+    assert repo.get(pks[0]) is not a
+
+
+def test_unknown_policy(inner):
+    with pytest.raises(ValueError):
+        CachedRepository(inner, policy='random')
+
+
+def test_invalidate_on_update_and_delete(repo, inner):
+    pk = repo.add(Category('a'))
+    repo.update(Category('b', pk=pk))
+    assert repo.get(pk).name == 'b'
+    inner.update(Category('c', pk=pk))  # в обход обертки
+    assert repo.get(pk).name == 'c'
+    inner.delete(pk)
+    assert repo.get(pk) is None
+
+
+def test_delegation(repo, inner):
+    repo.add_many([Category('a'), Category('b', 1)])
+    assert [c.name for c in repo.get_all({'parent': 1})] == ['b']
+    assert [c.name for c in repo.iter_all()] == ['a', 'b']
+    assert [c.name for c in repo.get_page('-pk', limit=1)] == ['b']
+    assert repo.explain({'name': 'a'}) == inner.explain({'name': 'a'})
+    repo.clear()
+    assert repo.hits == repo.misses == 0
+
+
+def test_get_total_under_unwraps_tree(tmp_path):
+    db_file = str(tmp_path / 'cache.db')
+    cat_repo = CachedRepository(SQLiteRepository(db_file, Category))
+    exp_repo = CachedRepository(SQLiteRepository(db_file, Expense))
+    cat_repo.add_many([Category('a'), Category('b', 1)])
+    exp_repo.add_many([Expense(10, 1), Expense(20, 2)])
+    assert exp_repo.get_total_under('amount', 'category', 1, cat_repo) == 30
+    assert exp_repo.get_sums('amount', 'category') == {1: 10, 2: 20}
+
+
+def test_hooks_delegated(inner):
+    repo = CachedRepository(MemoryRepository())
+    events = []
+
+    class Hook:
+        def added(self, obj): events.append(obj.name)
+
+    repo.add_hook(Hook())
+    repo.add(Category('a'))
+    assert events == ['a']
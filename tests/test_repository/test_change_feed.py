@@ -0,0 +1,187 @@
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import RepositoryHook
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.change_feed import ChangeFeed
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import ConnectionPool, SQLiteRepository
+from bookkeeper.repository.unit_of_work import UnitOfWork
+
+from datetime import datetime
+
+import pytest
+
+
+class Recorder(RepositoryHook):
+    def __init__(self):
+        self.events = []
+
+    def added(self, obj):
+        self.events.append(('added', obj))
+
+    def updated(self, old, new):
+        self.events.append(('updated', old, new))
+
+    def deleted(self, obj):
+        self.events.append(('deleted', obj))
+
+    def rolled_back(self):
+        self.events.append(('rolled_back',))
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / 'feed.db')
+
+
+@pytest.fixture
+def repo(db_file):
+    return SQLiteRepository(db_file, Expense, pool=ConnectionPool(db_file))
+
+
+@pytest.fixture
+def other(db_file, repo):
+    # репозиторий другого процесса: отдельный пул соединений
+    return SQLiteRepository(db_file, Expense, pool=ConnectionPool(db_file))
+
+
+def expense(amount, category=1):
+    when = datetime(2023, 1, 2, 3, 4)
+    return Expense(amount, category, when, when)
+
+
+def test_external_changes(repo, other):
+    feed = ChangeFeed(repo.pool)
+    hook = Recorder()
+    feed.watch(repo, hook)
+    assert feed.poll() == 0
+    exp = expense(10)
+    other.add(exp)
+    assert feed.poll() == 1
+    assert hook.events == [('added', exp)]
+    old = expense(10)
+    old.pk = exp.pk
+    exp.amount = 20
+    other.update(exp)
+    other.delete(other.add(expense(5)))
+    assert feed.poll() == 1
+    assert hook.events[-1] == ('updated', old, exp)
+    other.delete(exp.pk)
+    assert feed.poll() == 1
+    assert hook.events[-1] == ('deleted', exp)
+    assert feed.poll() == 0
+
+
+def test_own_changes_are_skipped(repo, other):
+    feed = ChangeFeed(repo.pool)
+    hook = Recorder()
+    feed.watch(repo, hook)
+    repo.add(expense(1))
+    with UnitOfWork(repo):
+        repo.add_many([expense(2), expense(3)])
+    other.add(expense(4))
+    assert feed.poll() == 1
+    assert [event[1].amount for event in hook.events] == [4]
+
+
+def test_rollback_is_not_reported(repo, other):
+    feed = ChangeFeed(repo.pool)
+    hook = Recorder()
+    feed.watch(repo, hook)
+    with pytest.raises(ZeroDivisionError):
+        with UnitOfWork(other):
+            other.add(expense(1))
+            1 / 0
+    assert feed.poll() == 0
+    assert hook.events == []
+
+
+def test_pruned_log(repo, other):
+    feed = ChangeFeed(repo.pool)
+    hook = Recorder()
+    feed.watch(repo, hook)
+    other.add_many([expense(1), expense(2)])
+    ChangeFeed(other.pool, keep=1)
+    # пропущены обе записи журнала
+    assert feed.poll() == 2
+    assert hook.events == [('rolled_back',)]
+    other.add(expense(3))
+    assert feed.poll() == 1
+    assert hook.events[-1][0] == 'added'
+
+
+def test_watch_cached_repository(db_file):
+    pool = ConnectionPool(db_file)
+    cat_repo = CachedRepository(SQLiteRepository(db_file, Category, pool=pool))
+    other = SQLiteRepository(db_file, Category, pool=ConnectionPool(db_file))
+    feed = ChangeFeed(pool)
+    feed.watch(cat_repo)
+    cat = Category('Еда')
+    cat_repo.add(cat)
+    other.update(Category('Продукты', pk=cat.pk))
+    assert cat_repo.get(cat.pk).name == 'Еда'
+    feed.poll()
+    assert cat_repo.get(cat.pk).name == 'Продукты'
+
+
+def test_watch_requires_feed_pool(repo, other):
+    feed = ChangeFeed(repo.pool)
+    with pytest.raises(ValueError):
+        feed.watch(other)
+    with pytest.raises(ValueError):
+        feed.watch(MemoryRepository())
+
+
+def test_bulk_changes_roll_back(repo, other):
+    feed = ChangeFeed(repo.pool, max_changes=2)
+    hook = Recorder()
+    feed.watch(repo, hook)
+    other.add_many([expense(i) for i in range(3)])
+    assert feed.poll() == 3
+    assert hook.events == [('rolled_back',)]
+    other.add(expense(4))
+    assert feed.poll() == 1
+    assert hook.events[-1][0] == 'added'
+
+
+def test_log_pruned_after_poll(repo, other):
+    feed = ChangeFeed(repo.pool)
+    feed.watch(repo, Recorder())
+    other_feed = ChangeFeed(other.pool)
+    other.add(expense(1))
+    repo.add(expense(2))
+    feed.poll()
+    # запись other еще не прочитана other_feed
+    assert len(feed._query('SELECT id FROM change_log')) == 2
+    other_feed.poll()
+    assert feed._query('SELECT id FROM change_log') == []
+    other_feed.close()
+    repo.add(expense(3))
+    feed.poll()
+    assert feed._query('SELECT id FROM change_log') == []
+
+
+def test_log_bounded_by_keep(repo, other):
+    feed = ChangeFeed(repo.pool, keep=2)
+    feed.watch(repo, Recorder())
+    lagging = ChangeFeed(other.pool)
+    hook = Recorder()
+    lagging.watch(other, hook)
+    for i in range(5):
+        other.add(expense(i))
+    assert feed.poll() == 5
+    # отставший больше чем на keep записей журнал не задерживает удаление
+    assert feed._query('SELECT source FROM change_log_readers') == [(feed.source,)]
+    assert feed._query('SELECT id FROM change_log') == []
+    repo.add(expense(6))
+    lagging.poll()
+    assert hook.events == [('rolled_back',)]
+    assert len(feed._query('SELECT source FROM change_log_readers')) == 2
+
+
+def test_no_log_without_readers(repo, other):
+    feed = ChangeFeed(repo.pool)
+    feed.watch(repo, Recorder())
+    feed.close()
+    other.add(expense(1))
+    assert feed._query('SELECT id FROM change_log') == []
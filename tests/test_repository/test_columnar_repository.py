@@ -0,0 +1,155 @@
+from datetime import date, datetime
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from bookkeeper.models.category import Category  # noqa: E402
+from bookkeeper.models.expense import Expense  # noqa: E402
+from bookkeeper.repository.abstract_repository import RepositoryHook  # noqa: E402
+from bookkeeper.repository.columnar_repository import (  # noqa: E402
+    ColumnarExpenseRepository)
+from bookkeeper.repository.memory_repository import MemoryRepository  # noqa: E402
+
+
+def make_expenses():
+    return [
+        Expense(10, 1, datetime(2023, 1, 30, 10), datetime(2023, 2, 1), 'обед'),
+        Expense(20.5, 2, datetime(2023, 1, 31, 12), datetime(2023, 2, 1), ''),
+        Expense(30, 1, datetime(2023, 2, 1, 23, 59), datetime(2023, 2, 2), 'Ужин'),
+        Expense(40, 3, datetime(2023, 2, 6), datetime(2023, 2, 7), 'обед'),
+    ]
+
+
+@pytest.fixture
+def repo():
+    repo = ColumnarExpenseRepository(capacity=2)
+    repo.add_many(make_expenses())
+    return repo
+
+
+@pytest.fixture
+def memory_repo():
+    repo = MemoryRepository()
+    repo.add_many(make_expenses())
+    return repo
+
+
+def test_crud(repo):
+    exp = Expense(5, 7, datetime(2023, 3, 1, 1, 2, 3, 456), comment='x')
+    pk = repo.add(exp)
+    assert pk == exp.pk == 5
+    assert repo.get(pk) == exp
+    exp2 = Expense(6, 8, datetime(2023, 3, 2), comment='y', pk=pk)
+    repo.update(exp2)
+    assert repo.get(pk) == exp2
+    repo.delete(pk)
+    assert repo.get(pk) is None
+    with pytest.raises(KeyError):
+        repo.delete(pk)
+    with pytest.raises(KeyError):
+        repo.update(exp2)
+
+
+def test_cannot_add_with_pk(repo):
+    with pytest.raises(ValueError):
+        repo.add(Expense(1, 1, pk=1))
+
+
+def test_cannot_update_without_pk(repo):
+    with pytest.raises(ValueError):
+        repo.update(Expense(1, 1))
+
+
+def test_add_many_batches():
+    repo = ColumnarExpenseRepository(capacity=1)
+    pks = repo.add_many((Expense(i, 1) for i in range(10)), batch_size=3)
+    assert pks == list(range(1, 11))
+    assert [e.amount for e in repo.iter_all(batch_size=4)] == list(range(10))
+
+
+@pytest.mark.parametrize('where', [
+    None,
+    {'category': 1},
+    {'amount__gt': 15, 'category__ne': 3},
+    {'category__in': [2, 3]},
+    {'expense_date__between': (datetime(2023, 1, 31), datetime(2023, 2, 2))},
+    {'expense_date__ge': datetime(2023, 2, 1)},
+    {'comment': 'обед'},
+    {'comment__like': 'у%'},
+    {'comment__in': ['', 'нет']},
+    {'amount__like': '2%'},
+    {'comment': None},
+])
+def test_get_all_same_as_memory(repo, memory_repo, where):
+    assert repo.get_all(where) == memory_repo.get_all(where)
+
+
+@pytest.mark.parametrize('order_by', ['pk', '-amount', 'category', '-expense_date',
+                                      'comment'])
+def test_get_page_same_as_memory(repo, memory_repo, order_by):
+    page = repo.get_page(order_by, limit=2)
+    assert page == memory_repo.get_page(order_by, limit=2)
+    key = (getattr(page[-1], order_by.lstrip('-')), page[-1].pk)
+    assert repo.get_page(order_by, key) == memory_repo.get_page(order_by, key)
+
+
+@pytest.mark.parametrize('period', ['day', 'week', 'month'])
+def test_get_totals_same_as_memory(repo, memory_repo, period):
+    assert repo.get_totals('amount', 'expense_date', period) == \
+        memory_repo.get_totals('amount', 'expense_date', period)
+
+
+def test_get_sums(repo, memory_repo):
+    assert repo.get_sums('amount', 'category') == {1: 40, 2: 20.5, 3: 40}
+    assert repo.get_sums('amount', 'comment') == memory_repo.get_sums('amount', 'comment')
+    assert repo.get_sums('amount', 'added_date', {'category': 1}) == {
+        datetime(2023, 2, 1): 10, datetime(2023, 2, 2): 30}
+
+
+def test_get_total_under(repo):
+    cats = MemoryRepository()
+    cats.add_many([Category('0'), Category('1', 1), Category('2')])
+    assert repo.get_total_under('amount', 'category', 1, cats) == 60.5
+    assert repo.get_total_under('amount', 'category', 1, cats, {'amount__lt': 20}) == 10
+
+
+def test_get_column(repo):
+    assert repo.get_column('amount', {'category': 1}).tolist() == [10, 30]
+    assert repo.get_column('expense_date')[0] == np.datetime64('2023-01-30T10:00')
+    assert repo.get_column('comment').tolist() == ['обед', '', 'Ужин', 'обед']
+
+
+def test_unknown_field(repo):
+    with pytest.raises(ValueError):
+        repo.get_all({'name': 'x'})
+    with pytest.raises(ValueError):
+        repo.get_totals('comment', 'expense_date', 'day')
+
+
+def test_compaction(repo):
+    for pk in (1, 2, 3):
+        repo.delete(pk)
+    assert [e.pk for e in repo.get_all()] == [4]
+    assert repo.get(4).amount == 40
+    assert repo.add(Expense(1, 1)) == 5
+    assert [e.pk for e in repo.get_page('-pk')] == [5, 4]
+
+
+def test_hooks(repo):
+    events = []
+
+    class Hook(RepositoryHook):
+        def added(self, obj): events.append(('added', obj.pk))
+        def updated(self, old, new): events.append(('updated', old.amount, new.amount))
+        def deleted(self, obj): events.append(('deleted', obj.pk))
+
+    repo.add_hook(Hook())
+    pk = repo.add(Expense(1, 1))
+    repo.update(Expense(2, 1, pk=pk))
+    repo.delete(pk)
+    assert events == [('added', 5), ('updated', 1, 2), ('deleted', 5)]
+
+
+def test_where_accepts_dates(repo):
+    assert [e.pk for e in repo.get_all({'expense_date__ge': date(2023, 2, 1)})] == [3, 4]
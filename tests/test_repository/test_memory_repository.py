@@ -1,4 +1,8 @@
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import RepositoryHook
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import page_key
 
 import pytest
 
@@ -69,3 +73,160 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert repo.get_all({'name': '0'}) == [objects[0]]
     assert repo.get_all({'test': 'test'}) == objects
+
+
+def test_add_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert repo.get_all() == objects
+
+
+def test_add_many_generator(repo, custom_class):
+    pks = repo.add_many(custom_class() for i in range(5))
+    assert [o.pk for o in repo.get_all()] == pks
+
+
+def test_add_many_with_pk(repo, custom_class):
+    obj = custom_class()
+    obj.pk = 1
+    with pytest.raises(ValueError):
+        repo.add_many([obj])
+
+
+def test_get_all_with_operators(repo, custom_class):
+    objects = []
+    for i in range(5):
+        o = custom_class()
+        o.amount = i
+        repo.add(o)
+        objects.append(o)
+    assert repo.get_all({'amount__ge': 3}) == objects[3:]
+    assert repo.get_all({'amount__in': [0, 4]}) == [objects[0], objects[4]]
+    assert repo.get_all({'amount__between': (1, 2), 'pk__ne': 2}) == [objects[2]]
+
+
+def test_iter_all(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    repo.add_many(objects)
+    assert list(repo.iter_all()) == objects
+    assert list(repo.iter_all({'pk__gt': 3})) == objects[3:]
+
+
+def test_get_page(repo, custom_class):
+    objects = []
+    for value in [3, 1, 2, 1, 3]:
+        o = custom_class()
+        o.value = value
+        objects.append(o)
+    repo.add_many(objects[:3])
+    page = repo.get_page('value', limit=2)
+    assert [(o.value, o.pk) for o in page] == [(1, 2), (2, 3)]
+    # добавление после построения отсортированного списка
+    for o in objects[3:]:
+        repo.add(o)
+    page = repo.get_page('value', page_key(page[0], 'value'), limit=3)
+    assert [(o.value, o.pk) for o in page] == [(1, 4), (2, 3), (3, 1)]
+    page = repo.get_page('-value', limit=2)
+    assert [(o.value, o.pk) for o in page] == [(3, 5), (3, 1)]
+    page = repo.get_page('-value', page_key(page[-1], '-value'), limit=10)
+    assert [(o.value, o.pk) for o in page] == [(2, 3), (1, 4), (1, 2)]
+    repo.delete(4)
+    assert [o.pk for o in repo.get_page('value')] == [2, 3, 1, 5]
+
+
+class RecordingHook(RepositoryHook):
+    def __init__(self):
+        self.events = []
+
+    def added(self, obj): self.events.append(('added', obj))
+    def updated(self, old, new): self.events.append(('updated', old, new))
+    def deleted(self, obj): self.events.append(('deleted', obj))
+
+
+def test_hooks(repo, custom_class):
+    hook = RecordingHook()
+    repo.add_hook(hook)
+    obj = custom_class()
+    repo.add(obj)
+    objects = [custom_class(), custom_class()]
+    repo.add_many(objects)
+    obj2 = custom_class()
+    obj2.pk = obj.pk
+    repo.update(obj2)
+    repo.delete(obj.pk)
+    assert hook.events == [('added', obj), ('added', objects[0]), ('added', objects[1]),
+                           ('updated', obj, obj2), ('deleted', obj2)]
+    repo.remove_hook(hook)
+    repo.add(custom_class())
+    assert len(hook.events) == 5
+
+
+def test_get_all_under(repo):
+    cat_repo = MemoryRepository()
+    cat_repo.add_many([Category('0'), Category('1', 1), Category('2', 2),
+                       Category('3')])
+    objects = [Expense(10, 1), Expense(20, 3), Expense(40, 4)]
+    repo.add_many(objects)
+    assert repo.get_all_under('category', 1, cat_repo) == objects[:2]
+    assert repo.get_all_under('category', 2, cat_repo, {'amount__gt': 10}) == [objects[1]]
+    assert repo.get_total_under('amount', 'category', 1, cat_repo) == 30
+    assert repo.get_total_under('amount', 'category', 3, cat_repo) == 20
+
+
+def test_snapshot_restore(repo):
+    kept = Category('kept')
+    repo.add(kept)
+    snapshot = repo.snapshot()
+    repo.update(Category('replaced', pk=kept.pk))
+    repo.add(Category('new'))
+    repo.delete(kept.pk)
+    repo.restore(snapshot)
+    assert repo.get_all() == [kept]
+    assert repo.get_page('name') == repo.get_all()
+    assert repo.add(Category('again')) == 2
+
+
+def test_nested_snapshots(repo):
+    repo.add(Category('a'))
+    outer = repo.snapshot()
+    repo.add(Category('b'))
+    inner = repo.snapshot()
+    repo.delete(1)
+    repo.restore(inner)
+    assert [c.name for c in repo.get_all()] == ['a', 'b']
+    inner = repo.snapshot()
+    repo.add(Category('c'))
+    repo.release(inner)
+    repo.restore(outer)
+    assert [c.name for c in repo.get_all()] == ['a']
+    # после release и restore журнал не ведется
+    released = repo.snapshot()
+    repo.release(released)
+    repo.add(Category('d'))
+    assert released.undo == {}
+
+
+def test_get_rows(repo):
+    cat_repo = MemoryRepository()
+    cat_repo.add(Category('Еда'))
+    exps = [Expense(i, 1 if i % 2 else 5, comment=str(i)) for i in range(5)]
+    repo.add_many(exps)
+    rows = repo.get_rows({'category': (cat_repo, 'name')})
+    assert [row[1] for row in rows] == [5, 'Еда', 5, 'Еда', 5]
+    assert rows[0] == [0, 5, exps[0].expense_date, exps[0].added_date, '0', exps[0].pk]
+    assert repo.get_rows(after_pk=exps[1].pk, limit=2) == [
+        [e.amount, e.category, e.expense_date, e.added_date, e.comment, e.pk]
+        for e in exps[2:4]]
+    assert MemoryRepository().get_rows() == []
+
+
+def test_accumulate(repo):
+    hook = RecordingHook()
+    repo.add_hook(hook)
+    first = repo.accumulate(Expense(10, 1, comment='a'), 'amount', ('category',))
+    total = repo.accumulate(Expense(5, 1), 'amount', ('category',))
+    assert (total.pk, total.amount, total.comment) == (first.pk, 15, 'a')
+    assert first.amount == 10
+    assert repo.get_all() == [total]
+    assert hook.events == [('added', first), ('updated', first, total)]
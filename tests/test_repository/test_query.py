@@ -0,0 +1,114 @@
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import coerce, compile_sql, make_predicate, parse_where
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+from datetime import date, datetime
+
+import pytest
+
+
+class Obj:
+    def __init__(self, amount, name=None):
+        self.amount = amount
+        self.name = name
+
+
+def test_parse_where():
+    assert parse_where({'amount': 1, 'amount__gt': 0}) == [
+        ('amount', 'eq', 1), ('amount', 'gt', 0)]
+
+
+def test_unknown_operator():
+    with pytest.raises(ValueError):
+        parse_where({'amount__foo': 1})
+
+
+def test_between_requires_pair():
+    with pytest.raises(ValueError):
+        parse_where({'amount__between': (1, 2, 3)})
+
+
+def test_compile_sql():
+    clause, params = compile_sql(
+        {'amount__between': (1, 5), 'name__in': ['a', 'b'], 'name__like': 'x%',
+         'pk__ne': None}, ['pk', 'amount', 'name'])
+    assert clause == ('amount BETWEEN ? AND ? AND name IN (?, ?) '
+                      'AND name LIKE ? AND pk IS NOT NULL')
+    assert params == [1, 5, 'a', 'b', 'x%']
+
+
+def test_compile_sql_unknown_field():
+    with pytest.raises(ValueError):
+        compile_sql({'amount; DROP TABLE x': 1}, ['amount'])
+
+
+@pytest.mark.parametrize('where, expected', [
+    ({'amount': 2}, [2]),
+    ({'amount__ne': 2}, [1, 3]),
+    ({'amount__lt': 2}, [1]),
+    ({'amount__le': 2}, [1, 2]),
+    ({'amount__gt': 2}, [3]),
+    ({'amount__ge': 2}, [2, 3]),
+    ({'amount__in': {1, 3}}, [1, 3]),
+    ({'amount__between': (2, 3)}, [2, 3]),
+    ({'name__like': 'A%'}, [1, 2]),
+    ({'name__like': '_b_'}, [2]),
+    ({'name': None}, [3]),
+    ({'name__ne': None}, [1, 2]),
+    ({'name__ne': 'abc'}, [1]),
+])
+def test_make_predicate(where, expected):
+    objs = [Obj(1, 'a'), Obj(2, 'abc'), Obj(3)]
+    assert [o.amount for o in objs if make_predicate(where)(o)] == expected
+
+
+@pytest.mark.parametrize('where, expected', [
+    ({'name__like': 'ABC'}, [2]),
+    ({'name__like': 'ЯБ%'}, []),
+    ({'name__like': 'яб%'}, [3]),
+])
+def test_like_ascii_case(where, expected):
+    objs = [Obj(1, 'a'), Obj(2, 'abc'), Obj(3, 'яблоко')]
+    assert [o.amount for o in objs if make_predicate(where)(o)] == expected
+
+
+def test_coerce():
+    assert coerce(date(2023, 1, 2), datetime) == datetime(2023, 1, 2)
+    assert coerce(datetime(2023, 1, 2, 3), date) == date(2023, 1, 2)
+    assert coerce('1', int | None) == 1
+    assert coerce('1.5', float) == 1.5
+    assert coerce('x', int) == 'x'
+    assert coerce('1', str) == '1'
+    assert coerce('1', bool) == '1'
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def expense_repo(request, tmp_path):
+    if request.param == 'memory':
+        repo = MemoryRepository[Expense]()
+    else:
+        repo = SQLiteRepository[Expense](str(tmp_path / 'query.db'), Expense)
+    for day, comment in [(1, 'Обед'), (2, 'обед'), (3, 'ужин')]:
+        repo.add(Expense(day * 10, day, datetime(2023, 1, day, 12),
+                         datetime(2023, 1, day), comment))
+    repo.add(Expense(40, 1, datetime(2023, 1, 2), datetime(2023, 1, 2), 'Lunch'))
+    return repo
+
+
+@pytest.mark.parametrize('where, expected', [
+    ({'expense_date__ge': date(2023, 1, 2)}, [20, 30, 40]),
+    ({'expense_date__gt': date(2023, 1, 2)}, [20, 30]),
+    ({'expense_date__le': date(2023, 1, 2)}, [10, 40]),
+    ({'expense_date': date(2023, 1, 2)}, [40]),
+    ({'expense_date__between': (date(2023, 1, 1), date(2023, 1, 2))}, [10, 40]),
+    ({'expense_date__in': [date(2023, 1, 2)]}, [40]),
+    ({'category': '1'}, [10, 40]),
+    ({'category__in': ['2', 3]}, [20, 30]),
+    ({'amount__gt': '25'}, [30, 40]),
+    ({'comment__like': 'обед'}, [20]),
+    ({'comment__like': 'lunch'}, [40]),
+    ({'comment__like': '%Е%'}, []),
+])
+def test_backends_agree(expense_repo, where, expected):
+    assert sorted(exp.amount for exp in expense_repo.get_all(where)) == expected
@@ -1,8 +1,24 @@
-from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.sqlite_repository import (
+    PROFILES, SQLiteRepository, ConnectionPool, column_type, init_order, model_indexes,
+    row_factory)
+from bookkeeper.repository.abstract_repository import AbstractRepository, RepositoryHook
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import page_key
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+
+import shutil
+import sqlite3
+from inspect import isgenerator
+import threading
 
 import pytest
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from enum import IntEnum
+from typing import Optional
 
 DB_NAME = 'test.db'
 
@@ -95,3 +111,494 @@ def test_get_all_with_condition(repo, custom_class):
     assert repo.get_all({'text': 'test'}) == objects
     assert repo.get_all({'pk': 1, 'text': 'test'}) == [objects[0]]
     assert repo.get_all({'text': 'no_test'}) == []
+
+
+def test_repositories_share_connection(custom_class):
+    @dataclass
+    class Other:
+        value: int = 0
+        pk: int = 0
+
+    repo1 = SQLiteRepository(DB_NAME, custom_class)
+    repo2 = SQLiteRepository(DB_NAME, Other)
+    assert repo1.pool is repo2.pool
+    assert repo1.pool.connection() is repo2.pool.connection()
+
+
+def test_connection_per_thread(repo):
+    con = repo.pool.connection()
+    other = []
+    thread = threading.Thread(target=lambda: other.append(repo.pool.connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not con
+    assert repo.pool.connection() is con
+
+
+def test_close_and_reopen(repo, custom_class):
+    clear_all_data(repo)
+
+    con = repo.pool.connection()
+    repo.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        con.execute('SELECT 1')
+    obj = custom_class()
+    repo.add(obj)
+    assert repo.get(obj.pk) == obj
+
+
+def test_context_manager(tmp_path, custom_class):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'))
+    with SQLiteRepository(pool.db_file, custom_class, pool) as repo:
+        con = repo.pool.connection()
+        repo.add(custom_class())
+    with pytest.raises(sqlite3.ProgrammingError):
+        con.execute('SELECT 1')
+
+
+def test_add_many(repo, custom_class):
+    clear_all_data(repo)
+
+    objects = [custom_class(str(i)) for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert repo.get_all() == objects
+
+
+def test_add_many_generator(repo, custom_class):
+    clear_all_data(repo)
+
+    repo.add(custom_class())
+    pks = repo.add_many(custom_class(str(i)) for i in range(5))
+    assert pks == [2, 3, 4, 5, 6]
+    assert [o.text for o in repo.get_all()] == ['abc', '0', '1', '2', '3', '4']
+
+
+def test_add_many_rollback(repo, custom_class):
+    clear_all_data(repo)
+
+    obj = custom_class()
+    obj.pk = 1
+    with pytest.raises(ValueError):
+        repo.add_many([custom_class(), obj])
+    assert repo.get_all() == []
+
+
+def test_get_all_with_operators(repo, custom_class):
+    clear_all_data(repo)
+
+    objects = repo.add_many(custom_class(text) for text in ['a', 'ab', 'b', 'c'])
+    assert [o.text for o in repo.get_all({'text__like': 'a%'})] == ['a', 'ab']
+    assert [o.text for o in repo.get_all({'text__in': ['b', 'c']})] == ['b', 'c']
+    assert [o.pk for o in repo.get_all({'pk__between': (2, 3)})] == objects[1:3]
+    assert [o.pk for o in repo.get_all({'pk__gt': 3, 'text__ne': 'a'})] == [4]
+
+
+def test_get_all_unknown_field(repo):
+    with pytest.raises(ValueError):
+        repo.get_all({'no_such_field': 1})
+
+
+def test_model_indexes():
+    @dataclass
+    class Indexed:
+        a: int = field(default=0, metadata={'index': True})
+        b: int = field(default=0, metadata={'index': ('c',)})
+        c: int = 0
+        pk: int = 0
+
+    assert model_indexes(Indexed) == [('a',), ('b', 'c')]
+    assert model_indexes(int) == []
+
+
+def test_indexes_created(tmp_path):
+    db_file = str(tmp_path / 'ix.db')
+    cat_repo = SQLiteRepository(db_file, Category)
+    exp_repo = SQLiteRepository(db_file, Expense)
+    assert set(cat_repo.indexes) == {'ix_category_name', 'ix_category_parent'}
+    assert set(exp_repo.indexes) == {'ix_expense_category_expense_date',
+                                     'ix_expense_expense_date_amount'}
+    # повторное создание не приводит к ошибке
+    SQLiteRepository(db_file, Expense)
+    report = exp_repo.index_report([{'category': 1}, {'amount': 1}])
+    assert report == {"{'category': 1}": ['ix_expense_category_expense_date'],
+                      "{'amount': 1}": []}
+    assert any('ix_category_name' in line
+               for line in cat_repo.explain({'name': 'x'}))
+
+
+def test_indexes_argument(tmp_path, custom_class):
+    repo = SQLiteRepository(str(tmp_path / 'ix.db'), custom_class, indexes=['text'])
+    assert repo.indexes == {'ix_custom_text': ('text',)}
+    with pytest.raises(ValueError):
+        repo.create_index('no_such_field')
+
+
+def test_deferred_indexes(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'ix.db'), Expense)
+    con = repo.pool.connection()
+    query = "SELECT name FROM sqlite_master WHERE type = 'index'"
+    with pytest.raises(RuntimeError):
+        with repo.deferred_indexes():
+            assert con.execute(query).fetchall() == []
+            raise RuntimeError
+    assert {row[0] for row in con.execute(query)} == set(repo.indexes)
+
+
+def test_iter_all(repo, custom_class):
+    clear_all_data(repo)
+
+    objects = [custom_class(str(i)) for i in range(5)]
+    repo.add_many(objects)
+    gen = repo.iter_all(batch_size=2)
+    assert isgenerator(gen)
+    assert list(gen) == objects
+    assert list(repo.iter_all({'text__in': ['1', '3']})) == [objects[1], objects[3]]
+
+
+def test_get_page(repo, custom_class):
+    clear_all_data(repo)
+
+    repo.add_many(custom_class(text) for text in ['c', 'a', 'b', 'a', 'c'])
+    page = repo.get_page('text', limit=2)
+    assert [(o.text, o.pk) for o in page] == [('a', 2), ('a', 4)]
+    page = repo.get_page('text', page_key(page[-1], 'text'), limit=2)
+    assert [(o.text, o.pk) for o in page] == [('b', 3), ('c', 1)]
+    page = repo.get_page('-text', ('b', 3))
+    assert [(o.text, o.pk) for o in page] == [('a', 4), ('a', 2)]
+    assert [o.pk for o in repo.get_page('-pk', limit=2)] == [5, 4]
+    with pytest.raises(ValueError):
+        repo.get_page('no_such_field')
+
+
+def test_get_page_uses_index(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'page.db'), Expense)
+    con = repo.pool.connection()
+    plan = con.execute(
+        'EXPLAIN QUERY PLAN SELECT * FROM expense WHERE (expense_date, pk) < (?, ?) '
+        'ORDER BY expense_date DESC, pk DESC LIMIT 10', (1, 1)).fetchall()
+    assert 'ix_expense_expense_date_amount' in plan[0][-1]
+
+
+def test_get_totals_unknown_field(repo):
+    with pytest.raises(ValueError):
+        repo.get_totals('no_such_field', 'text', 'day')
+
+
+def test_hooks(repo, custom_class):
+    clear_all_data(repo)
+
+    events = []
+
+    class Hook(RepositoryHook):
+        def added(self, obj): events.append(('added', obj.text))
+        def updated(self, old, new): events.append(('updated', old.text, new.text))
+        def deleted(self, obj): events.append(('deleted', obj.text))
+
+    hook = Hook()
+    repo.add_hook(hook)
+    obj = custom_class('a')
+    repo.add(obj)
+    repo.add_many(custom_class(text) for text in 'bc')
+    repo.update(custom_class('d', obj.pk))
+    repo.delete(obj.pk)
+    repo.remove_hook(hook)
+    assert events == [('added', 'a'), ('added', 'b'), ('added', 'c'),
+                      ('updated', 'a', 'd'), ('deleted', 'd')]
+
+
+def test_get_sums(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'sums.db'), Expense)
+    repo.add_many([Expense(10, 1), Expense(20, 2), Expense(5, 1)])
+    assert repo.get_sums('amount', 'category') == {1: 15, 2: 20}
+    assert repo.get_sums('amount', 'category', {'category__ne': 2}) == {1: 15}
+
+
+def test_get_all_under(tmp_path):
+    db_file = str(tmp_path / 'under.db')
+    cat_repo = SQLiteRepository(db_file, Category)
+    exp_repo = SQLiteRepository(db_file, Expense)
+    cats = {c.name: c.pk for c in Category.create_from_tree(
+        [('0', None), ('1', '0'), ('2', '1'), ('3', None)], cat_repo)}
+    exp_repo.add_many([Expense(10, cats['0'], datetime(2023, 1, 1)),
+                       Expense(20, cats['2'], datetime(2023, 2, 1)),
+                       Expense(40, cats['3'], datetime(2023, 2, 1))])
+    assert [e.amount for e in exp_repo.get_all_under('category', cats['0'], cat_repo)
+            ] == [10, 20]
+    where = {'expense_date__ge': datetime(2023, 2, 1)}
+    assert [e.category for e in exp_repo.get_all_under(
+        'category', cats['0'], cat_repo, where)] == [cats['2']]
+    assert exp_repo.get_total_under('amount', 'category', cats['0'], cat_repo) == 30
+    assert exp_repo.get_total_under('amount', 'category', cats['1'], cat_repo,
+                                    where) == 20
+    assert exp_repo.get_total_under('amount', 'category', cats['3'], cat_repo) == 40
+    # дерево в другом хранилище обрабатывается реализацией по умолчанию
+    mem_cats = MemoryRepository()
+    mem_cats.add_many([Category('0'), Category('1', 1)])
+    assert len(exp_repo.get_all_under('category', 1, mem_cats)) == 2
+    assert exp_repo.get_total_under('amount', 'category', 1, mem_cats) == 50
+
+
+def test_column_type():
+    class Level(IntEnum):
+        LOW = 1
+
+    assert column_type(int) == 'INTEGER'
+    assert column_type(float) == 'REAL'
+    assert column_type(int | None) == 'INTEGER'
+    assert column_type(Optional[float]) == 'REAL'
+    assert column_type(datetime) == 'TIMESTAMP'
+    assert column_type(date) == 'DATE'
+    assert column_type(bool) == 'BOOLEAN'
+    assert column_type(Level) == 'INTEGER'
+    assert column_type(list[int]) == 'TEXT'
+    assert column_type(int | str) == 'TEXT'
+    assert column_type(float, {float: 'NUMERIC'}) == 'NUMERIC'
+
+
+def test_types_round_trip(tmp_path):
+    db_file = str(tmp_path / 'types.db')
+    exp_repo = SQLiteRepository(db_file, Expense)
+    cat_repo = SQLiteRepository(db_file, Category)
+    assert exp_repo.columns == {'amount': 'REAL', 'category': 'INTEGER',
+                                'expense_date': 'TIMESTAMP',
+                                'added_date': 'TIMESTAMP', 'comment': 'TEXT'}
+    assert cat_repo.columns['parent'] == 'INTEGER'
+    exp = Expense(10.5, 1, datetime(2023, 1, 2, 3, 4, 5, 6), datetime(2023, 1, 3))
+    exp_repo.add(exp)
+    assert exp_repo.get(exp.pk) == exp
+    assert exp_repo.get_all({'amount__gt': 9}) == [exp]
+    assert exp_repo.get_all({'expense_date__lt': datetime(2023, 1, 2, 3)}) == []
+    cat = Category('a')
+    cat_repo.add(cat)
+    assert cat_repo.get(cat.pk).parent is None
+
+
+def test_migrate_text_columns(tmp_path):
+    db_file = str(tmp_path / 'legacy.db')
+    with sqlite3.connect(db_file) as con:
+        con.execute('CREATE TABLE expense (pk INTEGER PRIMARY KEY, amount TEXT, '
+                    'category INTEGER, expense_date TEXT, added_date TEXT, '
+                    'comment TEXT, obsolete TEXT)')
+        con.execute('CREATE TABLE category (pk INTEGER PRIMARY KEY, '
+                    'name TEXT, parent INTEGER)')
+        con.execute("INSERT INTO expense VALUES (3, '100', 1, "
+                    "'2023-01-02T10:00:00', '2023-01-02 10:00:00.5', 'None', 'x')")
+        con.execute("INSERT INTO category VALUES (1, 'a', 'None')")
+    con.close()
+    exp_repo = SQLiteRepository(db_file, Expense)
+    assert exp_repo.migrate() is False
+    assert exp_repo.get(3) == Expense(100., 1, datetime(2023, 1, 2, 10),
+                                      datetime(2023, 1, 2, 10, 0, 0, 500000),
+                                      'None', 3)
+    assert exp_repo.explain({'category': 1})[0].startswith('SEARCH')
+    cat_repo = SQLiteRepository(db_file, Category)
+    assert cat_repo.get(1).parent is None
+
+
+def test_migrate_existing_test_db(tmp_path):
+    db_file = str(tmp_path / 'copy.db')
+    shutil.copy(DB_NAME, db_file)
+    repo = SQLiteRepository(db_file, Expense)
+    with sqlite3.connect(db_file) as con:
+        types = [row[2] for row in con.execute('PRAGMA table_info(expense)')]
+    con.close()
+    assert types == ['INTEGER', 'REAL', 'INTEGER', 'TIMESTAMP', 'TIMESTAMP', 'TEXT']
+    assert all(isinstance(exp.expense_date, datetime) for exp in repo.get_all())
+
+
+def test_update_binds_values(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'upd.db'), Category)
+    cat = Category('a', 1)
+    repo.add(cat)
+    cat.name = "it's; DROP TABLE category"
+    cat.parent = None
+    repo.update(cat)
+    assert repo.get(cat.pk) == cat
+    assert repo.get_all({'parent': None}) == [cat]
+
+
+def test_pool_cached_statements(tmp_path):
+    with ConnectionPool(str(tmp_path / 'cache.db'), cached_statements=16) as pool:
+        assert pool.cached_statements == 16
+        assert pool.connection() is pool.connection()
+
+
+def test_row_factory(custom_class):
+    make = row_factory(Expense, ('amount', 'category', 'expense_date', 'added_date',
+                                 'comment', 'pk'), bypass_init=True)
+    now = datetime.now()
+    assert make((1.5, 2, now, now, 'c', 3)) == Expense(1.5, 2, now, now, 'c', 3)
+    assert row_factory(custom_class, ('text', 'pk'))(('a', 1)) == custom_class('a', 1)
+    assert row_factory(custom_class, ('text', 'pk')) is row_factory(custom_class,
+                                                                    ('text', 'pk'))
+    with pytest.raises(ValueError):
+        row_factory(custom_class, ('pk', 'text'))
+
+
+def test_row_factory_rejects_unsafe_bypass():
+    @dataclass(frozen=True)
+    class Frozen:
+        pk: int = 0
+
+    @dataclass
+    class PostInit:
+        pk: int = 0
+
+        def __post_init__(self):
+            self.pk = int(self.pk)
+
+    for cls in (Frozen, PostInit):
+        with pytest.raises(ValueError):
+            row_factory(cls, ('pk',), bypass_init=True)
+
+
+def test_init_order():
+    class Plain:
+        pk: int
+        name: str
+
+    assert init_order(Expense) == ['amount', 'category', 'expense_date',
+                                   'added_date', 'comment', 'pk']
+    assert init_order(Plain) == ['name', 'pk']
+
+
+def test_bypass_init(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'fast.db'), Expense, bypass_init=True)
+    objs = [Expense(i, 1, datetime(2023, 1, i + 1)) for i in range(3)]
+    repo.add_many(objs)
+    assert repo.get_all() == objs
+    assert list(repo.iter_all(batch_size=2)) == objs
+    assert repo.get(objs[1].pk) == objs[1]
+    assert repo.get_page('-expense_date', limit=1) == [objs[-1]]
+
+
+def pragma(con, name):
+    return con.execute(f'PRAGMA {name}').fetchone()[0]
+
+
+@pytest.mark.parametrize('profile, journal, synchronous', [
+    ('safe', 'delete', 2), ('balanced', 'wal', 1), ('bulk-import', 'wal', 0)])
+def test_profiles(tmp_path, profile, journal, synchronous):
+    with ConnectionPool(str(tmp_path / 'p.db'), profile=profile) as pool:
+        con = pool.connection()
+        assert pragma(con, 'journal_mode') == journal
+        assert pragma(con, 'synchronous') == synchronous
+        assert pragma(con, 'foreign_keys') == 1
+    assert set(PROFILES) == {'safe', 'balanced', 'bulk-import'}
+
+
+def test_profile_extra_pragmas(tmp_path):
+    with ConnectionPool(str(tmp_path / 'p.db'), {'synchronous': 'OFF'},
+                        profile='balanced') as pool:
+        assert pragma(pool.connection(), 'synchronous') == 0
+        pool.set_profile('bulk-import')
+        assert pragma(pool.connection(), 'cache_size') == -262144
+    with pytest.raises(ValueError):
+        ConnectionPool(str(tmp_path / 'p.db'), profile='fast')
+
+
+def test_repository_profile(tmp_path, custom_class):
+    db_file = str(tmp_path / 'repo.db')
+    repo = SQLiteRepository(db_file, custom_class, profile='balanced')
+    assert repo.pool is ConnectionPool.for_file(db_file)
+    assert pragma(repo.pool.connection(), 'journal_mode') == 'wal'
+    other = SQLiteRepository(db_file, Category)
+    assert other.pool.profile == 'balanced'
+    SQLiteRepository(db_file, Category, profile='safe')
+    # режим журнала хранится в файле, профиль 'safe' его не меняет
+    assert pragma(repo.pool.connection(), 'journal_mode') == 'wal'
+    repo.add(custom_class())
+    assert len(repo.get_all()) == 1
+    repo.close()
+
+
+def test_profiles_share_file(tmp_path, custom_class):
+    # другой процесс (например, simple_client) открывает файл,
+    # который главное окно держит в режиме WAL
+    db_file = str(tmp_path / 'shared.db')
+    with ConnectionPool(db_file, profile='balanced') as gui, \
+            ConnectionPool(db_file, profile='safe') as client:
+        gui_repo = SQLiteRepository(db_file, custom_class, pool=gui)
+        client_repo = SQLiteRepository(db_file, custom_class, pool=client)
+        client_repo.add(custom_class())
+        assert pragma(client.connection(), 'journal_mode') == 'wal'
+        assert len(gui_repo.get_all()) == 1
+
+
+def test_failed_pragma_closes_connection(tmp_path, monkeypatch):
+    pool = ConnectionPool(str(tmp_path / 'p.db'), {'journal_mode': 'NO SUCH MODE;'})
+    opened = []
+    connect = sqlite3.connect
+
+    def tracked(*args, **kwargs):
+        con = connect(*args, **kwargs)
+        opened.append(con)
+        return con
+
+    monkeypatch.setattr(sqlite3, 'connect', tracked)
+    with pytest.raises(sqlite3.Error):
+        pool.connection()
+    with pytest.raises(sqlite3.ProgrammingError):
+        opened[0].execute('SELECT 1')
+    assert pool._connections == []
+
+
+def test_set_profile_inside_transaction(tmp_path):
+    with ConnectionPool(str(tmp_path / 'p.db')) as pool:
+        pool.begin()
+        with pytest.raises(RuntimeError):
+            pool.set_profile('balanced')
+        pool.rollback()
+
+
+def test_get_rows_join(tmp_path):
+    db_file = str(tmp_path / 'rows.db')
+    cat_repo = SQLiteRepository(db_file, Category)
+    exp_repo = SQLiteRepository(db_file, Expense)
+    food = Category('Еда')
+    cat_repo.add(food)
+    when = datetime(2023, 1, 2, 3, 4)
+    exps = [Expense(10, food.pk, when, when), Expense(20, 99, when, when, 'x'),
+            Expense(30, food.pk, when, when)]
+    exp_repo.add_many(exps)
+    lookups = {'category': (CachedRepository(cat_repo), 'name')}
+    rows = exp_repo.get_rows(lookups)
+    assert rows == [[10, 'Еда', when, when, '', exps[0].pk],
+                    [20, 99, when, when, 'x', exps[1].pk],
+                    [30, 'Еда', when, when, '', exps[2].pk]]
+    assert exp_repo.get_rows(lookups, after_pk=exps[0].pk, limit=1) == rows[1:2]
+    assert exp_repo.get_rows(lookups, {'category': food.pk}) == rows[::2]
+    assert AbstractRepository.get_rows(exp_repo, lookups) == rows
+    with pytest.raises(ValueError):
+        exp_repo.get_rows({'category': (cat_repo, 'title')})
+
+
+def test_get_rows_other_db(tmp_path):
+    cat_repo = MemoryRepository()
+    exp_repo = SQLiteRepository(str(tmp_path / 'rows.db'), Expense)
+    food = Category('Еда')
+    cat_repo.add(food)
+    exp = Expense(10, food.pk, datetime(2023, 1, 2), datetime(2023, 1, 2))
+    exp_repo.add(exp)
+    assert exp_repo.get_rows({'category': (cat_repo, 'name')}) == [
+        [10, 'Еда', exp.expense_date, exp.added_date, '', exp.pk]]
+
+
+def test_accumulate(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'acc.db'), Expense)
+    events = []
+
+    class Hook(RepositoryHook):
+        def added(self, obj): events.append(('added', obj.amount))
+        def updated(self, old, new): events.append(('updated', old.amount, new.amount))
+
+    repo.add_hook(Hook())
+    first = repo.accumulate(Expense(10, 1, comment='a'), 'amount', ('category',))
+    total = repo.accumulate(Expense(5, 1), 'amount', ('category',))
+    assert (total.pk, total.amount, total.comment) == (first.pk, 15, 'a')
+    assert repo.get_all() == [total]
+    assert 'ux_expense_category' in repo.indexes
+    assert events == [('added', 10), ('updated', 10, 15)]
+    with pytest.raises(ValueError):
+        repo.accumulate(Expense(5, 1), 'category', ('category',))
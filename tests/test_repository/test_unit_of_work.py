@@ -0,0 +1,113 @@
+from bookkeeper.models.budget import PeriodTotal, RunningTotals
+from bookkeeper.models.category import Category, CategoryTree
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import ConnectionPool, SQLiteRepository
+from bookkeeper.repository.unit_of_work import UnitOfWork
+
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def pool(tmp_path):
+    with ConnectionPool(str(tmp_path / 'uow.db')) as pool:
+        yield pool
+
+
+@pytest.fixture
+def cat_repo(pool):
+    return SQLiteRepository(pool.db_file, Category, pool=pool)
+
+
+@pytest.fixture
+def exp_repo(pool):
+    return SQLiteRepository(pool.db_file, Expense, pool=pool)
+
+
+def test_commit(cat_repo, exp_repo, pool):
+    with UnitOfWork(cat_repo, exp_repo):
+        cats = Category.create_from_tree([('a', None), ('b', 'a')], cat_repo)
+        exp = Expense(10, cats[1].pk)
+        exp_repo.add(exp)
+        exp.amount = 20
+        exp_repo.update(exp)
+        assert pool.connection().in_transaction
+    assert not pool.connection().in_transaction
+    assert len(cat_repo.get_all()) == 2
+    assert exp_repo.get(exp.pk).amount == 20
+
+
+def test_rollback(cat_repo, exp_repo, pool):
+    cat_repo.add(Category('kept'))
+    with pytest.raises(ZeroDivisionError):
+        with UnitOfWork(cat_repo, exp_repo):
+            cat = Category('lost')
+            cat_repo.add(cat)
+            exp_repo.add_many([Expense(1, cat.pk), Expense(2, cat.pk)])
+            cat_repo.delete(1)
+            1 / 0
+    assert not pool.connection().in_transaction
+    assert [c.name for c in cat_repo.get_all()] == ['kept']
+    assert exp_repo.get_all() == []
+
+
+def test_nested_savepoint(cat_repo):
+    with UnitOfWork(cat_repo):
+        cat_repo.add(Category('outer'))
+        with pytest.raises(ValueError):
+            with UnitOfWork(cat_repo):
+                cat_repo.add(Category('inner'))
+                raise ValueError
+        cat_repo.add(Category('after'))
+    assert [c.name for c in cat_repo.get_all()] == ['outer', 'after']
+
+
+def test_requires_shared_pool(tmp_path, cat_repo):
+    other = SQLiteRepository(str(tmp_path / 'other.db'), Expense)
+    with pytest.raises(ValueError):
+        UnitOfWork(cat_repo, other)
+
+
+def test_memory_rollback(cat_repo):
+    mem = MemoryRepository[Expense]()
+    mem.add(Expense(1, 1))
+    with pytest.raises(KeyError):
+        with UnitOfWork(mem, cat_repo):
+            mem.add(Expense(2, 1))
+            cat_repo.add(Category('a'))
+            mem.delete(100)
+    assert [e.amount for e in mem.get_all()] == [1]
+    assert cat_repo.get_all() == []
+
+
+def test_rollback_notifies_hooks(cat_repo, exp_repo, pool):
+    cached = CachedRepository(cat_repo)
+    tree = CategoryTree(cached)
+    cat = Category('a')
+    cached.add(cat)
+    assert [c.name for c in tree.get_descendants(cat.pk)] == []
+    store = SQLiteRepository(pool.db_file, PeriodTotal, pool=pool)
+    totals = RunningTotals(exp_repo, store)
+    with pytest.raises(RuntimeError):
+        with UnitOfWork(cached, exp_repo, store):
+            child = Category('b', cat.pk)
+            cached.add(child)
+            exp_repo.add(Expense(10, cat.pk, datetime(2023, 1, 1)))
+            assert [c.name for c in tree.get_descendants(cat.pk)] == ['b']
+            raise RuntimeError
+    assert cached.get(child.pk) is None
+    assert tree.get_descendants(cat.pk) == []
+    assert totals.get_total('day', datetime(2023, 1, 1)) == 0
+    assert totals.check() == {}
+
+
+def test_running_totals_rebuild_after_rollback(exp_repo):
+    totals = RunningTotals(exp_repo, MemoryRepository[PeriodTotal]())
+    with pytest.raises(RuntimeError):
+        with UnitOfWork(exp_repo):
+            exp_repo.add(Expense(10, 1, datetime(2023, 1, 1)))
+            raise RuntimeError
+    assert totals.get_total('month', datetime(2023, 1, 1)) == 0
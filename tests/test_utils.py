@@ -3,7 +3,7 @@ from textwrap import dedent
 
 import pytest
 
-from bookkeeper.utils import read_tree
+from bookkeeper.utils import iter_paths, iter_tree, read_tree
 
 
 def test_create_tree():
@@ -71,3 +71,25 @@ def test_with_file():
             ('child2', 'parent1'),
             ('parent2', None)
         ]
+
+
+def test_iter_paths():
+    text = dedent('''
+        a
+            b
+                c
+            d
+        e
+            b
+    ''')
+    paths = iter_paths(text.splitlines())
+    assert next(paths) == ('a',)
+    assert list(paths) == [('a', 'b'), ('a', 'b', 'c'), ('a', 'd'), ('e',), ('e', 'b')]
+    assert list(iter_tree(text.splitlines())) == read_tree(text.splitlines())
+
+
+def test_iter_paths_indentation_error():
+    paths = iter_paths(['a', '    b', '  c'])
+    assert list(next(paths) for _ in range(2)) == [('a',), ('a', 'b')]
+    with pytest.raises(IndentationError):
+        next(paths)
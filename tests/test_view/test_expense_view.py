@@ -1,5 +1,8 @@
-from bookkeeper.view.expense_view import MainWindow, TableModel
+from bookkeeper.view.expense_view import MainWindow, PagedTableModel, TableModel
+import threading
+
 import pytest
+from PySide6 import QtCore
 
 
 def test_createModel(qtbot):
@@ -22,6 +25,30 @@ def test_columnCount(qtbot):
     assert widget.columnCount(index) == 2
 
 
+def test_incremental_rows(qtbot):
+    model = TableModel([['a', 1], ['c', 3]], key_column=-1)
+    inserted, removed, changed = [], [], []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append(first))
+    model.rowsRemoved.connect(lambda parent, first, last: removed.append(first))
+    model.dataChanged.connect(lambda first, last: changed.append(first.row()))
+    assert model.insert_row(['b', 2]) == 1
+    assert model.find_row(2) == 1
+    assert model.find_row(4) is None
+    model.update_row(1, ['bb', 2])
+    assert model.remove_row(0) == ['a', 1]
+    assert model._data == [['bb', 2], ['c', 3]]
+    assert (inserted, removed, changed) == ([1], [0], [1])
+
+
+def test_insert_into_empty_model(qtbot):
+    model = TableModel([])
+    assert model.columnCount() == 0
+    model.insert_row(['a', 1])
+    assert (model.rowCount(), model.columnCount()) == (1, 2)
+    with pytest.raises(ValueError):
+        model.find_row(1)
+
+
 def test_set_expense_table(qtbot):
     widget = MainWindow()
     qtbot.addWidget(widget)
@@ -39,6 +66,21 @@ def test_set_category_dropdown(qtbot):
     assert widget.category_dropdown.currentIndex() == 1
 
 
+def test_set_category_dropdown_replaces_items(qtbot):
+    widget = MainWindow()
+    qtbot.addWidget(widget)
+    widget.set_category_dropdown([('a', 1), ('b', 2)])
+    widget.category_dropdown.setCurrentIndex(1)
+    widget.set_category_dropdown([('new', 3), ('a', 1), ('b', 2)])
+    dropdown = widget.category_dropdown
+    assert [dropdown.itemText(i) for i in range(dropdown.count())] == [
+        '3 new', '1 a', '2 b']
+    assert widget.get_selected_cat() == 2
+    widget.set_category_dropdown([('a', 1)])
+    assert dropdown.count() == 1
+    assert widget.get_selected_cat() == 1
+
+
 def test_get_amount_int(qtbot):
     widget = MainWindow()
     qtbot.addWidget(widget)
@@ -67,3 +109,136 @@ def test_get_selected_exp(qtbot):
     qtbot.addWidget(widget)
     qtbot.keyClicks(widget.exp_pk_line_edit, '123')
     assert widget.get_selected_exp() == 123
+
+
+def test_set_budget_table(qtbot):
+    widget = MainWindow()
+    qtbot.addWidget(widget)
+    with pytest.raises(ValueError):
+        widget.set_budget_table(('123', '456'))
+    data = [['День', 100, 1000]]
+    widget.set_budget_table(data)
+    assert widget.budget_grid.model() is widget.budget_model
+    assert widget.budget_model._data == data
+
+
+def test_dispatch_runs_in_main_thread(qtbot):
+    widget = MainWindow()
+    qtbot.addWidget(widget)
+    threads = []
+
+    def record():
+        threads.append(threading.current_thread())
+
+    worker = threading.Thread(target=lambda: widget.dispatch(record))
+    worker.start()
+    worker.join()
+    qtbot.waitUntil(lambda: bool(threads))
+    assert threads == [threading.main_thread()]
+
+
+def test_expense_row_deltas(qtbot):
+    widget = MainWindow()
+    qtbot.addWidget(widget)
+    widget.insert_expense_row([10, 'a', 1])
+    model = widget.item_model
+    widget.insert_expense_row([20, 'b', 2])
+    widget.update_expense_row([15, 'a', 1])
+    widget.remove_expense_row(2)
+    widget.remove_expense_row(100)
+    assert widget.item_model is model
+    assert model._data == [[15, 'a', 1]]
+
+
+@pytest.fixture
+def source():
+    rows = [[i * 10, 'cat', i] for i in range(1, 26)]
+    calls = []
+
+    def fetch(after, limit):
+        calls.append(after)
+        return [r for r in rows if after is None or r[-1] > after][:limit]
+
+    fetch.rows = rows
+    fetch.calls = calls
+    return fetch
+
+
+def cell(model, row, column=-1):
+    return model.data(model.index(row, column % model.columnCount()),
+                      QtCore.Qt.DisplayRole)
+
+
+def test_paged_model_fetch_more(qtbot, source):
+    model = PagedTableModel(source, 3, page_size=10, max_pages=2)
+    assert model.rowCount() == 0 and model.canFetchMore()
+    while model.canFetchMore():
+        model.fetchMore()
+    assert model.rowCount() == 25
+    assert source.calls == [None, 10, 20]
+    assert len(model._cache) == 2
+    assert cell(model, 3) == 4
+    assert source.calls[-1] is None
+    assert len(model._cache) == 2
+    assert [cell(model, i) for i in range(25)] == list(range(1, 26))
+
+
+def test_paged_model_changes(qtbot, source):
+    model = PagedTableModel(source, 3, page_size=10, max_pages=1)
+    model.fetchMore()
+    assert model.insert_row([0, 'x', 100]) is None
+    model.fetchMore()
+    model.fetchMore()
+    assert model.find_row(12) == 11
+    assert model.find_row(100) is None
+    for pk in range(11, 21):
+        source.rows.remove(model.remove_row(model.find_row(pk)))
+    assert model.rowCount() == 15
+    assert [cell(model, i) for i in range(15)] == [*range(1, 11), *range(21, 26)]
+    assert model.insert_row([260, 'new', 26]) == 15
+    source.rows.append([260, 'new', 26])
+    model.update_row(0, [5, 'upd', 1])
+    assert cell(model, 0, 0) == 5
+    assert model.find_row(26) == 15
+
+
+def test_paged_model_refetch_by_key_range(qtbot, source):
+    model = PagedTableModel(source, 3, page_size=10, max_pages=1)
+    while model.canFetchMore():
+        model.fetchMore()
+    # страница 0 вытеснена; строку удалили в обход модели
+    del source.rows[0]
+    assert model.find_row(1) is None
+    assert model.rowCount() == 24
+    assert [cell(model, i) for i in range(24)] == list(range(2, 26))
+    source.rows.insert(3, [45, 'new', 4.5])
+    model._cache.clear()
+    assert model.find_row(4.5) == 3
+    assert [cell(model, i) for i in range(25)] == [2, 3, 4, 4.5, *range(5, 26)]
+
+
+def test_paged_model_background_loading(qtbot, source):
+    queue = []
+
+    def submit(func, *args, callback):
+        queue.append(lambda: callback(func(*args)))
+
+    model = PagedTableModel(source, 3, page_size=10, max_pages=1, submit=submit)
+    model.fetchMore()
+    assert not model.canFetchMore()
+    model.fetchMore()
+    assert model.rowCount() == 0 and len(queue) == 1
+    queue.pop()()
+    while model.canFetchMore():
+        model.fetchMore()
+        queue.pop()()
+    assert model.rowCount() == 25
+    # страница 0 вытеснена: ячейки пусты, пока она загружается
+    assert cell(model, 0) is None and cell(model, 1) is None
+    assert len(queue) == 1
+    del source.rows[0]
+    changed = []
+    model.rowsRemoved.connect(lambda parent, first, last: changed.append(first))
+    queue.pop()()
+    assert changed == [9] and model.rowCount() == 24
+    assert [cell(model, i) for i in range(9)] == list(range(2, 11))